@@ -0,0 +1,183 @@
+"""Admission control for the API: per cost class concurrency limits with load shedding.
+
+Endpoints are assigned a cost class. "heavy" endpoints scan the whole flights
+table (their query plans contain ``SCAN flights``, see plan_cost_class()),
+"light" ones are answered through an index or a precomputed rollup. An
+endpoint backed by a single query can take its class from that query's plan
+on the database in use (query_cost_classes()), so it follows the indexes the
+database actually has. Each class admits a limited number of concurrent requests; further requests wait
+in a bounded queue up to a deadline and are then shed:
+
+* 429 when the queue is already full,
+* 503 when the deadline passes while queued,
+
+both with a Retry-After estimated from the measured service time of the
+class. Heavy bursts are thus throttled without occupying the threads that
+serve cheap lookups. A queued request blocks its server thread while it
+waits, so the queue is sized to the threads left over (see
+thread_budget()).
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+HEAVY = "heavy"
+LIGHT = "light"
+
+# Weight of the latest request in the moving average of service times
+SMOOTHING = 0.2
+
+
+def plan_cost_class(plan):
+    """Cost class of a query from its EXPLAIN QUERY PLAN detail lines."""
+    for detail in plan:
+        # SCAN visits every row of flights (or of one of its indexes, which
+        # is as many rows); SEARCH only reads an index range
+        if detail.startswith("SCAN flights"):
+            return HEAVY
+    return LIGHT
+
+
+def query_cost_classes(explain, queries, default=HEAVY):
+    """Cost class of each of ``queries`` (name -> (query, params)) from its plan.
+
+    ``explain(query, params)`` returns the plan detail lines. A query whose
+    plan can't be had, e.g. before the database exists, gets ``default``.
+    """
+    classes = {}
+    for name, (query, params) in queries.items():
+        try:
+            plan = explain(query, params)
+        except Exception as e:
+            print(f"Could not plan the {name} query: {e}")
+            plan = []
+        classes[name] = plan_cost_class(plan) if plan else default
+    return classes
+
+
+def thread_budget(threads, max_concurrent, max_queue=None, reserved=1):
+    """(max_concurrent, max_queue) for a class that must leave ``reserved`` of ``threads`` free.
+
+    Running and queued requests both hold a server thread, so together
+    they get at most ``threads - reserved`` (but one request can always
+    run). ``max_concurrent`` is capped to that, and the queue gets the
+    remaining threads; a larger ``max_queue`` is cut down to them.
+    """
+    available = max(threads - reserved, 1)
+    max_concurrent = max(1, min(max_concurrent, available))
+    room = available - max_concurrent
+    return max_concurrent, room if max_queue is None else max(0, min(max_queue, room))
+
+
+class Overloaded(Exception):
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class _CostClass:
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.avg_seconds = None
+        self.condition = threading.Condition()
+
+    def retry_after(self):
+        """Seconds until the queue ahead is likely drained (at least 1)."""
+        per_request = self.avg_seconds or 1.0
+        backlog = (self.active + self.waiting) / max(self.max_concurrent, 1)
+        return max(1, math.ceil(per_request * backlog))
+
+
+class AdmissionController:
+    def __init__(self, limits, metrics=None):
+        """``limits`` maps a class name to (max_concurrent, max_queue, queue_timeout).
+
+        Classes without limits are always admitted.
+        """
+        self.classes = {name: _CostClass(name, *limit) for name, limit in limits.items()}
+        self.metrics = metrics
+        self._pooled = ContextVar(f"admission_pooled_{id(self)}", default=False)
+
+    @contextmanager
+    def pooled(self):
+        """Requests admitted in this block run on a bounded pool of their own, not on server threads.
+
+        They may wait beyond ``max_queue`` (until the queue timeout): the
+        queue cap only keeps waiting requests from taking server threads.
+        """
+        token = self._pooled.set(True)
+        try:
+            yield
+        finally:
+            self._pooled.reset(token)
+
+    def _count(self, name):
+        if self.metrics is not None:
+            self.metrics.incr(name)
+
+    def acquire(self, name):
+        cost_class = self.classes.get(name)
+        if cost_class is None:
+            return
+        with cost_class.condition:
+            # Newcomers don't overtake requests already queued
+            if cost_class.active < cost_class.max_concurrent and not cost_class.waiting:
+                cost_class.active += 1
+                return
+            if cost_class.waiting >= cost_class.max_queue and not self._pooled.get():
+                self._count(f"rejected_{name}")
+                raise Overloaded("Too many requests, try again later", 429, cost_class.retry_after())
+
+            self._count(f"queued_{name}")
+            cost_class.waiting += 1
+            deadline = time.monotonic() + cost_class.queue_timeout
+            try:
+                while cost_class.active >= cost_class.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._count(f"timed_out_{name}")
+                        raise Overloaded("Server busy, try again later", 503, cost_class.retry_after())
+                    cost_class.condition.wait(remaining)
+                cost_class.active += 1
+            finally:
+                cost_class.waiting -= 1
+
+    def release(self, name, seconds):
+        cost_class = self.classes.get(name)
+        if cost_class is None:
+            return
+        with cost_class.condition:
+            cost_class.active -= 1
+            if cost_class.avg_seconds is None:
+                cost_class.avg_seconds = seconds
+            else:
+                cost_class.avg_seconds += SMOOTHING * (seconds - cost_class.avg_seconds)
+            cost_class.condition.notify()
+
+    def limit(self, name):
+        """Decorator running a view function under the limits of cost class ``name``.
+
+        ``name`` may also be a function returning the class, called for
+        every request.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                cost_class = name() if callable(name) else name
+                self.acquire(cost_class)
+                start = time.monotonic()
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    self.release(cost_class, time.monotonic() - start)
+            return wrapper
+        return decorator
@@ -0,0 +1,248 @@
+"""Columnar copy of the flights data for the aggregate queries, run by DuckDB.
+
+SQLite stores rows, so an aggregate like the total flights per route reads
+every column of every flight. The analytics store keeps the ``flights``
+and ``airlines`` tables as Parquet files in a directory next to the
+database. An embedded DuckDB reads them, touching only the columns a query
+uses, vectorized and on all cores. It runs in process, with no server.
+
+The export is append-only, like the rollups. Each refresh writes the
+flights with an ID above the last one exported into new part files, named
+after their ID range. Files are only ever added or atomically replaced, so
+any number of processes can read the directory while one refreshes it.
+Queries are routed here only while the export covers exactly the flights
+in SQLite (see FlightData); until the next refresh they run on SQLite.
+
+IDs alone can't tell a database that grew from one that was replaced (a
+new file published or dropped in). The last exported flight is compared
+with SQLite's flight of the same ID; if they differ, the copy belongs to
+another database and the next refresh exports everything again.
+
+DuckDB is optional and only imported when the store is used.
+"""
+import csv
+import fcntl
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+
+# Flights per Parquet part file
+PART_ROWS = 1_000_000
+
+PART_PATTERN = re.compile(r"^flights-(\d+)-(\d+)\.parquet$")
+
+# Columns of the last exported flight compared with SQLite's to tell that
+# the copy was exported from the same database
+IDENTITY_COLUMNS = ("ID", "YEAR", "MONTH", "DAY", "AIRLINE", "FLIGHT_NUMBER", "ORIGIN_AIRPORT", "DESTINATION_AIRPORT")
+
+# SQLite declared types -> DuckDB column types
+_TYPES = {"INTEGER": "BIGINT", "REAL": "DOUBLE", "TEXT": "VARCHAR"}
+
+
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError as e:
+        raise RuntimeError("The duckdb backend needs the duckdb package (pip install duckdb)") from e
+    return duckdb
+
+
+def to_duckdb_sql(query):
+    """Translate one of the data layer's SQLite queries to DuckDB.
+
+    Named parameters become ``$name``. CAST becomes TRY_CAST, so a value
+    that isn't a number gives NULL instead of failing the query. A unary
+    ``+`` before a column (SQLite's hint not to use an index for it) is
+    dropped, as DuckDB has no unary plus for text.
+    """
+    query = re.sub(r"(?<![:\w]):(\w+)", r"$\1", query)
+    query = re.sub(r"((?:\bBY|,|\()\s*)\+(?=\s*[A-Za-z_])", r"\1", query)
+    return re.sub(r"\bCAST\(", "TRY_CAST(", query)
+
+
+def _columns(conn, table):
+    return [(row[1], _TYPES.get(row[2].upper(), "VARCHAR")) for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _sql_string(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class AnalyticsStore:
+    def __init__(self, directory):
+        """Parquet copy of the data in ``directory`` (created on first refresh)."""
+        self.directory = str(directory)
+        self._conn = None
+        self._lock = threading.Lock()
+        # (last part path, its mtime, its last flight), read again when the part changes
+        self._last_flight = (None, None, None)
+
+    def parts(self):
+        """(first_id, last_id, path) of every flights part, in ID order."""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        parts = []
+        for name in names:
+            match = PART_PATTERN.match(name)
+            if match:
+                parts.append((int(match.group(1)), int(match.group(2)), os.path.join(self.directory, name)))
+        return sorted(parts)
+
+    def last_id(self):
+        """ID of the last exported flight (0 if nothing was exported yet)."""
+        parts = self.parts()
+        return parts[-1][1] if parts else 0
+
+    def last_flight(self):
+        """IDENTITY_COLUMNS of the last exported flight, or None if nothing was exported yet."""
+        parts = self.parts()
+        if not parts:
+            return None
+        _, last_id, path = parts[-1]
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        cached_path, cached_mtime, flight = self._last_flight
+        if (cached_path, cached_mtime) != (path, mtime):
+            conn = _duckdb().connect()
+            try:
+                row = conn.execute(
+                    f"SELECT {', '.join(IDENTITY_COLUMNS)} FROM read_parquet({_sql_string(path)}) WHERE ID = {last_id}"
+                ).fetchone()
+            finally:
+                conn.close()
+            flight = None if row is None else tuple(row)
+            self._last_flight = (path, mtime, flight)
+        return flight
+
+    def _exported_from(self, source):
+        """Whether the exported flights came from the SQLite connection ``source``."""
+        flight = self.last_flight()
+        if flight is None:
+            return True
+        row = source.execute(
+            f"SELECT {', '.join(IDENTITY_COLUMNS)} FROM flights WHERE ID = ?", (flight[0],)
+        ).fetchone()
+        return row is not None and tuple(row) == flight
+
+    def refresh(self, database):
+        """Export the flights added to the SQLite file ``database`` since the last refresh.
+
+        Everything is exported again if the copy came from another database.
+        Returns the number of flights exported.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ".lock"), "w") as lock:
+            # One refresh at a time, also across processes
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            source = sqlite3.connect(f"file:{database}?mode=ro", uri=True)
+            try:
+                if not self._exported_from(source):
+                    print(f"The Parquet copy in {self.directory} was exported from another database, "
+                          f"exporting {database} again")
+                    for _, _, path in self.parts():
+                        os.remove(path)
+                duckdb = _duckdb()
+                conn = duckdb.connect()
+                try:
+                    self._export_table(conn, source, "airlines", "SELECT * FROM airlines", "airlines.parquet")
+                    exported = 0
+                    last_id = self.last_id()
+                    while True:
+                        (max_id, count), = source.execute(
+                            "SELECT MAX(ID), COUNT(*) FROM (SELECT ID FROM flights WHERE ID > ? ORDER BY ID LIMIT ?)",
+                            (last_id, PART_ROWS),
+                        )
+                        if not count:
+                            return exported
+                        self._export_table(
+                            conn, source, "flights",
+                            f"SELECT * FROM flights WHERE ID > {last_id} AND ID <= {max_id} ORDER BY ID",
+                            f"flights-{last_id + 1:012d}-{max_id:012d}.parquet",
+                        )
+                        exported += count
+                        last_id = max_id
+                finally:
+                    conn.close()
+            finally:
+                source.close()
+
+    def _export_table(self, conn, source, table, select, name):
+        """Write the rows of ``select`` on the SQLite ``source`` to the Parquet file ``name``."""
+        columns = _columns(source, table)
+        with tempfile.TemporaryDirectory(dir=self.directory) as tmp:
+            staged = os.path.join(tmp, name)
+            if not self._copy_with_extension(conn, source, select, columns, staged):
+                # Without DuckDB's sqlite extension, pass the rows through a CSV file
+                text_file = os.path.join(tmp, f"{table}.csv")
+                with open(text_file, "w", newline="") as f:
+                    csv.writer(f).writerows(source.execute(select))
+                types = ", ".join(f"{_sql_string(column)}: {_sql_string(kind)}" for column, kind in columns)
+                conn.execute(
+                    f"COPY (SELECT * FROM read_csv({_sql_string(text_file)}, header = false, delim = ',', "
+                    f"quote = '\"', escape = '\"', nullstr = '', columns = {{{types}}})) "
+                    f"TO {_sql_string(staged)} (FORMAT parquet)"
+                )
+            os.replace(staged, os.path.join(self.directory, name))
+
+    def _copy_with_extension(self, conn, source, select, columns, staged):
+        database = source.execute("PRAGMA database_list").fetchone()[2]
+        try:
+            # Only if already installed: never download it on the fly
+            conn.execute("SET autoinstall_known_extensions = false")
+            conn.execute("LOAD sqlite")
+            conn.execute(f"ATTACH IF NOT EXISTS {_sql_string(database)} AS source (TYPE sqlite, READ_ONLY)")
+        except _duckdb().Error:
+            return False
+        casts = ", ".join(f'CAST("{column}" AS {kind}) AS "{column}"' for column, kind in columns)
+        query = re.sub(r"\bFROM (\w+)", r"FROM source.\1", select, count=1)
+        conn.execute(f"COPY (SELECT {casts} FROM ({query})) TO {_sql_string(staged)} (FORMAT parquet)")
+        return True
+
+    def _connection(self):
+        with self._lock:
+            if self._conn is None:
+                conn = _duckdb().connect()
+                directory = self.directory.replace("'", "''")
+                conn.execute(f"CREATE VIEW flights AS SELECT * FROM read_parquet('{directory}/flights-*.parquet')")
+                conn.execute(f"CREATE VIEW airlines AS SELECT * FROM read_parquet('{directory}/airlines.parquet')")
+                self._conn = conn
+            return self._conn
+
+    def query(self, query, params=None, deadline_seconds=None):
+        """Rows of an SQLite-dialect ``query`` run on the Parquet copy, with lowercase keys.
+
+        Raises TimeoutError if it runs longer than ``deadline_seconds``.
+        """
+        # A cursor is a separate connection to the same database, usable by this thread
+        cursor = self._connection().cursor()
+        timer = None
+        if deadline_seconds is not None:
+            timer = threading.Timer(max(deadline_seconds, 0), cursor.interrupt)
+            timer.start()
+        try:
+            result = cursor.execute(to_duckdb_sql(query), params or {})
+            keys = [column[0].lower() for column in result.description]
+            return [dict(zip(keys, row)) for row in result.fetchall()]
+        except _duckdb().InterruptException as e:
+            raise TimeoutError("Query exceeded its time limit and was cancelled") from e
+        finally:
+            if timer is not None:
+                timer.cancel()
+            cursor.close()
+
+    def dispose_after_fork(self):
+        # DuckDB connections don't survive a fork: drop the parent's without
+        # closing it, the child opens its own on first use
+        self._conn = None
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
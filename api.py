@@ -1,6 +1,31 @@
 import os
-from flask import Flask, jsonify, request
-from data import FlightData
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from functools import wraps
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from flask import Flask, g, jsonify, request
+from admission import HEAVY, LIGHT, AdmissionController, Overloaded, query_cost_classes, thread_budget
+from data import (
+    QUERY_DELAYED_FLIGHTS,
+    QUERY_DELAYED_FLIGHTS_BY_AIRLINE,
+    QUERY_FLIGHT_BY_ID,
+    QUERY_FLIGHTS_BY_DATE,
+    QUERY_FLIGHTS_BY_ORIGIN,
+    FlightData,
+    QueryTimeoutError,
+    query_deadline,
+)
+from memory import HEADER as MEMORY_HEADER, MemoryTracker
+from network import network_stats
+from paging import InvalidCursor, decode_cursor, encode_cursor, read_page
+from rollups import GRANULARITIES, build_timeseries
+from geo import MAX_RADIUS_KM, MIN_CORRIDOR_WIDTH_KM, build_airport_index
+from search import MAX_RESULTS, PrefixSearch
+from sketches import DEFAULT_QUANTILES, DIMENSIONS
+from snapshots import SnapshotWatcher
+from stats import STATS
+from warmup import DerivedIndex, Warmer
 
 # Create Flask app
 app = Flask(__name__)
@@ -8,10 +33,115 @@ app = Flask(__name__)
 # Get the absolute path to the database file
 current_dir = os.path.dirname(os.path.abspath(__file__))
 db_path = os.path.join(current_dir, "flights.sqlite3")
-SQLITE_URI = f"sqlite:///{db_path}"
-
-# Create FlightData instance
-flight_data = FlightData(SQLITE_URI)
+SQLITE_URI = os.environ.get("SKYSQL_DATABASE_URI", f"sqlite:///{db_path}")
+
+# Create FlightData instance; SKYSQL_PARTITION_DIR switches to a directory of
+# per-year/per-month partition files instead of a single database
+PARTITION_DIR = os.environ.get("SKYSQL_PARTITION_DIR")
+# No single query may run longer than SKYSQL_QUERY_TIMEOUT seconds
+QUERY_TIMEOUT = float(os.environ.get("SKYSQL_QUERY_TIMEOUT", 30))
+if PARTITION_DIR:
+    flight_data = FlightData(partition_dir=PARTITION_DIR, query_timeout=QUERY_TIMEOUT)
+else:
+    # SKYSQL_BACKEND=duckdb runs the aggregates on a columnar copy (see analytics.py)
+    flight_data = FlightData(SQLITE_URI, query_timeout=QUERY_TIMEOUT,
+                             backend=os.environ.get("SKYSQL_BACKEND", "sqlite"))
+# Keep the stats aggregates in a sidecar cache shared by all workers and
+# restarts (SKYSQL_RESULT_CACHE=0 disables, SKYSQL_RESULT_CACHE_PATH moves it)
+if os.environ.get("SKYSQL_RESULT_CACHE", "1") != "0":
+    flight_data.enable_result_cache(
+        os.environ.get("SKYSQL_RESULT_CACHE_PATH"),
+        max_bytes=int(os.environ.get("SKYSQL_RESULT_CACHE_MB", 256)) * 2**20,
+    )
+
+# Time budget for all the queries of one request; past it they are cancelled
+# and the client gets a 504
+HEAVY_DEADLINE = float(os.environ.get("SKYSQL_HEAVY_DEADLINE", 20))
+LIGHT_DEADLINE = float(os.environ.get("SKYSQL_LIGHT_DEADLINE", 2))
+
+# Precompute the stats aggregates in the background (SKYSQL_WARMUP=0 disables)
+# and recompute them when the database changes, checked every
+# SKYSQL_REFRESH_INTERVAL seconds. Started per process by
+# start_background_tasks(), not at import.
+WARMUP_ENABLED = os.environ.get("SKYSQL_WARMUP", "1") != "0"
+# The autocomplete and airport location indexes follow database changes the same way
+prefix_search = PrefixSearch(flight_data)
+airport_index = DerivedIndex(flight_data, build_airport_index)
+warmer = Warmer(
+    flight_data,
+    {**STATS, "network": network_stats,
+     "search": lambda _: prefix_search.get(), "airports": lambda _: airport_index.get()},
+    interval=float(os.environ.get("SKYSQL_REFRESH_INTERVAL", 60)),
+)
+# Swap in a replaced database file without a restart, checked every
+# SKYSQL_SNAPSHOT_INTERVAL seconds (SKYSQL_SNAPSHOT_WATCH=0 disables). Only
+# for a single SQLite database; see snapshots.py.
+snapshot_watcher = None
+if not PARTITION_DIR and os.environ.get("SKYSQL_SNAPSHOT_WATCH", "1") != "0":
+    snapshot_watcher = SnapshotWatcher(
+        flight_data, warmer if WARMUP_ENABLED else None,
+        interval=float(os.environ.get("SKYSQL_SNAPSHOT_INTERVAL", 5)),
+    )
+
+
+# Full-table scans (HEAVY) are limited to SKYSQL_HEAVY_CONCURRENCY at a time
+# per worker with a few more waiting at most SKYSQL_QUEUE_TIMEOUT seconds;
+# beyond that they are shed with 429/503. Waiting requests hold a server
+# thread, so running and queued heavy requests together leave
+# SKYSQL_LIGHT_THREADS of the worker's SKYSQL_THREADS (see gunicorn.conf.py)
+# to indexed lookups (LIGHT), which are never limited. SKYSQL_HEAVY_QUEUE can
+# only shorten the queue.
+heavy_concurrency, heavy_queue = thread_budget(
+    int(os.environ.get("SKYSQL_THREADS", 4)),
+    int(os.environ.get("SKYSQL_HEAVY_CONCURRENCY", 2)),
+    int(os.environ["SKYSQL_HEAVY_QUEUE"]) if "SKYSQL_HEAVY_QUEUE" in os.environ else None,
+    reserved=int(os.environ.get("SKYSQL_LIGHT_THREADS", 1)),
+)
+admission = AdmissionController(
+    {HEAVY: (heavy_concurrency, heavy_queue, float(os.environ.get("SKYSQL_QUEUE_TIMEOUT", 10)))},
+    metrics=flight_data.metrics,
+)
+# Routes answered by one query take their class from its plan on the database
+# in use, planned again when the database changes: on a database dropped in
+# without idx_flights_airline, say, the airline route becomes heavy.
+PLANNED_QUERIES = {
+    "flight": (QUERY_FLIGHT_BY_ID, {"id": 1}),
+    "date": (QUERY_FLIGHTS_BY_DATE, {"day": 1, "month": 1, "year": 2015}),
+    "delayed": (QUERY_DELAYED_FLIGHTS, {}),
+    "delayed_origin": (QUERY_FLIGHTS_BY_ORIGIN, {"origin": "ATL"}),
+    "delayed_airline": (QUERY_DELAYED_FLIGHTS_BY_AIRLINE, {"airline": "AA"}),
+}
+
+
+def plan_routes(data):
+    return query_cost_classes(data.explain, PLANNED_QUERIES)
+
+
+cost_classes = DerivedIndex(flight_data, plan_routes)
+
+
+def planned(name):
+    """Cost class of the query PLANNED_QUERIES[name], for admission.limit()"""
+    return lambda: cost_classes.get()[name]
+
+
+# Memory added by each request, in /api/metrics and the X-Memory-Peak header:
+# SKYSQL_MEMORY_TRACKING=tracemalloc or rss (off by default, see memory.py)
+memory_tracker = MemoryTracker(os.environ.get("SKYSQL_MEMORY_TRACKING", "off"), metrics=flight_data.metrics)
+
+# Budget of one list response: SKYSQL_MAX_ROWS rows and SKYSQL_MAX_RESPONSE_MB
+# of JSON (0 = unlimited). Longer lists are cut, with a cursor to the rest.
+MAX_ROWS = int(os.environ.get("SKYSQL_MAX_ROWS", 0))
+MAX_RESPONSE_BYTES = int(float(os.environ.get("SKYSQL_MAX_RESPONSE_MB", 0)) * 2**20)
+
+
+def start_background_tasks():
+    # Plan the queries before the first request rather than during it
+    cost_classes.get()
+    if WARMUP_ENABLED:
+        warmer.start()
+    if snapshot_watcher is not None:
+        snapshot_watcher.start()
 
 
 # Helper function to format JSON responses
@@ -21,6 +151,95 @@ def format_response(data, error=None):
     return jsonify({"success": True, "data": data}), 200
 
 
+@app.before_request
+def start_memory_tracking():
+    if memory_tracker.enabled:
+        g.memory_token = memory_tracker.begin()
+
+
+@app.after_request
+def report_memory(response):
+    # The JSON body is built by now, so it is included
+    if "memory_token" in g:
+        added = memory_tracker.end(g.pop("memory_token"))
+        if added is not None:
+            response.headers[MEMORY_HEADER] = str(added)
+    return response
+
+
+@app.teardown_request
+def stop_memory_tracking(error=None):
+    # Requests that never produced a response still end their measurement
+    if "memory_token" in g:
+        memory_tracker.end(g.pop("memory_token"))
+
+
+@app.errorhandler(Overloaded)
+def overloaded(error):
+    response = jsonify({"success": False, "error": str(error)})
+    return response, error.status, {"Retry-After": str(error.retry_after)}
+
+
+@app.errorhandler(QueryTimeoutError)
+def query_timed_out(error):
+    return jsonify({"success": False, "error": str(error)}), 504
+
+
+# Decorator cancelling the queries of a request that runs past ``seconds``; they
+# all read the database snapshot current when it started, even if one is swapped in
+def with_deadline(seconds):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            with query_deadline(seconds), flight_data.pinned_snapshot():
+                return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Helper function to read the optional ?year=&month= filter of the stats endpoints
+def date_filter_args():
+    """Return the date filter as keyword arguments, or None if it is invalid"""
+    filters = {}
+    for name, low, high in (("year", 1900, 2100), ("month", 1, 12)):
+        value = request.args.get(name)
+        if value is None:
+            continue
+        if not value.isdigit() or not low <= int(value) <= high:
+            return None
+        filters[name] = int(value)
+    return filters
+
+
+# Helper function to answer the stats endpoints, unfiltered ones from the warmed-up aggregates
+def stats_response(kind, filters):
+    results = warmer.get(kind) if not filters else None
+    if results is None:
+        results = STATS[kind](flight_data, **filters)
+    return format_response(results)
+
+
+# Helper function to answer the list endpoints within the row/byte budget
+def list_response(load, stream):
+    """All rows of ``load()``, or a page of ``stream()`` if a budget is set or a cursor was passed"""
+    cursor = request.args.get('cursor')
+    if cursor is None and not (MAX_ROWS or MAX_RESPONSE_BYTES):
+        return format_response(load())
+
+    fingerprint = flight_data.fingerprint()
+    try:
+        offset = decode_cursor(cursor, fingerprint) if cursor else 0
+    except InvalidCursor as e:
+        return format_response(None, str(e))
+    rows, next_offset = read_page(stream(), offset, MAX_ROWS, MAX_RESPONSE_BYTES)
+    if next_offset is None:
+        return format_response(rows)
+    flight_data.metrics.incr("responses_truncated")
+    return jsonify({
+        "success": True, "data": rows, "truncated": True, "next_cursor": encode_cursor(next_offset, fingerprint),
+    }), 200
+
+
 @app.route('/')
 def index():
     return jsonify({
@@ -36,12 +255,25 @@ def index():
             "/api/flights/delayed/airline/<airline_name>",
             "/api/stats/airlines",
             "/api/stats/hours",
-            "/api/stats/routes"
+            "/api/stats/routes",
+            "/api/stats/network",
+            "/api/stats/<airlines|airports|routes|hours>/percentiles",
+            "/api/stats/timeseries?from=<YYYY-MM-DD>&to=<YYYY-MM-DD>&granularity=<day|week|month>&group_by=<airline>",
+            "/api/search?q=<prefix>",
+            "/api/airports/near?lat=<lat>&lon=<lon>&radius_km=<km>",
+            "/api/airports/corridor?from=<IATA>&to=<IATA>&width_km=<km>",
+            "/api/stats/airports/near?lat=<lat>&lon=<lon>&radius_km=<km>",
+            "/api/batch (POST)",
+            "/api/metrics",
+            "/api/health/live",
+            "/api/health/ready"
         ]
     })
 
 
 @app.route('/api/flights/<int:flight_id>')
+@admission.limit(planned("flight"))
+@with_deadline(LIGHT_DEADLINE)
 def get_flight_by_id(flight_id):
     """Get flight details by ID"""
     results = flight_data.get_flight_by_id(flight_id)
@@ -51,24 +283,31 @@ def get_flight_by_id(flight_id):
 
 
 @app.route('/api/flights/date/<int:year>/<int:month>/<int:day>')
+@admission.limit(planned("date"))
+@with_deadline(LIGHT_DEADLINE)
 def get_flights_by_date(year, month, day):
     """Get flights by date"""
     # Basic date validation
     if not (1 <= month <= 12 and 1 <= day <= 31):
         return format_response(None, "Invalid date parameters")
 
-    results = flight_data.get_flights_by_date(day, month, year)
-    return format_response(results)
+    return list_response(
+        lambda: flight_data.get_flights_by_date(day, month, year),
+        lambda: flight_data.iter_flights_by_date(day, month, year),
+    )
 
 
 @app.route('/api/flights/delayed')
+@admission.limit(planned("delayed"))
+@with_deadline(HEAVY_DEADLINE)
 def get_delayed_flights():
     """Get all delayed flights"""
-    results = flight_data.get_delayed_flights()
-    return format_response(results)
+    return list_response(flight_data.get_delayed_flights, flight_data.iter_delayed_flights)
 
 
 @app.route('/api/flights/origin/<origin_code>')
+@admission.limit(LIGHT)
+@with_deadline(LIGHT_DEADLINE)
 def get_flights_by_origin(origin_code):
     """Get flights by origin airport"""
     if not isinstance(origin_code, str) or len(origin_code) != 3 or not origin_code.isalpha():
@@ -79,6 +318,8 @@ def get_flights_by_origin(origin_code):
 
 
 @app.route('/api/flights/destination/<destination_code>')
+@admission.limit(LIGHT)
+@with_deadline(LIGHT_DEADLINE)
 def get_flights_by_destination(destination_code):
     """Get flights by destination airport"""
     if not isinstance(destination_code, str) or len(destination_code) != 3 or not destination_code.isalpha():
@@ -89,139 +330,322 @@ def get_flights_by_destination(destination_code):
 
 
 @app.route('/api/flights/delayed/origin/<origin_code>')
+@admission.limit(planned("delayed_origin"))
+@with_deadline(LIGHT_DEADLINE)
 def get_delayed_flights_by_airport(origin_code):
     """Get delayed flights by origin airport"""
     if not isinstance(origin_code, str) or len(origin_code) != 3 or not origin_code.isalpha():
         return format_response(None, "Invalid IATA code. Please enter a valid 3-letter airport code.")
 
-    results = flight_data.get_delayed_flights_by_airport(origin_code.upper())
-    return format_response(results)
+    return list_response(
+        lambda: flight_data.get_delayed_flights_by_airport(origin_code.upper()),
+        lambda: flight_data.iter_delayed_flights(origin=origin_code.upper()),
+    )
 
 
 @app.route('/api/flights/delayed/airline/<airline_name>')
+@admission.limit(planned("delayed_airline"))
+@with_deadline(HEAVY_DEADLINE)
 def get_delayed_flights_by_airline(airline_name):
     """Get delayed flights by airline"""
-    results = flight_data.get_delayed_flights_by_airline(airline_name)
-    return format_response(results)
+    return list_response(
+        lambda: flight_data.get_delayed_flights_by_airline(airline_name),
+        lambda: flight_data.iter_delayed_flights(airline_name),
+    )
 
 
 @app.route('/api/stats/airlines')
+@admission.limit(HEAVY)
+@with_deadline(HEAVY_DEADLINE)
 def get_airline_stats():
     """Get statistics on flight delays by airline"""
-    delayed_data = flight_data.get_delayed_flights_by_airline()
-    total_data = flight_data.get_total_flights_by_airline()
-
-    if not delayed_data or not total_data:
-        return format_response([])
-
-    # Create a dictionary to merge data
-    stats = {}
-
-    # Process total flights data
-    for row in total_data:
-        airline = row.get('airline')
-        if airline:
-            stats[airline] = {
-                'airline': airline,
-                'total_flights': row.get('total_flights', 0),
-                'delayed_flights': 0,
-                'percentage_delayed': 0
-            }
-
-    # Process delayed flights data
-    for row in delayed_data:
-        airline = row.get('airline')
-        if airline and airline in stats:
-            stats[airline]['delayed_flights'] = row.get('delayed_flights', 0)
-            # Calculate percentage
-            if stats[airline]['total_flights'] > 0:
-                stats[airline]['percentage_delayed'] = round(
-                    (stats[airline]['delayed_flights'] / stats[airline]['total_flights']) * 100, 2
-                )
-
-    return format_response(list(stats.values()))
+    filters = date_filter_args()
+    if filters is None:
+        return format_response(None, "Invalid year or month filter")
+    return stats_response("airlines", filters)
 
 
 @app.route('/api/stats/hours')
+@admission.limit(HEAVY)
+@with_deadline(HEAVY_DEADLINE)
 def get_hourly_stats():
     """Get statistics on flight delays by hour of day"""
-    delayed_data = flight_data.get_delayed_flights_by_hour()
-    total_data = flight_data.get_total_flights_by_hour()
-
-    if not delayed_data or not total_data:
-        return format_response([])
-
-    # Create a dictionary to merge data
-    stats = {}
-
-    # Process total flights data
-    for row in total_data:
-        hour = row.get('HOUR')
-        if hour is not None:
-            stats[hour] = {
-                'hour': hour,
-                'total_flights': row.get('total_flights', 0),
-                'delayed_flights': 0,
-                'percentage_delayed': 0
-            }
-
-    # Process delayed flights data
-    for row in delayed_data:
-        hour = row.get('HOUR')
-        if hour is not None and hour in stats:
-            stats[hour]['delayed_flights'] = row.get('delayed_flights', 0)
-            # Calculate percentage
-            if stats[hour]['total_flights'] > 0:
-                stats[hour]['percentage_delayed'] = round(
-                    (stats[hour]['delayed_flights'] / stats[hour]['total_flights']) * 100, 2
-                )
-
-    # Sort by hour for easier consumption
-    return format_response(sorted(list(stats.values()), key=lambda x: x['hour']))
+    filters = date_filter_args()
+    if filters is None:
+        return format_response(None, "Invalid year or month filter")
+    return stats_response("hours", filters)
 
 
 @app.route('/api/stats/routes')
+@admission.limit(HEAVY)
+@with_deadline(HEAVY_DEADLINE)
 def get_route_stats():
     """Get statistics on flight delays by route"""
-    delayed_data = flight_data.get_delayed_flights_by_route()
-    total_data = flight_data.get_total_flights_by_route()
-
-    if not delayed_data or not total_data:
-        return format_response([])
-
-    # Create a dictionary to merge data using route as key
-    stats = {}
-
-    # Process total flights data
-    for row in total_data:
-        origin = row.get('ORIGIN_AIRPORT')
-        destination = row.get('DESTINATION_AIRPORT')
-        if origin and destination:
-            route_key = f"{origin}-{destination}"
-            stats[route_key] = {
-                'origin': origin,
-                'destination': destination,
-                'total_flights': row.get('total_flights', 0),
-                'delayed_flights': 0,
-                'percentage_delayed': 0
-            }
-
-    # Process delayed flights data
-    for row in delayed_data:
-        origin = row.get('ORIGIN_AIRPORT')
-        destination = row.get('DESTINATION_AIRPORT')
-        if origin and destination:
-            route_key = f"{origin}-{destination}"
-            if route_key in stats:
-                stats[route_key]['delayed_flights'] = row.get('delayed_flights', 0)
-                # Calculate percentage
-                if stats[route_key]['total_flights'] > 0:
-                    stats[route_key]['percentage_delayed'] = round(
-                        (stats[route_key]['delayed_flights'] / stats[route_key]['total_flights']) * 100, 2
-                    )
-
-    return format_response(list(stats.values()))
+    filters = date_filter_args()
+    if filters is None:
+        return format_response(None, "Invalid year or month filter")
+    return stats_response("routes", filters)
+
+
+@app.route('/api/stats/network')
+@admission.limit(HEAVY)
+@with_deadline(HEAVY_DEADLINE)
+def get_network_stats():
+    """Get hub metrics of the airport network: weighted degree, delay rank and components"""
+    filters = date_filter_args()
+    if filters is None:
+        return format_response(None, "Invalid year or month filter")
+    results = warmer.get("network") if not filters else None
+    if results is None:
+        results = network_stats(flight_data, **filters)
+    return format_response(results)
+
+
+@app.route('/api/stats/<dimension>/percentiles')
+@admission.limit(LIGHT)
+@with_deadline(LIGHT_DEADLINE)
+def get_delay_percentiles(dimension):
+    """Get departure delay percentiles per airline, airport, route or hour"""
+    if dimension not in DIMENSIONS:
+        return format_response(None, f"Unknown dimension. Choose one of: {', '.join(DIMENSIONS)}")
+
+    quantiles = DEFAULT_QUANTILES
+    if request.args.get('q'):
+        try:
+            quantiles = [float(q) for q in request.args['q'].split(',')]
+        except ValueError:
+            quantiles = None
+        if not quantiles or not all(0 < q <= 1 for q in quantiles):
+            return format_response(None, "Invalid quantiles. Use e.g. q=0.5,0.9,0.99")
+
+    combine = request.args.get('combine', '').lower() in ('1', 'true', 'yes')
+    results = flight_data.get_delay_percentiles(
+        dimension, quantiles, key=request.args.get('key'), combine=combine
+    )
+    return format_response(results)
+
+
+
+# Longest range served by the timeseries endpoint (about ten years of days)
+MAX_TIMESERIES_DAYS = 3660
+
+
+@app.route('/api/stats/timeseries')
+@admission.limit(LIGHT)
+@with_deadline(LIGHT_DEADLINE)
+def get_delay_timeseries():
+    """Get daily, weekly or monthly delay rates over a date range"""
+    try:
+        start = date.fromisoformat(request.args.get('from', ''))
+        end = date.fromisoformat(request.args.get('to', ''))
+    except ValueError:
+        return format_response(None, "Invalid or missing from/to dates. Use YYYY-MM-DD.")
+    if start > end or (end - start).days >= MAX_TIMESERIES_DAYS:
+        return format_response(None, f"Date range must be ordered and at most {MAX_TIMESERIES_DAYS} days")
+
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return format_response(None, f"Invalid granularity. Choose one of: {', '.join(GRANULARITIES)}")
+    group_by = request.args.get('group_by') or None
+    if group_by not in (None, 'airline'):
+        return format_response(None, "Invalid group_by. Only 'airline' is supported.")
+
+    daily = flight_data.get_daily_stats(start, end)
+    names = flight_data.get_airline_names() if group_by == 'airline' else None
+    return format_response(build_timeseries(daily, start, end, granularity, group_by, names))
+
+
+@app.route('/api/search')
+@admission.limit(LIGHT)
+@with_deadline(LIGHT_DEADLINE)
+def search():
+    """Autocomplete airline names/codes and airport codes by prefix"""
+    prefix = request.args.get('q', '').strip()
+    if not prefix or len(prefix) > 64:
+        return format_response(None, "Missing or too long search prefix q")
+    limit = request.args.get('limit', '10')
+    if not limit.isdigit() or not 1 <= int(limit) <= MAX_RESULTS:
+        return format_response(None, f"Invalid limit. Use 1 to {MAX_RESULTS}.")
+    return format_response(prefix_search.get().search(prefix, int(limit)))
+
+
+# Helper function to read a float query parameter within [low, high]
+def float_arg(name, low, high, default=None):
+    """Return the parameter as a float, or None if it is missing (without default) or invalid"""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return number if low <= number <= high else None
+
+
+# Helper function to read the ?lat=&lon=&radius_km= circle of the location endpoints
+def circle_args():
+    lat = float_arg('lat', -90, 90)
+    lon = float_arg('lon', -180, 180)
+    radius = float_arg('radius_km', 0, MAX_RADIUS_KM, default=100)
+    if lat is None or lon is None or radius is None:
+        return None
+    return lat, lon, radius
+
+
+def airport_result(airport, **distances):
+    return {**airport, **{name: round(km, 1) for name, km in distances.items()}}
+
+
+@app.route('/api/airports/near')
+@admission.limit(LIGHT)
+@with_deadline(LIGHT_DEADLINE)
+def get_airports_near():
+    """Get the airports within a radius of a point, nearest first"""
+    circle = circle_args()
+    if circle is None:
+        return format_response(None, f"Invalid location. Use lat, lon and radius_km up to {MAX_RADIUS_KM}.")
+    found = airport_index.get().within(*circle)
+    return format_response([airport_result(airport, distance_km=km) for km, airport in found])
+
+
+@app.route('/api/airports/corridor')
+@admission.limit(LIGHT)
+@with_deadline(LIGHT_DEADLINE)
+def get_airports_along_route():
+    """Get the airports within a distance of the great-circle route between two airports"""
+    index = airport_index.get()
+    start = index.by_code.get(request.args.get('from', '').upper())
+    end = index.by_code.get(request.args.get('to', '').upper())
+    if start is None or end is None:
+        return format_response(None, "Unknown from/to airport. Use IATA codes of airports with a known location.")
+    width = float_arg('width_km', MIN_CORRIDOR_WIDTH_KM, MAX_RADIUS_KM, default=50)
+    if width is None:
+        return format_response(None, f"Invalid width_km. Use {MIN_CORRIDOR_WIDTH_KM} to {MAX_RADIUS_KM}.")
+
+    found = index.along((start["latitude"], start["longitude"]), (end["latitude"], end["longitude"]), width)
+    return format_response([
+        airport_result(airport, distance_from_route_km=off_route, distance_from_start_km=from_start)
+        for off_route, from_start, airport in found
+    ])
+
+
+@app.route('/api/stats/airports/near')
+@admission.limit(HEAVY)  # reads every departure of the airports found
+@with_deadline(HEAVY_DEADLINE)
+def get_airport_stats_near():
+    """Get departure delay statistics for every airport within a radius of a point"""
+    circle = circle_args()
+    filters = date_filter_args()
+    if circle is None:
+        return format_response(None, f"Invalid location. Use lat, lon and radius_km up to {MAX_RADIUS_KM}.")
+    if filters is None:
+        return format_response(None, "Invalid year or month filter")
+
+    found = airport_index.get().within(*circle)
+    rows = flight_data.get_departure_stats_by_airport([airport["code"] for _, airport in found], **filters)
+    counts = {row["airport"]: row for row in rows}
+    results = []
+    for km, airport in found:
+        row = counts.get(airport["code"], {})
+        total, delayed = row.get("total_flights", 0), row.get("delayed_flights", 0)
+        results.append({
+            **airport_result(airport, distance_km=km),
+            "total_flights": total,
+            "delayed_flights": delayed,
+            "percentage_delayed": round(delayed / total * 100, 2) if total else 0,
+        })
+    return format_response(results)
+
+
+# Sub-requests per batch, and sub-requests run at once per worker process
+MAX_BATCH_SIZE = int(os.environ.get("SKYSQL_BATCH_MAX", 20))
+BATCH_WORKERS = int(os.environ.get("SKYSQL_BATCH_WORKERS", 4))
+_batch_executor = None
+_batch_executor_lock = threading.Lock()
+
+
+def batch_executor():
+    # Created on first use, so each gunicorn worker gets its own threads
+    global _batch_executor
+    with _batch_executor_lock:
+        if _batch_executor is None:
+            _batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="skysql-batch")
+        return _batch_executor
+
+
+# Helper function to make identical sub-requests compare equal regardless of parameter order
+def canonical_path(path):
+    parts = urlsplit(path)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return f"{parts.path}?{query}" if query else parts.path
+
+
+def dispatch_subrequest(path):
+    """Run a GET of ``path`` through the app, with its admission limits and deadline"""
+    # On a batch thread, so waiting for a heavy slot doesn't hold a server thread
+    with admission.pooled(), app.test_request_context(path, method="GET"):
+        try:
+            response = app.full_dispatch_request()
+        except Exception:
+            app.logger.exception("Batch sub-request %s failed", path)
+            return {"status": 500, "body": {"success": False, "error": "Internal server error"}}
+    body = response.get_json(silent=True)
+    result = {"status": response.status_code, "body": body if body is not None else response.get_data(as_text=True)}
+    if "Retry-After" in response.headers:
+        result["retry_after"] = int(response.headers["Retry-After"])
+    return result
+
+
+@app.route('/api/batch', methods=['POST'])
+def batch():
+    """Run several GET requests in one round trip: {"requests": ["/api/stats/routes", ...]}"""
+    payload = request.get_json(silent=True)
+    items = payload.get("requests") if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not 1 <= len(items) <= MAX_BATCH_SIZE:
+        return format_response(None, f"Send a JSON object with a list of 1 to {MAX_BATCH_SIZE} requests")
+
+    paths = []
+    for item in items:
+        if isinstance(item, dict):
+            if str(item.get("method", "GET")).upper() != "GET":
+                return format_response(None, "Only GET sub-requests are supported")
+            item = item.get("path")
+        if not isinstance(item, str) or not item.startswith("/api/"):
+            return format_response(None, "Each request must be an /api/ path or an object with a path")
+        if urlsplit(item).path.rstrip("/") == "/api/batch":
+            return format_response(None, "Batches can't be nested")
+        paths.append(item)
+
+    # Identical sub-requests run once; independent ones run concurrently
+    unique = list(dict.fromkeys(canonical_path(path) for path in paths))
+    flight_data.metrics.incr("batch_subrequests", len(paths))
+    flight_data.metrics.incr("batch_subrequests_deduplicated", len(paths) - len(unique))
+    futures = {path: batch_executor().submit(dispatch_subrequest, path) for path in unique}
+    results = {path: future.result() for path, future in futures.items()}
+    return format_response([{"path": path, **results[canonical_path(path)]} for path in paths])
+
+
+@app.route('/api/metrics')
+def get_metrics():
+    """Get the data layer counters of this worker process"""
+    return format_response(flight_data.get_metrics())
+
+
+@app.route('/api/health/live')
+def health_live():
+    """Liveness probe: the process is up and serving requests"""
+    return format_response({"status": "live"})
+
+
+@app.route('/api/health/ready')
+def health_ready():
+    """Readiness probe: 503 until the startup warm-up has finished"""
+    if WARMUP_ENABLED and not warmer.ready.is_set():
+        return jsonify({"success": False, "error": "Warming up"}), 503
+    return format_response({"status": "ready"})
 
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Development server only; production runs under gunicorn (see gunicorn.conf.py)
+    start_background_tasks()
+    app.run(debug=os.environ.get("FLASK_DEBUG") == "1", host='0.0.0.0', port=5000)
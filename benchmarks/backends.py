@@ -0,0 +1,84 @@
+"""Compare the SQLite and DuckDB backends on the aggregate queries.
+
+Builds one synthetic database, exports its columnar copy and times every
+aggregate method of FlightData on both backends, unfiltered and for one
+month, over identical data:
+
+    python benchmarks/backends.py --rows 2000000 --repeat 5
+
+Prints the median time per query on each backend and the speedup, after
+checking that both return the same rows. The result cache is not enabled,
+so every call runs its query.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import create_synthetic_db  # noqa: E402
+from data import FlightData  # noqa: E402
+
+METHODS = [
+    "get_total_flights_by_airline",
+    "get_delayed_flights_by_hour",
+    "get_total_flights_by_hour",
+    "get_delayed_flights_by_route",
+    "get_total_flights_by_route",
+    "get_delayed_flights",
+]
+
+
+def _canonical(rows):
+    # Both backends group the same rows, but not necessarily in the same order
+    return sorted(repr(sorted(row.items())) for row in rows)
+
+
+def _median_seconds(call, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the aggregate queries on the SQLite and DuckDB backends")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="rows in the synthetic database")
+    parser.add_argument("--db", help="use an existing database instead of a synthetic one")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per query (the median is shown)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or create_synthetic_db(os.path.join(tmp, "flights.sqlite3"), args.rows)
+        uri = f"sqlite:///{db_path}"
+        sqlite = FlightData(uri)
+        duckdb = FlightData(uri, backend="duckdb", analytics_dir=os.path.join(tmp, "flights.parquet"))
+        start = time.perf_counter()
+        exported = duckdb.analytics.refresh(db_path)
+        print(f"cores={os.cpu_count()} rows={exported:,} parquet export={time.perf_counter() - start:.2f}s "
+              f"repeat={args.repeat}")
+
+        year, month = sqlite.get_months()[0]
+        print(f"{'query':<44} {'sqlite ms':>10} {'duckdb ms':>10} {'speedup':>8}")
+        for method in METHODS:
+            for filters in ({}, {"year": year, "month": month}):
+                label = method + (" (one month)" if filters else "")
+                expected = getattr(sqlite, method)(**filters)
+                if _canonical(getattr(duckdb, method)(**filters)) != _canonical(expected):
+                    print(f"{label:<44} results differ between backends")
+                    continue
+                sqlite_s = _median_seconds(lambda: getattr(sqlite, method)(**filters), args.repeat)
+                duckdb_s = _median_seconds(lambda: getattr(duckdb, method)(**filters), args.repeat)
+                print(f"{label:<44} {sqlite_s * 1000:>10.1f} {duckdb_s * 1000:>10.1f} {sqlite_s / duckdb_s:>7.1f}x")
+        if duckdb.metrics.get("analytics_queries") == 0:
+            print("warning: no query ran on DuckDB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Import-time profile of the CLI and API entry points.
+
+Runs ``python -X importtime -c "import <module>"`` in a fresh interpreter for
+each entry point and summarizes the report: total startup time, the modules
+with the largest cumulative import cost and whether any of the heavy
+visualization dependencies were loaded:
+
+    python benchmarks/import_time.py            # main, api and cli
+    python benchmarks/import_time.py api --top 20
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+ENTRY_POINTS = ("main", "api", "cli")
+
+# Only needed for plots and maps; none of them should load at startup
+HEAVY_MODULES = ("matplotlib", "seaborn", "folium", "pandas")
+
+
+def profile_import(module):
+    """Return ``[(module, self_us, cumulative_us)]`` from ``-X importtime`` for ``module``."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def summarize(module, entries, top):
+    total = next(cumulative for name, _, cumulative in reversed(entries) if name == module)
+    heavy = sorted({name.split(".")[0] for name, _, _ in entries if name.split(".")[0] in HEAVY_MODULES})
+
+    print(f"== import {module}: {total / 1000:.1f} ms, {len(entries)} modules ==")
+    # Only top-level packages, so a package isn't listed once per submodule
+    packages = {}
+    for name, _, cumulative in entries:
+        root = name.split(".")[0]
+        if root != module and name == root:
+            packages[root] = max(packages.get(root, 0), cumulative)
+    for name, cumulative in sorted(packages.items(), key=lambda p: -p[1])[:top]:
+        print(f"  {cumulative / 1000:>8.1f} ms  {name}")
+    print(f"  heavy dependencies loaded: {', '.join(heavy) if heavy else 'none'}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize python -X importtime for the entry points")
+    parser.add_argument("modules", nargs="*", default=ENTRY_POINTS)
+    parser.add_argument("--top", type=int, default=10, help="packages to list per entry point")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        summarize(module, profile_import(module), args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+"""Load generator reporting throughput, latency percentiles, errors and memory per endpoint.
+
+Starts the production server (gunicorn.conf.py) on a database, draws
+realistic request parameters from it (flight IDs, dates, airports with
+locations, airline names) and drives every API route, including POSTs of
+dashboard batches to /api/batch, with a fixed pool of client processes:
+
+    python benchmarks/loadgen.py --clients 8 --duration 5
+    python benchmarks/loadgen.py --db data/flights.sqlite3 --output before.json
+    python benchmarks/loadgen.py --db data/flights.sqlite3 --baseline before.json
+
+Each route is first driven on its own for ``--duration`` seconds, so the
+server's memory growth can be attributed to it, then all routes together
+in the weighted mix of MIX for the same time. For every phase it prints
+requests/second, p50/p95/p99 latency in milliseconds, the error rate and
+the peak resident memory of the server (master and workers, from /proc).
+The mixed phase is also broken down per route, so a slow class of
+requests can't hide behind fast ones. The location routes are skipped on a
+database without airport locations.
+Errors are failed connections and any status other than 2xx and 404
+(random IDs can miss), so shed requests (429/503) count as errors.
+
+``--output`` saves the results as JSON and ``--baseline`` prints the
+change of each figure against such a file, for before/after comparisons.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote, urlencode
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import create_synthetic_db  # noqa: E402
+from benchmarks.worker_scaling import _free_port, start_server  # noqa: E402
+
+# Values of each kind drawn from the database
+SAMPLE_SIZE = 200
+
+# Seconds between samples of the server's memory
+RSS_INTERVAL = 0.2
+
+MIXED = "mixed"
+
+
+def sample_database(path, size=SAMPLE_SIZE, seed=0):
+    """Request parameters drawn from the database at ``path``."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        low, high = conn.execute("SELECT MIN(ID), MAX(ID) FROM flights").fetchone()
+        if low is None:
+            raise SystemExit(f"No flights in {path}")
+        ids = [rng.randint(low, high) for _ in range(size)]
+        # Dates of existing flights, so date lookups mostly find something
+        rows = conn.execute(
+            f"SELECT ID, YEAR, MONTH, DAY FROM flights WHERE ID IN ({','.join('?' * len(ids))})", ids
+        ).fetchall()
+        dates = sorted({(year, month, day) for _, year, month, day in rows}) or [(2015, 1, 1)]
+        airports = [code for (code,) in conn.execute(
+            "SELECT DISTINCT ORIGIN_AIRPORT FROM flights WHERE ORIGIN_AIRPORT IS NOT NULL"
+        )]
+        # Databases without the airports table have no locations to query
+        located = []
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'airports'").fetchone():
+            located = conn.execute(
+                "SELECT IATA_CODE, LATITUDE, LONGITUDE FROM airports "
+                "WHERE LATITUDE IS NOT NULL AND LONGITUDE IS NOT NULL"
+            ).fetchall()
+        airlines = [name for (name,) in conn.execute("SELECT AIRLINE FROM airlines WHERE AIRLINE IS NOT NULL")]
+    finally:
+        conn.close()
+    return {
+        "ids": ids,
+        "dates": dates,
+        "airports": rng.sample(airports, min(size, len(airports))),
+        "located": located,
+        "airlines": airlines or ["American Airlines Inc."],
+    }
+
+
+def _date_filters(rng, sample):
+    """No filter most of the time, otherwise a year or a year and month."""
+    year, month, _ = rng.choice(sample["dates"])
+    return rng.choice(({}, {}, {"year": year}, {"year": year, "month": month}))
+
+
+def _with_query(path, params):
+    return f"{path}?{urlencode(params)}" if params else path
+
+
+def _near(rng, sample):
+    _, lat, lon = rng.choice(sample["located"])
+    # Around an airport, up to about 100 km off
+    return {"lat": round(lat + rng.uniform(-1, 1), 4), "lon": round(lon + rng.uniform(-1, 1), 4),
+            "radius_km": rng.choice((25, 100, 250))}
+
+
+def _corridor(rng, sample):
+    (start, _, _), (end, _, _) = rng.sample(sample["located"], 2)
+    return {"from": start, "to": end, "width_km": rng.choice((25, 50, 100))}
+
+
+def _timeseries(rng, sample):
+    year, month, _ = rng.choice(sample["dates"])
+    return {"from": f"{year}-{month:02d}-01", "to": f"{year}-12-31",
+            "granularity": rng.choice(("day", "week", "month"))}
+
+
+def _search(rng, sample):
+    label = rng.choice(sample["airlines"] + sample["airports"])
+    return {"q": label[:rng.randint(1, 3)]}
+
+
+# Stats a dashboard fetches together in one /api/batch request
+BATCHED = ("/api/stats/airlines", "/api/stats/hours", "/api/stats/routes", "/api/stats/network",
+           "/api/stats/airlines/percentiles", "/api/stats/routes/percentiles")
+
+
+def _batch(rng, sample):
+    filters = _date_filters(rng, sample)
+    paths = [_with_query(path, {} if path.endswith("/percentiles") else filters)
+             for path in rng.sample(BATCHED, rng.randint(2, 4))]
+    return "/api/batch", {"requests": paths}
+
+
+# Route -> (weight in the mixed phase, function of (rng, sample) giving a request path, or
+# the path and JSON body of a POST). Weights favour the lookups a front end makes most:
+# single flights and autocomplete.
+MIX = {
+    "/": (1, lambda rng, s: "/"),
+    "/api/flights/<id>": (20, lambda rng, s: f"/api/flights/{rng.choice(s['ids'])}"),
+    "/api/flights/date/<y>/<m>/<d>": (10, lambda rng, s: "/api/flights/date/{}/{}/{}".format(*rng.choice(s["dates"]))),
+    "/api/flights/delayed": (1, lambda rng, s: "/api/flights/delayed"),
+    "/api/flights/origin/<code>": (5, lambda rng, s: f"/api/flights/origin/{rng.choice(s['airports'])}"),
+    "/api/flights/destination/<code>": (5, lambda rng, s: f"/api/flights/destination/{rng.choice(s['airports'])}"),
+    "/api/flights/delayed/origin/<code>": (
+        5, lambda rng, s: f"/api/flights/delayed/origin/{rng.choice(s['airports'])}"),
+    "/api/flights/delayed/airline/<name>": (
+        2, lambda rng, s: f"/api/flights/delayed/airline/{quote(rng.choice(s['airlines']))}"),
+    "/api/stats/airlines": (3, lambda rng, s: _with_query("/api/stats/airlines", _date_filters(rng, s))),
+    "/api/stats/hours": (3, lambda rng, s: _with_query("/api/stats/hours", _date_filters(rng, s))),
+    "/api/stats/routes": (3, lambda rng, s: _with_query("/api/stats/routes", _date_filters(rng, s))),
+    "/api/stats/network": (2, lambda rng, s: _with_query("/api/stats/network", _date_filters(rng, s))),
+    "/api/stats/<dimension>/percentiles": (
+        3, lambda rng, s: f"/api/stats/{rng.choice(('airlines', 'airports', 'routes', 'hours'))}/percentiles"),
+    "/api/stats/timeseries": (3, lambda rng, s: _with_query("/api/stats/timeseries", _timeseries(rng, s))),
+    "/api/search": (15, lambda rng, s: _with_query("/api/search", _search(rng, s))),
+    "/api/airports/near": (5, lambda rng, s: _with_query("/api/airports/near", _near(rng, s))),
+    "/api/airports/corridor": (3, lambda rng, s: _with_query("/api/airports/corridor", _corridor(rng, s))),
+    "/api/stats/airports/near": (
+        2, lambda rng, s: _with_query("/api/stats/airports/near", {**_near(rng, s), **_date_filters(rng, s)})),
+    "/api/batch": (3, _batch),
+    "/api/metrics": (1, lambda rng, s: "/api/metrics"),
+    "/api/health/live": (1, lambda rng, s: "/api/health/live"),
+    "/api/health/ready": (1, lambda rng, s: "/api/health/ready"),
+}
+
+# Routes needing airport locations, with the number of located airports each needs
+LOCATED_ROUTES = {"/api/airports/near": 1, "/api/airports/corridor": 2, "/api/stats/airports/near": 1}
+
+
+def available_routes(routes, sample):
+    """``routes`` that can be driven with ``sample``: location queries need located airports."""
+    return [route for route in routes if len(sample["located"]) >= LOCATED_ROUTES.get(route, 0)]
+
+
+def _request(request):
+    """``(path, JSON body or None)`` of what a MIX function returned."""
+    return (request, None) if isinstance(request, str) else request
+
+
+def _client(port, routes, sample, duration, seed, results):
+    rng = random.Random(seed)
+    weights = [MIX[route][0] for route in routes]
+    latencies = {route: [] for route in routes}
+    errors = dict.fromkeys(routes, 0)
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        route = routes[0] if len(routes) == 1 else rng.choices(routes, weights)[0]
+        path, body = _request(MIX[route][1](rng, sample))
+        start = time.perf_counter()
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            if body is None:
+                conn.request("GET", path)
+            else:
+                conn.request("POST", path, json.dumps(body), {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+            failed = not (200 <= response.status < 300 or response.status == 404)
+        except OSError:
+            failed = True
+        latencies[route].append(time.perf_counter() - start)
+        errors[route] += failed
+    results.put((latencies, errors))
+
+
+def server_rss(pid):
+    """Resident memory in bytes of process ``pid`` and its children, or None without /proc."""
+    pids = {pid}
+    try:
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    with open(f"/proc/{entry}/stat") as f:
+                        # The parent PID follows the parenthesised command name
+                        if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                            pids.add(int(entry))
+                except (OSError, IndexError, ValueError):
+                    pass
+        total = 0
+        for child in pids:
+            try:
+                with open(f"/proc/{child}/status") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            total += int(line.split()[1]) * 1024
+            except OSError:
+                pass
+        return total
+    except OSError:
+        return None
+
+
+class _RssSampler(threading.Thread):
+    """Tracks the peak of server_rss() on a background thread."""
+
+    def __init__(self, pid):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.start_rss = self.peak = server_rss(pid)
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(RSS_INTERVAL):
+            rss = server_rss(self.pid)
+            if rss is not None and self.peak is not None:
+                self.peak = max(self.peak, rss)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+def percentile(ordered, q):
+    """Nearest-rank percentile of an ascending list (None if empty)."""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+def run_phase(server, port, routes, sample, duration, clients, seed=0):
+    """Drive ``routes`` (in MIX proportions) for ``duration`` seconds; returns a result dict."""
+    results = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=_client, args=(port, routes, sample, duration, seed + i, results))
+        for i in range(clients)
+    ]
+    sampler = _RssSampler(server.pid)
+    sampler.start()
+    start = time.time()
+    for proc in procs:
+        proc.start()
+    totals = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    elapsed = time.time() - start
+    sampler.stop()
+
+    result = _summary([seconds for route_latencies, _ in totals for values in route_latencies.values()
+                       for seconds in values],
+                      sum(sum(route_errors.values()) for _, route_errors in totals), elapsed)
+    result["peak_rss_mb"] = None if sampler.peak is None else sampler.peak / 2**20
+    result["rss_growth_mb"] = None if sampler.peak is None else (sampler.peak - sampler.start_rss) / 2**20
+    if len(routes) > 1:
+        # Each route's share of the mix, to see which ones a mixed load slows down
+        result["routes"] = {
+            route: _summary([seconds for route_latencies, _ in totals for seconds in route_latencies[route]],
+                            sum(route_errors[route] for _, route_errors in totals), elapsed)
+            for route in routes
+        }
+    return result
+
+
+def _summary(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    ms = {f"p{int(q * 100)}_ms": None if percentile(latencies, q) is None else percentile(latencies, q) * 1000
+          for q in (0.5, 0.95, 0.99)}
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        **ms,
+        "error_rate": errors / len(latencies) if latencies else 0.0,
+    }
+
+
+def wait_until_ready(port, timeout=300):
+    """Wait for /api/health/ready so the warm-up isn't measured."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", "/api/health/ready")
+            status = conn.getresponse().status
+            conn.close()
+            if status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} was not ready within {timeout}s")
+
+
+# (result key, heading, format, whether changes are shown relative to the baseline)
+COLUMNS = [("rps", "req/s", "{:.1f}", True), ("p50_ms", "p50 ms", "{:.1f}", True),
+           ("p95_ms", "p95 ms", "{:.1f}", True), ("p99_ms", "p99 ms", "{:.1f}", True),
+           ("error_rate", "errors", "{:.1%}", False), ("peak_rss_mb", "rss MB", "{:.0f}", True),
+           ("rss_growth_mb", "+rss MB", "{:.1f}", False)]
+
+
+def _cell(value, spec):
+    return "-" if value is None else spec.format(value)
+
+
+def _change(value, before, spec, relative):
+    if value is None or before is None:
+        return ""
+    if relative:
+        return f"({(value - before) / before:+.0%})" if before else ""
+    # Absolute difference in the column's own unit
+    return "(" + ("+" if value >= before else "-") + spec.format(abs(value - before)) + ")"
+
+
+def print_report(results, baseline=None):
+    # The mixed phase is followed by its routes, indented
+    rows = []
+    for name, result in results.items():
+        before = (baseline or {}).get(name) or {}
+        rows.append((name, result, before))
+        for route, route_result in result.get("routes", {}).items():
+            rows.append((f"  {route}", route_result, before.get("routes", {}).get(route)))
+    width = max(len(name) for name, _, _ in rows)
+    print(f"{'endpoint':<{width}} " + " ".join(f"{label:>9}" for _, label, _, _ in COLUMNS))
+    for name, result, before in rows:
+        print(f"{name:<{width}} " + " ".join(f"{_cell(result.get(key), spec):>9}" for key, _, spec, _ in COLUMNS))
+        if before:
+            changes = " ".join(f"{_change(result.get(key), before.get(key), spec, relative):>9}"
+                               for key, _, spec, relative in COLUMNS)
+            print(f"{'  vs baseline':<{width}} {changes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the API and report latency percentiles per endpoint")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent client processes")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of load per phase")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="gunicorn workers")
+    parser.add_argument("--rows", type=int, default=200_000, help="rows in the synthetic database")
+    parser.add_argument("--db", help="use an existing database instead of a synthetic one")
+    parser.add_argument("--routes", help="comma-separated substrings selecting the routes to drive")
+    parser.add_argument("--mixed-only", action="store_true", help="skip the per-route phases")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against results written earlier with --output")
+    args = parser.parse_args()
+
+    routes = list(MIX)
+    if args.routes:
+        wanted = args.routes.split(",")
+        routes = [route for route in routes if any(w in route for w in wanted)]
+        if not routes:
+            parser.error(f"no route matches {args.routes}")
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or create_synthetic_db(os.path.join(tmp, "flights.sqlite3"), args.rows)
+        sample = sample_database(db_path, seed=args.seed)
+        skipped = [route for route in routes if route not in available_routes(routes, sample)]
+        if skipped:
+            print(f"No airport locations in the database, skipping {', '.join(skipped)}", file=sys.stderr)
+            routes = available_routes(routes, sample)
+            if not routes:
+                raise SystemExit("None of the selected routes can be driven on this database")
+        port = _free_port()
+        server = start_server(db_path, args.workers, port)
+        results = {}
+        try:
+            wait_until_ready(port)
+            phases = [] if args.mixed_only else [(route, [route]) for route in routes]
+            if args.mixed_only or len(routes) > 1:
+                phases.append((MIXED, routes))
+            for name, phase in phases:
+                results[name] = run_phase(server, port, phase, sample, args.duration, args.clients, args.seed)
+                print(f"{name}: {results[name]['rps']:.1f} req/s", file=sys.stderr, flush=True)
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"cores={os.cpu_count()} workers={args.workers} clients={args.clients} "
+          f"duration={args.duration}s rows={'-' if args.db else args.rows}")
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
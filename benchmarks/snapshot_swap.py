@@ -0,0 +1,133 @@
+"""Load test of publishing a new database while the API is serving.
+
+Starts the production server (gunicorn.conf.py) on a synthetic database,
+drives it with client threads and, halfway through, publishes a second
+database with more flights over the served path:
+
+    python benchmarks/snapshot_swap.py --workers 2 --duration 20
+    python benchmarks/snapshot_swap.py --mode restart
+
+``--mode swap`` (the default) renames the new file over the old one and
+lets the workers' SnapshotWatcher swap it in. ``--mode restart`` instead
+replaces the file and restarts the server, the way a new database had to
+be deployed before. For the requests sent before and after the publish it
+prints the count, the failed requests (failed connections and any status
+but 2xx and 404) and the p50/p99 latency, and how long it took until the
+new flights were first served (by any worker).
+"""
+import argparse
+import http.client
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from benchmarks.loadgen import percentile, wait_until_ready  # noqa: E402
+from benchmarks.synthetic import create_synthetic_db  # noqa: E402
+from benchmarks.worker_scaling import DEFAULT_PATHS, _free_port, start_server  # noqa: E402
+
+# Flights only in the published database
+EXTRA_ROWS = 1000
+
+
+def _get(port, path):
+    """Status of GET ``path``, or None if the connection failed."""
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        conn.request("GET", path)
+        response = conn.getresponse()
+        response.read()
+        conn.close()
+        return response.status
+    except OSError:
+        return None
+
+
+def _client(port, paths, stop, results):
+    i = 0
+    while not stop.is_set():
+        path = paths[i % len(paths)]
+        i += 1
+        started = time.time()
+        status = _get(port, path)
+        failed = status is None or not (200 <= status < 300 or status == 404)
+        results.append((started, time.time() - started, failed))
+
+
+def _summary(samples):
+    latencies = sorted(seconds for _, seconds, _ in samples)
+    ms = {q: percentile(latencies, q) for q in (0.5, 0.99)}
+    return (f"{len(samples):>8} {sum(failed for _, _, failed in samples):>7} "
+            + " ".join("       -" if v is None else f"{v * 1000:>8.1f}" for v in ms.values()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API errors and latency while a new database is published")
+    parser.add_argument("--mode", choices=("swap", "restart"), default="swap")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--clients", type=int, default=8, help="client threads")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load; the publish is halfway")
+    parser.add_argument("--rows", type=int, default=200_000, help="rows in the served database")
+    parser.add_argument("--interval", type=float, default=1.0, help="SKYSQL_SNAPSHOT_INTERVAL of the server")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="skysql-swap-")
+    server = None
+    try:
+        served = os.path.join(tmp, "flights.sqlite3")
+        published = os.path.join(tmp, "next.sqlite3")
+        print(f"Creating databases of {args.rows} and {args.rows + EXTRA_ROWS} rows in {tmp} ...")
+        create_synthetic_db(served, args.rows)
+        create_synthetic_db(published, args.rows + EXTRA_ROWS, seed=43)
+
+        os.environ["SKYSQL_SNAPSHOT_INTERVAL"] = str(args.interval)
+        port = _free_port()
+        server = start_server(served, args.workers, port)
+        wait_until_ready(port)
+
+        # A flight only the published database has
+        probe = f"/api/flights/{args.rows + EXTRA_ROWS}"
+        results = []
+        stop = threading.Event()
+        clients = [threading.Thread(target=_client, args=(port, DEFAULT_PATHS, stop, results))
+                   for _ in range(args.clients)]
+        for client in clients:
+            client.start()
+
+        time.sleep(args.duration / 2)
+        published_at = time.time()
+        if args.mode == "swap":
+            os.replace(published, served)
+        else:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+            shutil.move(published, served)
+            server = start_server(served, args.workers, port)
+        while _get(port, probe) != 200:
+            time.sleep(0.05)
+        visible_after = time.time() - published_at
+
+        time.sleep(max(0.0, published_at + args.duration / 2 - time.time()))
+        stop.set()
+        for client in clients:
+            client.join()
+    finally:
+        if server is not None:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"\nmode: {args.mode}, new data first served after {visible_after:.2f}s\n")
+    print(f"{'requests':<20} {'count':>8} {'failed':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    print(f"{'before publish':<20} {_summary([r for r in results if r[0] < published_at])}")
+    print(f"{'after publish':<20} {_summary([r for r in results if r[0] >= published_at])}")
+
+
+if __name__ == "__main__":
+    main()
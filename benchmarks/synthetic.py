@@ -0,0 +1,104 @@
+"""Generate a synthetic flights database with the same schema as flights.sqlite3.
+
+Used by the benchmarks so they can run without the real dataset:
+    python benchmarks/synthetic.py /tmp/flights.sqlite3 --rows 500000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from ingest import INDEXES, SCHEMA  # noqa: E402
+
+AIRLINES = {
+    "AA": "American Airlines Inc.",
+    "AS": "Alaska Airlines Inc.",
+    "B6": "JetBlue Airways",
+    "DL": "Delta Air Lines Inc.",
+    "EV": "Atlantic Southeast Airlines",
+    "F9": "Frontier Airlines Inc.",
+    "HA": "Hawaiian Airlines Inc.",
+    "MQ": "American Eagle Airlines Inc.",
+    "NK": "Spirit Air Lines",
+    "OO": "Skywest Airlines Inc.",
+    "UA": "United Air Lines Inc.",
+    "US": "US Airways Inc.",
+    "VX": "Virgin America",
+    "WN": "Southwest Airlines Co.",
+}
+
+# IATA code -> (latitude, longitude)
+AIRPORT_LOCATIONS = {
+    "ATL": (33.6407, -84.4277), "BOS": (42.3656, -71.0096), "BWI": (39.1754, -76.6684),
+    "CLT": (35.2144, -80.9473), "DCA": (38.8512, -77.0402), "DEN": (39.8561, -104.6737),
+    "DFW": (32.8998, -97.0403), "DTW": (42.2162, -83.3554), "EWR": (40.6895, -74.1745),
+    "FLL": (26.0742, -80.1506), "HNL": (21.3187, -157.9225), "IAD": (38.9531, -77.4565),
+    "IAH": (29.9902, -95.3368), "JFK": (40.6413, -73.7781), "LAS": (36.0840, -115.1537),
+    "LAX": (33.9416, -118.4085), "LGA": (40.7769, -73.8740), "MCO": (28.4312, -81.3081),
+    "MDW": (41.7868, -87.7522), "MIA": (25.7959, -80.2870), "MSP": (44.8848, -93.2223),
+    "ORD": (41.9742, -87.9073), "PDX": (45.5898, -122.5951), "PHL": (39.8744, -75.2424),
+    "PHX": (33.4352, -112.0101), "SAN": (32.7338, -117.1933), "SEA": (47.4502, -122.3088),
+    "SFO": (37.6213, -122.3790), "SJU": (18.4394, -66.0018), "SLC": (40.7899, -111.9791),
+}
+AIRPORTS = list(AIRPORT_LOCATIONS)
+
+
+def _random_flight(rng, year):
+    month = rng.randint(1, 12)
+    day = rng.randint(1, 28)
+    origin, destination = rng.sample(AIRPORTS, 2)
+    scheduled = rng.randint(5, 23) * 100 + rng.choice((0, 15, 30, 45))
+    # Roughly 1.5% cancelled, most flights early or on time, a long tail late
+    if rng.random() < 0.015:
+        delay = None
+        departure = None
+    else:
+        delay = int(rng.expovariate(1 / 12)) - 5
+        minutes = (scheduled // 100) * 60 + scheduled % 100 + delay
+        minutes %= 24 * 60
+        departure = f"{minutes // 60:02d}{minutes % 60:02d}"
+    return (
+        year, month, day, (day % 7) + 1, rng.choice(list(AIRLINES)),
+        rng.randint(1, 6000), f"N{rng.randint(100, 999)}XX", origin, destination,
+        f"{scheduled:04d}", departure, delay,
+    )
+
+
+def create_synthetic_db(path, rows=200_000, year=2015, seed=42):
+    """Create (or extend) a flights database at ``path`` with ``rows`` random flights."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(SCHEMA)
+        conn.executemany("INSERT OR REPLACE INTO airlines (ID, AIRLINE) VALUES (?, ?)", AIRLINES.items())
+        conn.executemany(
+            "INSERT OR REPLACE INTO airports (IATA_CODE, LATITUDE, LONGITUDE) VALUES (?, ?, ?)",
+            ((code, lat, lon) for code, (lat, lon) in AIRPORT_LOCATIONS.items()),
+        )
+        conn.executemany(
+            """INSERT INTO flights (YEAR, MONTH, DAY, DAY_OF_WEEK, AIRLINE, FLIGHT_NUMBER, TAIL_NUMBER,
+                                    ORIGIN_AIRPORT, DESTINATION_AIRPORT, SCHEDULED_DEPARTURE,
+                                    DEPARTURE_TIME, DEPARTURE_DELAY)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (_random_flight(rng, year) for _ in range(rows)),
+        )
+        for sql in INDEXES.values():
+            conn.execute(sql)
+        conn.commit()
+    finally:
+        conn.close()
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--year", type=int, default=2015)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    create_synthetic_db(args.path, args.rows, args.year, args.seed)
+    print(f"Wrote {args.rows} flights to {args.path}")
@@ -0,0 +1,141 @@
+"""Load test showing API throughput as the number of gunicorn workers grows.
+
+Starts the production server (gunicorn.conf.py) against a synthetic database
+once per worker count, drives it with a fixed pool of client processes and
+prints requests/second and the scaling efficiency relative to one worker:
+
+    python benchmarks/worker_scaling.py --workers 1,2,4 --duration 10
+
+Throughput only scales linearly while workers <= physical cores (and while the
+client processes themselves have cores to run on), so run it on a machine with
+spare cores.
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import create_synthetic_db  # noqa: E402
+
+DEFAULT_PATHS = [
+    "/api/flights/1",
+    "/api/flights/date/2015/3/14",
+    "/api/flights/delayed/origin/ORD",
+    "/api/stats/hours",
+]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/")
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server on port {port} did not start within {timeout}s")
+
+
+def _client(port, paths, duration, results):
+    done = errors = 0
+    deadline = time.time() + duration
+    i = 0
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            conn.request("GET", paths[i % len(paths)])
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+            if response.status >= 500:
+                errors += 1
+            else:
+                done += 1
+        except OSError:
+            errors += 1
+        i += 1
+    results.put((done, errors))
+
+
+def run_load(port, paths, duration, clients):
+    """Drive the server with ``clients`` processes for ``duration`` seconds."""
+    results = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=_client, args=(port, paths, duration, results))
+        for _ in range(clients)
+    ]
+    start = time.time()
+    for proc in procs:
+        proc.start()
+    totals = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    elapsed = time.time() - start
+    done = sum(t[0] for t in totals)
+    errors = sum(t[1] for t in totals)
+    return done / elapsed, errors
+
+
+def start_server(db_path, workers, port):
+    env = dict(
+        os.environ,
+        SKYSQL_DATABASE_URI=f"sqlite:///{db_path}",
+        SKYSQL_WORKERS=str(workers),
+        SKYSQL_BIND=f"127.0.0.1:{port}",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "api:app"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    _wait_until_up(port)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API throughput per gunicorn worker count")
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--clients", type=int, default=None, help="client processes (default: 2x max workers)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per worker count")
+    parser.add_argument("--rows", type=int, default=200_000, help="rows in the synthetic database")
+    parser.add_argument("--db", help="use an existing database instead of a synthetic one")
+    args = parser.parse_args()
+
+    worker_counts = [int(w) for w in args.workers.split(",")]
+    clients = args.clients or 2 * max(worker_counts)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or create_synthetic_db(os.path.join(tmp, "flights.sqlite3"), args.rows)
+        print(f"cores={os.cpu_count()} clients={clients} duration={args.duration}s")
+        print(f"{'workers':>7} {'req/s':>10} {'speedup':>8} {'efficiency':>10} {'errors':>6}")
+        baseline = None
+        for workers in worker_counts:
+            port = _free_port()
+            server = start_server(db_path, workers, port)
+            try:
+                rps, errors = run_load(port, DEFAULT_PATHS, args.duration, clients)
+            finally:
+                server.terminate()
+                server.wait()
+            baseline = baseline or rps / workers
+            speedup = rps / baseline
+            print(f"{workers:>7} {rps:>10.1f} {speedup:>8.2f} {speedup / workers:>10.0%} {errors:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""Scriptable command-line interface (``skysql``).
+
+Unlike the interactive menu in main.py, every command here takes its input
+from arguments so it can be used from scripts and cron jobs:
+
+    skysql ingest flights.csv.gz --airlines airlines.csv --airports airports.csv
+    skysql --partition-dir data/partitions ingest 2015-*.csv
+    skysql refresh
+    skysql flights --date 2015-01-01 --format csv > flights.csv
+    skysql stats routes --year 2015 --format json
+
+Query results are streamed from the database cursor to stdout, so exporting
+millions of rows runs in constant memory.
+"""
+import argparse
+import os
+import sys
+from datetime import date
+from pathlib import Path
+
+from data import BACKENDS, FlightData
+from ingest import IngestError, ingest_csv
+from output import FORMATS, MAX_COLUMN_WIDTH, PAGE_SIZE, WRITERS, prompt_more
+from stats import STATS, STATS_KINDS
+
+DB_PATH = Path(__file__).parent / "data" / "flights.sqlite3"
+
+
+def _flight_data(args):
+    if args.partition_dir:
+        flight_data = FlightData(partition_dir=args.partition_dir)
+    else:
+        flight_data = FlightData(f"sqlite:///{args.database}", backend=args.backend)
+    if not args.no_cache:
+        flight_data.enable_result_cache()
+    return flight_data
+
+
+def _refresh_rollups(args):
+    folded = _flight_data(args).refresh_rollups()
+    for rollup, rows in folded.items():
+        print(f"{rollup}: folded in {rows:,} new flights")
+
+
+def _report_progress(stats):
+    print(f"\r{stats.rows:,} rows loaded ({stats.rows_per_second:,.0f} rows/s)",
+          end="", file=sys.stderr, flush=True)
+
+
+def cmd_ingest(args):
+    if not args.files and not args.airports:
+        print("Nothing to load: pass CSV files and/or --airports", file=sys.stderr)
+        return 1
+    missing = [path for path in args.files + [args.airports] if path and not os.path.exists(path)]
+    if missing:
+        print(f"File not found: {', '.join(missing)}", file=sys.stderr)
+        return 1
+
+    try:
+        stats = ingest_csv(
+            args.files,
+            database=None if args.partition_dir else str(args.database),
+            partition_dir=args.partition_dir,
+            partition_by=args.partition_by,
+            airlines_csv=args.airlines,
+            batch_size=args.batch_size,
+            defer_indexes=not args.keep_indexes,
+            progress=None if args.quiet else _report_progress,
+            airports_csv=args.airports,
+        )
+    except IngestError as e:
+        print(f"\nIngest failed: {e}", file=sys.stderr)
+        return 1
+
+    if not args.quiet:
+        print(file=sys.stderr)
+    print(f"Loaded {stats.rows:,} rows in {stats.seconds:.1f}s "
+          f"({stats.rows_per_second:,.0f} rows/s), rejected {stats.rejected:,}, "
+          f"airlines {len(stats.airlines)}, airports {stats.airports}")
+    for error in stats.errors:
+        print(f"  rejected {error}", file=sys.stderr)
+
+    if not args.no_refresh:
+        _refresh_rollups(args)
+    return 0
+
+
+def cmd_refresh(args):
+    _refresh_rollups(args)
+    return 0
+
+
+def _load_api(args):
+    """Import the API app configured for this command's database."""
+    if args.partition_dir:
+        os.environ["SKYSQL_PARTITION_DIR"] = args.partition_dir
+    else:
+        os.environ["SKYSQL_DATABASE_URI"] = f"sqlite:///{args.database}"
+    os.environ["SKYSQL_BACKEND"] = args.backend
+    if args.no_cache:
+        os.environ["SKYSQL_RESULT_CACHE"] = "0"
+    # An offline export has no client waiting: don't cancel or shed slow requests
+    for name in ("SKYSQL_QUERY_TIMEOUT", "SKYSQL_HEAVY_DEADLINE", "SKYSQL_LIGHT_DEADLINE", "SKYSQL_QUEUE_TIMEOUT"):
+        os.environ.setdefault(name, "3600")
+    os.environ.setdefault("SKYSQL_HEAVY_CONCURRENCY", str(args.workers or os.cpu_count()))
+    import api
+    return api
+
+
+def _report_export(stats):
+    print(f"\r{stats.files:,} files written", end="", file=sys.stderr, flush=True)
+
+
+def cmd_export_static(args):
+    from staticexport import export_static, stats_urls
+
+    api = _load_api(args)
+    urls = stats_urls(api.flight_data)
+    stats = export_static(api.app, urls, args.out_dir, args.workers,
+                          progress=None if args.quiet else _report_export)
+    if not args.quiet:
+        print(file=sys.stderr)
+    if stats.errors:
+        for error in stats.errors:
+            print(f"  failed {error}", file=sys.stderr)
+        print(f"Export failed: {len(stats.errors)} of {len(urls)} responses could not be rendered; "
+              f"{args.out_dir} was left unchanged", file=sys.stderr)
+        return 1
+    print(f"Exported {stats.files:,} responses to {args.out_dir} in {stats.seconds:.1f}s "
+          f"({stats.bytes / 2**20:,.1f} MiB, {stats.compressed_bytes / 2**20:,.1f} MiB gzipped)")
+    return 0
+
+
+def _write_rows(args, rows):
+    """Write ``rows`` to stdout in the requested format; returns the row count."""
+    if args.format != "table":
+        return WRITERS[args.format](rows, sys.stdout)
+    # Only page when someone is there to press Enter
+    interactive = not args.no_pager and sys.stdin.isatty() and sys.stdout.isatty()
+    return WRITERS["table"](
+        rows, sys.stdout, page_size=args.page_size, max_width=args.max_width,
+        more=prompt_more if interactive else None,
+    )
+
+
+def _run_query(args, rows):
+    try:
+        count = _write_rows(args, rows)
+    except BrokenPipeError:
+        # Piped into e.g. head, which stopped reading. Point stdout at devnull
+        # so the interpreter doesn't fail again flushing it on exit.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    except Exception as e:
+        print(f"Database query failed: {e}", file=sys.stderr)
+        return 1
+    if count == 0 and args.format == "table":
+        print("No results.", file=sys.stderr)
+    return 0
+
+
+def cmd_flights(args):
+    data = _flight_data(args)
+    if args.id is not None:
+        rows = data.get_flight_by_id(args.id)
+    elif args.date is not None:
+        rows = data.iter_flights_by_date(args.date.day, args.date.month, args.date.year)
+    else:
+        rows = data.iter_delayed_flights(args.airline, args.origin and args.origin.upper(), args.year, args.month)
+    return _run_query(args, rows)
+
+
+def cmd_stats(args):
+    filters = {name: getattr(args, name) for name in ("year", "month") if getattr(args, name) is not None}
+    return _run_query(args, STATS[args.kind](_flight_data(args), **filters))
+
+
+def _add_output_options(parser):
+    output = parser.add_argument_group("output")
+    output.add_argument("--format", choices=FORMATS, default="table", help="output format (default: %(default)s)")
+    output.add_argument("--page-size", type=int, default=PAGE_SIZE,
+                        help="table rows per page; column widths are sized per page (default: %(default)s)")
+    output.add_argument("--max-width", type=int, default=MAX_COLUMN_WIDTH,
+                        help="truncate table columns to this width (default: %(default)s)")
+    output.add_argument("--no-pager", action="store_true", help="print all table pages without pausing")
+
+
+def _add_date_filter(parser):
+    parser.add_argument("--year", type=int, help="only flights of this year")
+    parser.add_argument("--month", type=int, choices=range(1, 13), metavar="MONTH", help="only flights of this month")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="skysql", description="Flight delay data tools")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--database", type=Path, default=Path(os.environ.get("SKYSQL_DATABASE", DB_PATH)),
+                        help="SQLite database file (default: %(default)s)")
+    source.add_argument("--partition-dir", default=os.environ.get("SKYSQL_PARTITION_DIR"),
+                        help="directory of per-year/per-month partition files")
+    parser.add_argument("--backend", choices=BACKENDS, default=os.environ.get("SKYSQL_BACKEND", "sqlite"),
+                        help="engine for the aggregate queries; duckdb reads a Parquet copy of the database "
+                             "kept up to date by refresh (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true", default=os.environ.get("SKYSQL_RESULT_CACHE") == "0",
+                        help="don't read or store aggregates in the result cache next to the database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="bulk load BTS on-time CSV files (optionally .gz)")
+    ingest.add_argument("files", nargs="*", help="CSV files to load")
+    ingest.add_argument("--airlines", help="airlines.csv with IATA_CODE,AIRLINE to name the carriers")
+    ingest.add_argument("--airports", help="airports.csv with IATA_CODE,AIRPORT,CITY,STATE,COUNTRY,LATITUDE,"
+                                           "LONGITUDE for the location queries (can be loaded on its own)")
+    ingest.add_argument("--partition-by", choices=("month", "year"), default="month",
+                        help="partition size when loading into --partition-dir")
+    ingest.add_argument("--batch-size", type=int, default=50_000, help="rows per executemany batch")
+    ingest.add_argument("--keep-indexes", action="store_true",
+                        help="maintain indexes while loading instead of rebuilding them at the end "
+                             "(faster for small appends to a large table)")
+    ingest.add_argument("--no-refresh", action="store_true",
+                        help="don't update the precomputed rollups after loading")
+    ingest.add_argument("--quiet", action="store_true", help="don't report progress")
+    ingest.set_defaults(func=cmd_ingest)
+
+    refresh = commands.add_parser("refresh", help="update the precomputed rollups (daily stats, delay "
+                                                  "percentile sketches) with newly loaded flights")
+    refresh.set_defaults(func=cmd_refresh)
+
+    flights = commands.add_parser("flights", help="list flights by ID, by date or delayed flights")
+    select = flights.add_mutually_exclusive_group(required=True)
+    select.add_argument("--id", type=int, help="a single flight")
+    select.add_argument("--date", type=date.fromisoformat, help="all flights on a day (YYYY-MM-DD)")
+    select.add_argument("--delayed", action="store_true", help="delayed flights, by airline and delay")
+    delayed = flights.add_argument_group("delayed flights")
+    delayed_by = delayed.add_mutually_exclusive_group()
+    delayed_by.add_argument("--airline", help="only this airline (full name)")
+    delayed_by.add_argument("--origin", help="only from this airport (IATA code)")
+    _add_date_filter(delayed)
+    _add_output_options(flights)
+    flights.set_defaults(func=cmd_flights)
+
+    stats = commands.add_parser("stats", help="delay statistics by airline, hour of day or route")
+    stats.add_argument("kind", choices=STATS_KINDS)
+    _add_date_filter(stats)
+    _add_output_options(stats)
+    stats.set_defaults(func=cmd_stats)
+
+    export = commands.add_parser("export-static", help="render every stats endpoint to precompressed JSON "
+                                                       "files for serving without the API")
+    export.add_argument("out_dir", help="directory to (re)create, mirroring the API paths")
+    export.add_argument("--workers", type=int, default=None, help="responses rendered in parallel "
+                                                                   "(default: number of cores)")
+    export.add_argument("--quiet", action="store_true", help="don't report progress")
+    export.set_defaults(func=cmd_export_static)
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.backend != "sqlite" and args.partition_dir:
+        parser.error(f"--backend {args.backend} needs a single --database, not --partition-dir")
+    if args.command == "flights" and not args.delayed and (
+            args.airline or args.origin or args.year or args.month):
+        parser.error("--airline, --origin, --year and --month only apply to --delayed")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
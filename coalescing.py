@@ -0,0 +1,76 @@
+"""Single-flight coalescing of identical concurrent calls.
+
+When a dashboard refreshes, many requests for the same statistics arrive at
+once. Instead of each running the same full-table GROUP BY, the first caller
+executes it and the others wait for and share its result.
+"""
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiters = 0
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers share its outcome.
+
+    Results are shared, not copied, so callers must treat them as read-only.
+    Only in-flight calls are shared: nothing is cached once a call returns.
+    """
+
+    def __init__(self, metrics=None, prefix="calls"):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.metrics = metrics
+        self.prefix = prefix
+
+    def _count(self, name):
+        # Reported as <prefix>_executed and <prefix>_coalesced
+        if self.metrics is not None:
+            self.metrics.incr(f"{self.prefix}_{name}")
+
+    def do(self, key, fn, timeout=None):
+        """Return ``fn()``, or the result of the identical call already running.
+
+        A caller waiting on another's call gives up with TimeoutError after
+        ``timeout`` seconds; the call itself keeps running for the others.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            self._count("coalesced")
+            if not call.done.wait(timeout):
+                with self._lock:
+                    call.waiters -= 1
+                raise TimeoutError("Timed out waiting for the running call")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        self._count("executed")
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def waiters(self, key):
+        """Number of callers currently waiting on the in-flight call for ``key``."""
+        with self._lock:
+            call = self._calls.get(key)
+            return call.waiters if call is not None else 0
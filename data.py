@@ -1,44 +1,124 @@
-from sqlalchemy import create_engine, text
+import heapq
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import chain
+
+from sqlalchemy import create_engine, make_url, text
+
+from analytics import IDENTITY_COLUMNS, AnalyticsStore
+from coalescing import SingleFlight
+from metrics import Counters
+from partitions import (
+    discover_partitions,
+    merge_concat,
+    merge_counts,
+    merge_sorted,
+    prune_partitions,
+    prune_partitions_between,
+)
+from resultcache import DEFAULT_MAX_BYTES, ResultCache
+from rollups import (
+    QUERY_DAILY_STATS,
+    QUERY_DAILY_STATS_LIVE,
+    daily_stats_params,
+    refresh_daily_stats,
+    rollup_behind,
+)
+from sketches import (
+    DEFAULT_QUANTILES,
+    QUERY_PENDING_DELAYS,
+    load_sketches,
+    pending_sketches,
+    quantile_label,
+    refresh_sketches,
+)
+from snapshots import Snapshot
+from warmup import DerivedIndex
 
 # Constants
 DELAY_THRESHOLD = 20
+BACKENDS = ("sqlite", "duckdb")
+# Rows fetched from the cursor at a time by the streaming queries
+STREAM_BATCH_SIZE = 1000
+# SQLite VM instructions between deadline checks of a running query
+PROGRESS_INTERVAL = 10_000
+
+# Absolute time.monotonic() deadline for the queries of the current request
+_deadline = ContextVar("query_deadline", default=None)
+
+
+class QueryTimeoutError(TimeoutError):
+    """A query was interrupted because it ran past its deadline."""
+
+
+@contextmanager
+def query_deadline(seconds):
+    """Interrupt queries run inside this block once ``seconds`` have passed.
+
+    Nested deadlines can only shorten the enclosing one.
+    """
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
 
 # Query definitions
+#
+# The airlines table is never joined: queries return the airline code
+# (under the key of the name it stands for) and FlightData resolves it
+# from its in-memory copy of the table, see _with_airline_names().
 QUERY_FLIGHT_BY_ID = """
 SELECT flights.ID as id, flights.YEAR as year, flights.MONTH as month, flights.DAY as day, 
        flights.ORIGIN_AIRPORT as origin_airport, flights.DESTINATION_AIRPORT as destination_airport, 
-       airlines.airline as airline_name, flights.DEPARTURE_DELAY as delay
+       flights.AIRLINE as airline_name, flights.DEPARTURE_DELAY as delay
 FROM flights 
-JOIN airlines ON flights.airline = airlines.id 
 WHERE flights.ID = :id
 """
 
+# Ordered by code; FlightData puts it in name order. The unary + keeps SQLite
+# from walking the whole airline index for the order instead of scanning.
 QUERY_DELAYED_FLIGHTS = f"""
 SELECT flights.ID as id, flights.FLIGHT_NUMBER as flight_number, 
        flights.ORIGIN_AIRPORT as origin_airport, flights.DESTINATION_AIRPORT as destination_airport,
-       airlines.airline as airline_name, flights.DEPARTURE_DELAY as delay
+       flights.AIRLINE as airline_name, flights.DEPARTURE_DELAY as delay
 FROM flights 
-JOIN airlines ON flights.airline = airlines.id 
 WHERE flights.DEPARTURE_DELAY >= {DELAY_THRESHOLD}
-ORDER BY airlines.airline, flights.DEPARTURE_DELAY DESC
+ORDER BY +flights.AIRLINE, flights.DEPARTURE_DELAY DESC
 """
 
+# Reads one range of the idx_flights_airline index, already in delay order
 QUERY_DELAYED_FLIGHTS_BY_AIRLINE = f"""
 SELECT flights.ID as id, flights.FLIGHT_NUMBER as flight_number, 
        flights.ORIGIN_AIRPORT as origin_airport, flights.DESTINATION_AIRPORT as destination_airport,
-       airlines.airline as airline_name, flights.DEPARTURE_DELAY as delay
+       flights.AIRLINE as airline_name, flights.DEPARTURE_DELAY as delay
 FROM flights 
-JOIN airlines ON flights.airline = airlines.id 
-WHERE flights.DEPARTURE_DELAY >= {DELAY_THRESHOLD}
-AND airlines.airline = :airline_name
+WHERE flights.AIRLINE = :airline
+AND flights.DEPARTURE_DELAY >= {DELAY_THRESHOLD}
 ORDER BY flights.DEPARTURE_DELAY DESC
 """
 
 QUERY_TOTAL_FLIGHTS_BY_AIRLINE = """
-SELECT airlines.airline, COUNT(*) as total_flights 
+SELECT flights.AIRLINE as airline, COUNT(*) as total_flights 
 FROM flights 
-JOIN airlines ON flights.airline = airlines.id 
-GROUP BY airlines.airline
+GROUP BY flights.AIRLINE
+"""
+
+QUERY_DELAYED_COUNTS_BY_AIRLINE = f"""
+SELECT flights.AIRLINE as airline, COUNT(*) as delayed_flights
+FROM flights
+WHERE flights.DEPARTURE_DELAY >= {DELAY_THRESHOLD}
+GROUP BY flights.AIRLINE
+"""
+
+QUERY_AIRLINE_NAMES = """
+SELECT ID AS id, AIRLINE AS airline FROM airlines
 """
 
 QUERY_DELAYED_FLIGHTS_BY_HOUR = f"""
@@ -71,9 +151,8 @@ GROUP BY ORIGIN_AIRPORT, DESTINATION_AIRPORT
 
 QUERY_FLIGHTS_BY_ORIGIN = f"""
 SELECT flights.ID as id, flights.ORIGIN_AIRPORT as origin_airport, flights.DESTINATION_AIRPORT as destination_airport, 
-       airlines.airline as airline_name, flights.DEPARTURE_DELAY as delay
+       flights.AIRLINE as airline_name, flights.DEPARTURE_DELAY as delay
 FROM flights 
-JOIN airlines ON flights.airline = airlines.id 
 WHERE flights.ORIGIN_AIRPORT = :origin
   AND flights.DEPARTURE_DELAY IS NOT NULL
   AND flights.DEPARTURE_DELAY >= {DELAY_THRESHOLD}
@@ -82,9 +161,8 @@ WHERE flights.ORIGIN_AIRPORT = :origin
 QUERY_FLIGHTS_BY_DATE = """
 SELECT flights.ID as id, flights.YEAR as year, flights.MONTH as month, flights.DAY as day, 
        flights.ORIGIN_AIRPORT as origin_airport, flights.DESTINATION_AIRPORT as destination_airport, 
-       airlines.airline as airline_name, flights.DEPARTURE_DELAY as delay
+       flights.AIRLINE as airline_name, flights.DEPARTURE_DELAY as delay
 FROM flights 
-JOIN airlines ON flights.airline = airlines.id 
 WHERE flights.DAY = :day AND flights.MONTH = :month AND flights.YEAR = :year
 """
 
@@ -100,66 +178,746 @@ ORDER BY flights.DEPARTURE_DELAY DESC
 LIMIT :limit
 """
 
+QUERY_AIRPORT_CODES = """
+SELECT ORIGIN_AIRPORT AS code FROM flights
+UNION
+SELECT DESTINATION_AIRPORT FROM flights
+"""
+
+QUERY_MONTHS = """
+SELECT DISTINCT YEAR AS year, MONTH AS month FROM flights
+"""
+
+QUERY_AIRPORTS = """
+SELECT IATA_CODE AS code, AIRPORT AS name, CITY AS city, STATE AS state, COUNTRY AS country,
+       LATITUDE AS latitude, LONGITUDE AS longitude
+FROM airports
+"""
+
+# {codes} is replaced by one named parameter per airport code
+QUERY_DEPARTURE_STATS_BY_AIRPORT = f"""
+SELECT ORIGIN_AIRPORT AS airport, COUNT(*) AS total_flights,
+       COUNT(CASE WHEN DEPARTURE_DELAY >= {DELAY_THRESHOLD} THEN 1 END) AS delayed_flights
+FROM flights
+WHERE ORIGIN_AIRPORT IN ({{codes}})
+GROUP BY ORIGIN_AIRPORT
+"""
+
+
+def _scope_to_date(query, year=None, month=None):
+    """Restrict every read of the flights table in ``query`` to one year and/or month."""
+    conditions = []
+    if year is not None:
+        conditions.append("YEAR = :year")
+    if month is not None:
+        conditions.append("MONTH = :month")
+    if not conditions:
+        return query
+    scoped = f"FROM (SELECT * FROM flights WHERE {' AND '.join(conditions)}) AS flights"
+    return re.sub(r"\bFROM flights\b", scoped, query)
+
+
+def _freeze(params):
+    return tuple(sorted(params.items())) if params else ()
+
+
+def _date_params(year=None, month=None):
+    params = {}
+    if year is not None:
+        params["year"] = year
+    if month is not None:
+        params["month"] = month
+    return params
+
 
 class FlightData:
-    def __init__(self, uri):
-        self.engine = create_engine(uri)
+    def __init__(self, uri=None, partition_dir=None, max_workers=None, query_timeout=None,
+                 backend="sqlite", analytics_dir=None):
+        """Connect to a single database ``uri`` or to a directory of partitions.
+
+        With ``partition_dir`` every query is pruned to the partitions matching
+        its date filter and run on up to ``max_workers`` partitions at once
+        (defaults to the number of cores).
+
+        Queries running longer than ``query_timeout`` seconds (or past the
+        deadline of an enclosing query_deadline() block) are interrupted and
+        raise QueryTimeoutError.
 
-    def _execute_query(self, query, params=None):
+        With ``backend="duckdb"`` the aggregate queries run on a columnar
+        copy of a single SQLite database, kept as Parquet files in
+        ``analytics_dir`` (default ``<database>.parquet``) and updated by
+        refresh_rollups(). Lookups still run on SQLite.
+
+        A single SQLite database file can be replaced while in use: see
+        swap_snapshot() and snapshots.py.
+        """
+        if (uri is None) == (partition_dir is None):
+            raise ValueError("Pass exactly one of uri or partition_dir")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, choose one of: {', '.join(BACKENDS)}")
+        self.partition_dir = partition_dir
+        self.max_workers = max_workers or os.cpu_count()
+        self.query_timeout = query_timeout
+        self._executor = None
+        self.metrics = Counters()
+        # Concurrent identical queries (same SQL, params and partitions) share one execution
+        self._partitions_single_flight = SingleFlight(self.metrics, prefix="queries")
+        self.result_cache = None
+        # Code -> name of every airline, reloaded whenever the database changes
+        self._airline_names = DerivedIndex(self, lambda data: data._load_airline_names())
+        # Rollups missing flights of the database, checked again whenever it changes
+        self._stale_rollups = DerivedIndex(self, lambda data: data._load_stale_rollups())
+        self._uri = uri
+        # Snapshot the queries of the current request run on (see pinned_snapshot())
+        self._pinned = ContextVar(f"pinned_snapshot_{id(self)}", default=None)
+        if partition_dir is None:
+            self._snapshot = self.open_snapshot()
+            self.partitions = []
+        else:
+            self._snapshot = None
+            self.refresh_partitions()
+
+        self.analytics = None
+        if backend == "duckdb":
+            if self.engine is None or not self.database_files():
+                raise ValueError("The duckdb backend needs a single SQLite database file")
+            self.analytics = AnalyticsStore(analytics_dir or f"{self.database_files()[0]}.parquet")
+
+    @property
+    def engine(self):
+        """Engine of the single database (None with partitions), in the pinned or current snapshot."""
+        snapshot = self._active_snapshot()
+        return None if snapshot is None else snapshot.engine
+
+    @property
+    def _single_flight(self):
+        snapshot = self._active_snapshot()
+        return self._partitions_single_flight if snapshot is None else snapshot.single_flight
+
+    def _active_snapshot(self):
+        return self._pinned.get() or self._snapshot
+
+    def open_snapshot(self):
+        """Open the single database as it is now on disk, next to the snapshot being served."""
+        if self.partition_dir is not None:
+            raise ValueError("Snapshots are only supported for a single database")
+        url = make_url(self._uri)
+        if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:":
+            return Snapshot(create_engine(self._uri), metrics=self.metrics)
+        # Through a symlink, stay on the version it points to now
+        real_path = os.path.realpath(url.database)
+        return Snapshot(create_engine(url.set(database=real_path)), url.database, self.metrics, real_path)
+
+    def snapshot_replaced(self):
+        """Whether the database file was replaced since the current snapshot was opened."""
+        return self._snapshot is not None and self._snapshot.replaced()
+
+    @contextmanager
+    def pinned_snapshot(self, snapshot=None):
+        """Run the queries of this block on ``snapshot`` (default: the current one).
+
+        A snapshot swapped in meanwhile is only used after the block.
+        """
+        token = self._pinned.set(snapshot or self._active_snapshot())
+        try:
+            yield
+        finally:
+            self._pinned.reset(token)
+
+    def swap_snapshot(self, snapshot):
+        """Serve ``snapshot`` (from open_snapshot()) from now on.
+
+        Queries pinned to the previous snapshot keep running on it; it is
+        closed once they are all done. With the duckdb backend, aggregates
+        run on SQLite until the columnar copy is refreshed for the new file
+        (see _analytics_current()).
+        """
+        self._snapshot = snapshot
+        self.metrics.incr("snapshot_swaps")
+
+    def refresh_partitions(self):
+        """Pick up partition files added to (or removed from) ``partition_dir``."""
+        current = {path: engine for _, _, path, engine in getattr(self, "partitions", [])}
+        partitions = []
+        for year, month, path in discover_partitions(self.partition_dir):
+            engine = current.pop(path, None) or create_engine(f"sqlite:///{path}")
+            partitions.append((year, month, path, engine))
+        for engine in current.values():
+            engine.dispose()
+        self.partitions = partitions
+
+    def enable_result_cache(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        """Keep the stats aggregates in a persistent ResultCache shared with other processes.
+
+        ``path`` defaults to a sidecar of the database: ``<database>.cache``,
+        or ``result_cache.sqlite3`` in the partition directory. Without a
+        database file (e.g. in memory) nothing is cached.
+        """
+        if path is None:
+            if self.partition_dir is not None:
+                path = os.path.join(self.partition_dir, "result_cache.sqlite3")
+            elif self.database_files():
+                path = f"{self.database_files()[0]}.cache"
+            else:
+                return None
+        self.result_cache = ResultCache(path, max_bytes)
+        return self.result_cache
+
+    def _engines(self):
+        if self.engine is not None:
+            return [self.engine]
+        return [p[3] for p in self.partitions]
+
+    def _deadline(self):
+        """Deadline for a query starting now: the query timeout or the request's, whichever is sooner."""
+        deadline = _deadline.get()
+        if self.query_timeout is not None:
+            own = time.monotonic() + self.query_timeout
+            deadline = own if deadline is None else min(deadline, own)
+        return deadline
+
+    def _query_timed_out(self, query, started):
+        self.metrics.record("queries_timed_out", {
+            "query": " ".join(query.split())[:200],
+            "seconds": round(time.monotonic() - started, 3),
+        })
+        return QueryTimeoutError("Query exceeded its time limit and was cancelled")
+
+    @contextmanager
+    def _connect(self, engine, query, deadline=None):
+        """A connection to ``engine`` whose statements are interrupted past ``deadline``.
+
+        An interrupted statement raises QueryTimeoutError, recorded under
+        ``query``; other errors propagate as they are.
+        """
+        started = time.monotonic()
+        with engine.connect() as conn:
+            dbapi_conn = conn.connection.dbapi_connection
+            interruptible = deadline is not None and hasattr(dbapi_conn, "set_progress_handler")
+            if interruptible:
+                # Returning True from the handler makes SQLite abort the statement
+                dbapi_conn.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_INTERVAL)
+            try:
+                yield conn
+            except Exception as e:
+                if deadline is not None and time.monotonic() > deadline and "interrupted" in str(e):
+                    raise self._query_timed_out(query, started) from e
+                raise
+            finally:
+                if interruptible:
+                    dbapi_conn.set_progress_handler(None, 0)
+
+    def _execute_query(self, query, params=None, engine=None, deadline=None):
         if params is None:
             params = {}
+        if engine is None:
+            engine = self.engine
         try:
-            with self.engine.connect() as conn:
+            with self._connect(engine, query, deadline) as conn:
                 result = conn.execute(text(query), parameters=params)
-                rows = [dict(row._mapping) for row in result]
-                # Lowercase keys immediately
-                return [{k.lower(): v for k, v in row.items()} for row in rows]
+                # Build each row once, with lowercase keys, straight off the cursor
+                keys = [key.lower() for key in result.keys()]
+                return [dict(zip(keys, row)) for row in result]
+        except QueryTimeoutError:
+            raise
         except Exception as e:
             print(f"Database query failed: {e}")
             return []
 
+    def _stream_query(self, query, params=None, engine=None):
+        """Yield the rows of ``query`` one at a time as they come off the cursor.
+
+        Unlike _execute_query() errors propagate, since rows may already have
+        been consumed when one occurs.
+        """
+        if engine is None:
+            engine = self.engine
+        # Taken when the first row is asked for, so inside the reader's deadline
+        with self._connect(engine, query, self._deadline()) as conn:
+            result = conn.execution_options(yield_per=STREAM_BATCH_SIZE).execute(text(query), params or {})
+            keys = [key.lower() for key in result.keys()]
+            for row in result:
+                yield dict(zip(keys, row))
+
+    def _stream(self, query, params=None, key=None, year=None, month=None):
+        """Stream ``query`` from the single database or from each partition in turn.
+
+        Queries with an ORDER BY pass its ``key`` so the per-partition streams
+        are merged lazily into one ordered stream.
+        """
+        if self.engine is not None:
+            return self._stream_query(query, params)
+        streams = [
+            self._stream_query(query, params, p[3]) for p in prune_partitions(self.partitions, year, month)
+        ]
+        if key is None:
+            return chain.from_iterable(streams)
+        return heapq.merge(*streams, key=key)
+
+    def _query(self, query, params=None, merge=merge_concat, year=None, month=None, between=None, cache=False,
+               analytics=False):
+        """Run ``query`` on the single database or fan it out over the partitions.
+
+        ``year``/``month`` (or a ``between`` pair of dates) select the
+        partitions to read; they don't filter rows by themselves, so
+        date-filtered queries must also scope their SQL.
+
+        If the same query is already running in another thread, waits for
+        it and returns its (shared, read-only) result instead. With
+        ``cache`` the result is also looked up in and stored to the
+        persistent result cache, if enabled. With ``analytics`` it runs on
+        the columnar copy instead of SQLite, if that is enabled and current.
+        """
+        # Both engines return the same rows, so the key doesn't depend on which runs it
+        key = (query, _freeze(params), year, month, between)
+        analytics = analytics and self._analytics_current()
+        deadline = self._deadline()
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+        started = time.monotonic()
+
+        def run():
+            if analytics:
+                return self._run_analytics(query, params, deadline)
+            return self._run_query(query, params, merge, year, month, between, deadline)
+
+        try:
+            if cache and self.result_cache is not None:
+                return self._single_flight.do(key, lambda: self._cached(key, run), timeout)
+            return self._single_flight.do(key, run, timeout)
+        except QueryTimeoutError:
+            raise
+        except TimeoutError as e:
+            # Gave up waiting for the same query running on behalf of another request
+            raise self._query_timed_out(query, started) from e
+
+    def _analytics_current(self):
+        """Whether the columnar copy holds exactly the flights in SQLite.
+
+        The last exported flight must also be SQLite's flight of that ID:
+        otherwise the copy was exported from a database since replaced.
+        """
+        if self.analytics is None:
+            return False
+        last_id = self.analytics.last_id()
+        rows = self._execute_query(
+            f"SELECT (SELECT MAX(ID) FROM flights) AS max_id, {', '.join(IDENTITY_COLUMNS)} FROM flights "
+            "WHERE ID = :last_id",
+            {"last_id": last_id},
+        )
+        if not rows or rows[0]["max_id"] != last_id:
+            return False
+        return tuple(rows[0][column.lower()] for column in IDENTITY_COLUMNS) == self.analytics.last_flight()
+
+    def _run_analytics(self, query, params, deadline=None):
+        started = time.monotonic()
+        self.metrics.incr("analytics_queries")
+        try:
+            return self.analytics.query(query, params, None if deadline is None else deadline - started)
+        except TimeoutError as e:
+            raise self._query_timed_out(query, started) from e
+        except Exception as e:
+            print(f"Analytics query failed, running it on SQLite: {e}")
+            return self._execute_query(query, params, deadline=deadline)
+
+    def _cached(self, key, run):
+        fingerprint = self.fingerprint()
+        rows = self.result_cache.get(key, fingerprint)
+        if rows is not None:
+            self.metrics.incr("result_cache_hits")
+            return rows
+        self.metrics.incr("result_cache_misses")
+        rows = run()
+        # Failed queries come back empty, so empty results are never stored;
+        # neither is a result the database changed under
+        if rows and self.fingerprint() == fingerprint:
+            self.result_cache.put(key, fingerprint, rows)
+        return rows
+
+    def _run_query(self, query, params, merge, year, month, between, deadline=None):
+        if self.engine is not None:
+            return self._execute_query(query, params, deadline=deadline)
+
+        if between is not None:
+            partitions = prune_partitions_between(self.partitions, *between)
+        else:
+            partitions = prune_partitions(self.partitions, year, month)
+        engines = [p[3] for p in partitions]
+        if len(engines) <= 1:
+            return merge([self._execute_query(query, params, engine, deadline) for engine in engines])
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        # sqlite3 releases the GIL while a statement runs, so partitions are
+        # scanned in parallel on separate connections.
+        results = self._executor.map(lambda engine: self._execute_query(query, params, engine, deadline), engines)
+        return merge(list(results))
+
+    def _stats_query(self, query, merge, year=None, month=None):
+        return self._query(
+            _scope_to_date(query, year, month), _date_params(year, month), merge, year, month,
+            cache=True, analytics=True,
+        )
+
+    def _with_airline_names(self, rows, key="airline_name"):
+        """Copies of ``rows`` with the airline code under ``key`` replaced by its name.
+
+        Rows of airlines missing from the airlines table are dropped, as the
+        JOIN this replaces did.
+        """
+        names = self.get_airline_names()
+        return [{**row, key: names[row[key]]} for row in rows if row[key] in names]
+
+    def _iter_with_airline_names(self, rows):
+        names = self.get_airline_names()
+        for row in rows:
+            if row["airline_name"] in names:
+                yield {**row, "airline_name": names[row["airline_name"]]}
+
+    def _airline_codes(self, airline_name):
+        """Sorted codes of the airlines named ``airline_name`` (usually one)."""
+        return sorted(code for code, name in self.get_airline_names().items() if name == airline_name)
+
     def get_flight_by_id(self, flight_id):
-        return self._execute_query(QUERY_FLIGHT_BY_ID, {"id": flight_id})
+        return self._with_airline_names(self._query(QUERY_FLIGHT_BY_ID, {"id": flight_id}))
 
     def get_flights_by_date(self, day, month, year):
-        return self._execute_query(QUERY_FLIGHTS_BY_DATE, {"day": day, "month": month, "year": year})
+        return self._with_airline_names(self._query(
+            QUERY_FLIGHTS_BY_DATE, {"day": day, "month": month, "year": year}, year=year, month=month
+        ))
 
-    def get_delayed_flights_by_airline(self, airline_name=None):
+    def get_delayed_flights_by_airline(self, airline_name=None, year=None, month=None):
         if airline_name:
-            return self._execute_query(QUERY_DELAYED_FLIGHTS_BY_AIRLINE, {"airline_name": airline_name})
+            # The name is translated to codes, so the airline's flights are
+            # read through the index instead of matching every flight's name
+            query = _scope_to_date(QUERY_DELAYED_FLIGHTS_BY_AIRLINE, year, month)
+            rows = []
+            for code in self._airline_codes(airline_name):
+                rows += self._query(
+                    query, {"airline": code, **_date_params(year, month)},
+                    merge_sorted(key=lambda r: -r["delay"]), year, month,
+                )
+            rows = self._with_airline_names(rows)
+            rows.sort(key=lambda r: -r["delay"])
+            return rows
         else:
-            return self._execute_query(QUERY_DELAYED_FLIGHTS)
+            return self.get_delayed_flights(year, month)
 
     def get_delayed_flights_by_airport(self, airport_code):
-        return self._execute_query(QUERY_FLIGHTS_BY_ORIGIN, {"origin": airport_code})
+        return self._with_airline_names(self._query(QUERY_FLIGHTS_BY_ORIGIN, {"origin": airport_code}))
 
     def get_top_delayed_flights_by_date(self, day, month, year, limit=5):
-        return self._execute_query(
-            QUERY_TOP_5_DELAYED_FLIGHTS_BY_DATE, 
-            {"day": day, "month": month, "year": year, "limit": limit}
+        return self._query(
+            QUERY_TOP_5_DELAYED_FLIGHTS_BY_DATE,
+            {"day": day, "month": month, "year": year, "limit": limit},
+            merge_sorted(key=lambda r: -r["delay"], limit=limit),
+            year, month,
         )
 
-    def get_delayed_flights(self):
-        return self._execute_query(QUERY_DELAYED_FLIGHTS)
+    def get_delayed_flights(self, year=None, month=None):
+        # A list of flights, not an aggregate: kept out of the result cache and off DuckDB
+        rows = self._with_airline_names(self._query(
+            _scope_to_date(QUERY_DELAYED_FLIGHTS, year, month), _date_params(year, month),
+            merge_sorted(key=lambda r: (r["airline_name"], -r["delay"])), year, month,
+        ))
+        # Already in runs per airline, so re-sorting by name is cheap
+        rows.sort(key=lambda r: (r["airline_name"], -r["delay"]))
+        return rows
 
-    def get_total_flights_by_airline(self):
-        return self._execute_query(QUERY_TOTAL_FLIGHTS_BY_AIRLINE)
+    def iter_flights_by_date(self, day, month, year):
+        """Like get_flights_by_date(), but yields rows without loading them all."""
+        return self._iter_with_airline_names(self._stream(
+            QUERY_FLIGHTS_BY_DATE, {"day": day, "month": month, "year": year}, year=year, month=month
+        ))
 
-    def get_delayed_flights_by_hour(self):
-        return self._execute_query(QUERY_DELAYED_FLIGHTS_BY_HOUR)
+    def iter_delayed_flights(self, airline_name=None, origin=None, year=None, month=None):
+        """Yield delayed flights, optionally of one airline or from one origin airport."""
+        params = _date_params(year, month)
+        if origin and not airline_name:
+            query = _scope_to_date(QUERY_FLIGHTS_BY_ORIGIN, year, month)
+            return self._iter_with_airline_names(self._stream(query, {**params, "origin": origin}, None, year, month))
 
-    def get_total_flights_by_hour(self):
-        return self._execute_query(QUERY_TOTAL_FLIGHTS_BY_HOUR)
+        # One airline after the other in name order, each read through the
+        # index in delay order
+        names = self.get_airline_names()
+        if airline_name:
+            codes = self._airline_codes(airline_name)
+        else:
+            codes = sorted(names, key=lambda code: (names[code] or "", code))
+        query = _scope_to_date(QUERY_DELAYED_FLIGHTS_BY_AIRLINE, year, month)
+        streams = [
+            self._stream(query, {**params, "airline": code}, lambda r: -r["delay"], year, month) for code in codes
+        ]
+        if airline_name and len(streams) > 1:
+            rows = heapq.merge(*streams, key=lambda r: -r["delay"])
+        else:
+            rows = chain.from_iterable(streams)
+        return self._iter_with_airline_names(rows)
 
-    def get_delayed_flights_by_route(self):
-        return self._execute_query(QUERY_DELAYED_FLIGHTS_BY_ROUTE)
+    def get_total_flights_by_airline(self, year=None, month=None):
+        rows = self._stats_query(QUERY_TOTAL_FLIGHTS_BY_AIRLINE, merge_counts("total_flights"), year, month)
+        # Airlines sharing a name are counted together
+        return merge_counts("total_flights")([self._with_airline_names(rows, key="airline")])
 
-    def get_total_flights_by_route(self):
-        return self._execute_query(QUERY_TOTAL_FLIGHTS_BY_ROUTE)
+    def get_delayed_counts_by_airline(self, year=None, month=None):
+        rows = self._stats_query(QUERY_DELAYED_COUNTS_BY_AIRLINE, merge_counts("delayed_flights"), year, month)
+        return merge_counts("delayed_flights")([self._with_airline_names(rows, key="airline")])
 
-    def __del__(self):
-        if hasattr(self, "engine"):
+    def get_delayed_flights_by_hour(self, year=None, month=None):
+        return self._stats_query(
+            QUERY_DELAYED_FLIGHTS_BY_HOUR, merge_counts("delayed_flights", sort_key="hour"), year, month
+        )
+
+    def get_total_flights_by_hour(self, year=None, month=None):
+        return self._stats_query(
+            QUERY_TOTAL_FLIGHTS_BY_HOUR, merge_counts("total_flights", sort_key="hour"), year, month
+        )
+
+    def get_delayed_flights_by_route(self, year=None, month=None):
+        return self._stats_query(QUERY_DELAYED_FLIGHTS_BY_ROUTE, merge_counts("delayed_flights"), year, month)
+
+    def get_total_flights_by_route(self, year=None, month=None):
+        return self._stats_query(QUERY_TOTAL_FLIGHTS_BY_ROUTE, merge_counts("total_flights"), year, month)
+
+    def get_airline_names(self):
+        """Map airline codes to names.
+
+        The airlines table is small, so it is held in memory and only read
+        again when the database changes (see fingerprint()). The mapping is
+        shared: don't modify it.
+        """
+        return self._airline_names.get()
+
+    def _load_airline_names(self):
+        # Each partition carries the airlines of its own load; the latest name of a code wins.
+        # Errors propagate rather than leave an empty map in use until the database changes.
+        names = {}
+        for engine in self._engines():
+            with self._connect(engine, QUERY_AIRLINE_NAMES, self._deadline()) as conn:
+                names.update(conn.execute(text(QUERY_AIRLINE_NAMES)).all())
+        return names
+
+    def get_airport_codes(self):
+        """Sorted IATA codes of every airport with a departure or arrival."""
+        return sorted({row["code"] for row in self._query(QUERY_AIRPORT_CODES) if row["code"]})
+
+    def get_months(self):
+        """Sorted (year, month) pairs that have flights."""
+        return sorted({(row["year"], row["month"]) for row in self._query(QUERY_MONTHS) if row["year"]})
+
+    def get_airports(self):
+        """Every airport with its location, from the airports table loaded by ``ingest --airports``."""
+        # Each partition carries the airports of its own load; the latest copy of a code wins
+        airports = {row["code"]: row for row in self._query(QUERY_AIRPORTS)}
+        return [airports[code] for code in sorted(airports)]
+
+    def get_departure_stats_by_airport(self, codes, year=None, month=None):
+        """Total and delayed departures of each airport in ``codes``.
+
+        Only the flights leaving those airports are read, through the
+        origin index.
+        """
+        codes = sorted(set(codes))
+        if not codes:
+            return []
+        params = {f"code{i}": code for i, code in enumerate(codes)}
+        query = QUERY_DEPARTURE_STATS_BY_AIRPORT.format(codes=", ".join(f":{name}" for name in params))
+        return self._query(
+            _scope_to_date(query, year, month), {**params, **_date_params(year, month)},
+            merge_counts("total_flights", "delayed_flights"), year, month,
+        )
+
+    def get_daily_stats(self, start, end):
+        """Total and delayed flights per day and airline between two dates (inclusive).
+
+        Read from the ``daily_stats`` rollup maintained by refresh_rollups(),
+        or from ``flights`` while the rollup is behind (see stale_rollups()).
+        """
+        # Each day lives in exactly one partition, so the partial results just concatenate
+        if "daily_stats" in self.stale_rollups():
+            params = {**daily_stats_params(start, end), "delay_threshold": DELAY_THRESHOLD}
+            return self._query(QUERY_DAILY_STATS_LIVE, params, between=(start, end))
+        return self._query(QUERY_DAILY_STATS, daily_stats_params(start, end), between=(start, end))
+
+    def stale_rollups(self):
+        """Names of the precomputed data missing flights of the database.
+
+        ``daily_stats`` and ``delay_sketches`` when flights were added (on
+        any partition) or a database was dropped in without
+        refresh_rollups(); ``parquet`` when the columnar copy isn't current.
+        Reads fall back to ``flights`` for the stale rollups meanwhile.
+        """
+        stale = self._stale_rollups.get()
+        if self.analytics is not None and not self._analytics_current():
+            stale = stale | {"parquet"}
+        return stale
+
+    def _load_stale_rollups(self):
+        stale = set()
+        for engine in self._engines():
+            with self._connect(engine, "rollup_state", self._deadline()) as conn:
+                if rollup_behind(conn, "daily_stats"):
+                    stale.add("daily_stats")
+                if rollup_behind(conn, "delay_sketches", QUERY_PENDING_DELAYS):
+                    stale.add("delay_sketches")
+        if stale:
+            print(f"Rollups behind the flights table ({', '.join(sorted(stale))}): "
+                  f"answering from flights until refresh_rollups() runs")
+        return frozenset(stale)
+
+    def refresh_rollups(self):
+        """Bring every precomputed rollup up to date with newly added flights.
+
+        Returns the number of flights folded into each rollup.
+        """
+        folded = {"daily_stats": 0}
+        for engine in self._engines():
+            with engine.begin() as conn:
+                folded["daily_stats"] += refresh_daily_stats(conn, DELAY_THRESHOLD)
+        folded["delay_sketches"] = self.refresh_delay_sketches()
+        if self.analytics is not None:
+            folded["parquet"] = self.analytics.refresh(self.database_files()[0])
+        return folded
+
+    def refresh_delay_sketches(self):
+        """Fold flights added since the last refresh into the stored delay sketches.
+
+        Runs on every partition; returns the number of flights read.
+        """
+        rows = 0
+        for engine in self._engines():
+            with engine.begin() as conn:
+                rows += refresh_sketches(conn)
+        return rows
+
+    def get_delay_percentiles(self, dimension, quantiles=DEFAULT_QUANTILES, key=None, combine=False):
+        """Departure delay percentiles per airline, airport, route or hour.
+
+        Answered from the sketches stored by refresh_delay_sketches(); the
+        sketches of every partition are merged per key, and with ``combine``
+        all keys are merged into a single row. While they are behind (see
+        stale_rollups()), the flights not folded in yet are sketched in
+        memory and merged in too.
+        """
+        stale = "delay_sketches" in self.stale_rollups()
+        merged = {}
+        for engine in self._engines():
+            with self._connect(engine, f"delay_sketches {dimension}", self._deadline()) as conn:
+                sketches = list(load_sketches(conn, dimension, key).items())
+                if stale:
+                    sketches += pending_sketches(conn, dimension, key).items()
+                for sketch_key, sketch in sketches:
+                    if sketch_key in merged:
+                        merged[sketch_key].merge(sketch)
+                    else:
+                        merged[sketch_key] = sketch
+
+        labels = [quantile_label(q) for q in quantiles]
+        if combine:
+            total = None
+            for sketch in merged.values():
+                total = sketch if total is None else total.merge(sketch)
+            if total is None:
+                return []
+            return [{"flights": total.n, **dict(zip(labels, total.quantiles(quantiles)))}]
+
+        names = self.get_airline_names() if dimension == "airlines" else {}
+        rows = []
+        for sketch_key, sketch in merged.items():
+            if dimension == "airlines":
+                row = {"airline": names.get(sketch_key, sketch_key)}
+            elif dimension == "airports":
+                row = {"airport": sketch_key}
+            elif dimension == "routes":
+                origin, destination = sketch_key.split("-", 1)
+                row = {"origin": origin, "destination": destination}
+            else:
+                row = {"hour": int(sketch_key)}
+            row["flights"] = sketch.n
+            row.update(zip(labels, sketch.quantiles(quantiles)))
+            rows.append(row)
+        if dimension == "hours":
+            rows.sort(key=lambda r: r["hour"])
+        return rows
+
+    def explain(self, query, params=None):
+        """Detail lines of the EXPLAIN QUERY PLAN of ``query`` (on the first partition)."""
+        engines = self._engines()
+        if not engines:
+            return []
+        with self._connect(engines[0], f"EXPLAIN QUERY PLAN {query}", self._deadline()) as conn:
+            rows = conn.execute(text(f"EXPLAIN QUERY PLAN {query}"), params or {})
+            return [row[-1] for row in rows]
+
+    def database_files(self):
+        """Paths of the SQLite files behind this instance (none for other databases)."""
+        snapshot = self._active_snapshot()
+        if snapshot is None:
+            return [p[2] for p in self.partitions]
+        return [] if snapshot.path is None else [snapshot.path]
+
+    def fingerprint(self):
+        """Size, modification time and SQLite change counter of every database file.
+
+        WAL files are included too. Changes whenever data is written, so it
+        tells when precomputed results are stale. A single database is
+        identified by the snapshot in use, so a replaced file gets a new
+        fingerprint only once it is swapped in.
+        """
+        snapshot = self._active_snapshot()
+        if snapshot is not None:
+            state = snapshot.file_state()
+            if state is None:
+                return ()
+            if snapshot.replaced():
+                # The WAL next to the path belongs to the new file
+                return (state,)
+            paths = [f"{snapshot.path}-wal"]
+            state = [state]
+        else:
+            paths = [name for path in self.database_files() for name in (path, f"{path}-wal")]
+            state = []
+        for name in paths:
             try:
-                self.engine.dispose()
-            except Exception:
-                pass
+                stat = os.stat(name)
+                with open(name, "rb") as f:
+                    # Bytes 24-27 of the database header count committed
+                    # changes (meaningless but harmless for a WAL file)
+                    f.seek(24)
+                    counter = f.read(4)
+            except OSError:
+                continue
+            state.append((str(name), stat.st_size, stat.st_mtime_ns, counter))
+        return tuple(state)
+
+    def get_metrics(self):
+        """Counters of this process, e.g. queries executed and coalesced.
+
+        The most recent queries cancelled for running too long are listed
+        under ``recent_queries_timed_out``.
+        """
+        metrics = self.metrics.snapshot()
+        timed_out = self.metrics.events("queries_timed_out")
+        if timed_out:
+            metrics["recent_queries_timed_out"] = timed_out
+        return metrics
+
+    def dispose_after_fork(self):
+        # Called in each worker after a pre-forking server (gunicorn with
+        # preload_app) forks. Pooled SQLite connections inherited from the
+        # parent must never be used by the child, so drop them without closing
+        # the parent's handles; the child then opens its own on first use.
+        # The parent's partition thread pool has no threads in the child.
+        for engine in self._engines():
+            engine.dispose(close=False)
+        self._executor = None
+        if self.analytics is not None:
+            self.analytics.dispose_after_fork()
+
+    def __del__(self):
+        try:
+            for engine in self._engines():
+                engine.dispose()
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+        except Exception:
+            pass
@@ -0,0 +1,147 @@
+"""Airport locations and a grid index for radius and corridor queries.
+
+Airports are bucketed into cells of ``cell_degrees`` latitude by longitude.
+A radius query only visits the cells overlapping the circle's bounding box
+(wrapping around the antimeridian) and computes exact great-circle
+distances for the airports in them, instead of measuring every airport.
+"""
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Longest radius or corridor width accepted by the API
+MAX_RADIUS_KM = 2000
+# Narrowest corridor accepted by the API
+MIN_CORRIDOR_WIDTH_KM = 1
+
+# Most points a corridor query searches around; a narrow corridor on a long
+# route gets fewer, wider-spaced points with larger search circles instead
+MAX_CORRIDOR_STEPS = 1000
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _bearing(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dlon = math.radians(lon2 - lon1)
+    return math.atan2(math.sin(dlon) * math.cos(phi2),
+                      math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(dlon))
+
+
+def distance_to_segment_km(lat, lon, start, end):
+    """Distance from a point to the great-circle segment between two (lat, lon) points."""
+    to_point = haversine_km(start[0], start[1], lat, lon)
+    angle = _bearing(start[0], start[1], lat, lon) - _bearing(start[0], start[1], end[0], end[1])
+    if math.cos(angle) <= 0:
+        # Behind the start of the segment
+        return to_point
+    angular = to_point / EARTH_RADIUS_KM
+    cross_track = math.asin(max(-1.0, min(1.0, math.sin(angular) * math.sin(angle))))
+    along_track = math.acos(max(-1.0, min(1.0, math.cos(angular) / math.cos(cross_track))))
+    if along_track * EARTH_RADIUS_KM > haversine_km(start[0], start[1], end[0], end[1]):
+        # Past its end
+        return haversine_km(end[0], end[1], lat, lon)
+    return abs(cross_track) * EARTH_RADIUS_KM
+
+
+def _intermediate(start, end, fraction):
+    """The point ``fraction`` of the way along the great circle from start to end."""
+    phi1, lam1 = math.radians(start[0]), math.radians(start[1])
+    phi2, lam2 = math.radians(end[0]), math.radians(end[1])
+    delta = haversine_km(*start, *end) / EARTH_RADIUS_KM
+    if delta == 0:
+        return start
+    a = math.sin((1 - fraction) * delta) / math.sin(delta)
+    b = math.sin(fraction * delta) / math.sin(delta)
+    x = a * math.cos(phi1) * math.cos(lam1) + b * math.cos(phi2) * math.cos(lam2)
+    y = a * math.cos(phi1) * math.sin(lam1) + b * math.cos(phi2) * math.sin(lam2)
+    z = a * math.sin(phi1) + b * math.sin(phi2)
+    return math.degrees(math.atan2(z, math.hypot(x, y))), math.degrees(math.atan2(y, x))
+
+
+class GridIndex:
+    def __init__(self, airports, cell_degrees=1.0):
+        """Index airport dicts by their ``latitude`` and ``longitude``."""
+        self.cell_degrees = cell_degrees
+        self.columns = math.ceil(360 / cell_degrees)
+        self.airports = list(airports)
+        self.by_code = {airport["code"]: airport for airport in self.airports}
+        self.cells = {}
+        for airport in self.airports:
+            self.cells.setdefault(self._cell(airport["latitude"], airport["longitude"]), []).append(airport)
+
+    def __len__(self):
+        return len(self.airports)
+
+    def _row(self, lat):
+        return math.floor(lat / self.cell_degrees)
+
+    def _column(self, lon):
+        return math.floor((lon + 180) / self.cell_degrees) % self.columns
+
+    def _cell(self, lat, lon):
+        return self._row(lat), self._column(lon)
+
+    def _candidates(self, lat, lon, radius_km):
+        """Airports in the cells overlapping the bounding box of the circle."""
+        dlat = radius_km / KM_PER_DEGREE
+        south, north = max(lat - dlat, -90), min(lat + dlat, 90)
+        widest = max(abs(south), abs(north))
+        if widest >= 90 or radius_km / (KM_PER_DEGREE * math.cos(math.radians(widest))) >= 180:
+            # Reaches a pole or all the way around
+            columns = range(self.columns)
+        else:
+            dlon = radius_km / (KM_PER_DEGREE * math.cos(math.radians(widest)))
+            first = math.floor((lon - dlon + 180) / self.cell_degrees)
+            last = math.floor((lon + dlon + 180) / self.cell_degrees)
+            columns = {column % self.columns for column in range(first, last + 1)}
+        for row in range(self._row(south), self._row(north) + 1):
+            for column in columns:
+                yield from self.cells.get((row, column), ())
+
+    def within(self, lat, lon, radius_km):
+        """Airports within ``radius_km`` of a point as (distance_km, airport), nearest first."""
+        found = []
+        for airport in self._candidates(lat, lon, radius_km):
+            distance = haversine_km(lat, lon, airport["latitude"], airport["longitude"])
+            if distance <= radius_km:
+                found.append((distance, airport))
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+    def along(self, start, end, width_km):
+        """Airports within ``width_km`` of the great-circle route between two (lat, lon) points.
+
+        Returns (distance from the route, distance from the start, airport)
+        ordered along the route.
+        """
+        length = haversine_km(*start, *end)
+        # Search circles around points spaced about width_km apart along the
+        # route (at most MAX_CORRIDOR_STEPS of them), wide enough to cover the
+        # corridor between them
+        steps = min(max(1, math.ceil(length / width_km)), MAX_CORRIDOR_STEPS)
+        search_radius = math.hypot(length / steps / 2, width_km) * 1.01
+        seen = {}
+        for step in range(steps + 1):
+            lat, lon = _intermediate(start, end, step / steps)
+            for _, airport in self.within(lat, lon, search_radius):
+                seen[airport["code"]] = airport
+
+        found = []
+        for airport in seen.values():
+            distance = distance_to_segment_km(airport["latitude"], airport["longitude"], start, end)
+            if distance <= width_km:
+                found.append((distance, haversine_km(*start, airport["latitude"], airport["longitude"]), airport))
+        found.sort(key=lambda triple: triple[1])
+        return found
+
+
+def build_airport_index(flight_data):
+    return GridIndex(flight_data.get_airports())
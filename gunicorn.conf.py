@@ -0,0 +1,37 @@
+"""Production gunicorn configuration for the Flights Data API.
+
+Run with:
+    gunicorn -c gunicorn.conf.py api:app
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("SKYSQL_BIND", "0.0.0.0:5000")
+
+# SQLite reads are CPU bound inside the worker, so one worker per core scales
+# throughput until the cores are saturated. Override with SKYSQL_WORKERS.
+workers = int(os.environ.get("SKYSQL_WORKERS", multiprocessing.cpu_count()))
+
+# A few threads per worker, so cheap lookups are served while a heavy scan
+# runs; the admission limits in api.py keep heavy requests from taking them
+# all. Override with SKYSQL_THREADS.
+worker_class = "gthread"
+threads = int(os.environ.get("SKYSQL_THREADS", 4))
+
+# Import api.py (and its dependencies) once in the master so workers start
+# quickly and share the loaded code pages copy-on-write.
+preload_app = True
+
+timeout = int(os.environ.get("SKYSQL_WORKER_TIMEOUT", 60))
+accesslog = "-"
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    # The preloaded app created its FlightData engine in the master; make sure
+    # no SQLite handle is shared between the master and the workers.
+    import api
+
+    api.flight_data.dispose_after_fork()
+    # Threads don't survive fork, so each worker warms up its own aggregates
+    api.start_background_tasks()
@@ -0,0 +1,425 @@
+"""Bulk loading of BTS on-time performance CSV files into flights.sqlite3.
+
+Both the Kaggle "2015 Flight Delays" layout (YEAR, MONTH, DAY, AIRLINE,
+ORIGIN_AIRPORT, ...) and the raw BTS download layout (FL_DATE,
+OP_UNIQUE_CARRIER, ORIGIN, DEP_DELAY, ...) are understood. Files are streamed
+in chunks (gzip is detected from the ``.gz`` suffix), every row is validated
+and converted, and rows are written with ``executemany`` inside one
+transaction per file loaded while the secondary indexes on ``flights`` are
+dropped and rebuilt once at the end. A load that fails part way is rolled
+back: none of its rows are kept.
+"""
+import csv
+import gzip
+import os
+import sqlite3
+import time
+
+from partitions import partition_path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS airlines (
+    ID TEXT PRIMARY KEY,
+    AIRLINE TEXT
+);
+CREATE TABLE IF NOT EXISTS airports (
+    IATA_CODE TEXT PRIMARY KEY,
+    AIRPORT TEXT,
+    CITY TEXT,
+    STATE TEXT,
+    COUNTRY TEXT,
+    LATITUDE REAL NOT NULL,
+    LONGITUDE REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS flights (
+    ID INTEGER PRIMARY KEY,
+    YEAR INTEGER,
+    MONTH INTEGER,
+    DAY INTEGER,
+    DAY_OF_WEEK INTEGER,
+    AIRLINE TEXT,
+    FLIGHT_NUMBER INTEGER,
+    TAIL_NUMBER TEXT,
+    ORIGIN_AIRPORT TEXT,
+    DESTINATION_AIRPORT TEXT,
+    SCHEDULED_DEPARTURE TEXT,
+    DEPARTURE_TIME TEXT,
+    DEPARTURE_DELAY INTEGER,
+    ARRIVAL_DELAY INTEGER,
+    DISTANCE INTEGER,
+    CANCELLED INTEGER
+);
+"""
+
+# Indexes used by the queries in data.py; (re)built after every load
+INDEXES = {
+    "idx_flights_date": "CREATE INDEX IF NOT EXISTS idx_flights_date ON flights (YEAR, MONTH, DAY)",
+    "idx_flights_origin": "CREATE INDEX IF NOT EXISTS idx_flights_origin ON flights (ORIGIN_AIRPORT)",
+    "idx_flights_destination": "CREATE INDEX IF NOT EXISTS idx_flights_destination ON flights (DESTINATION_AIRPORT)",
+    "idx_flights_airline": "CREATE INDEX IF NOT EXISTS idx_flights_airline ON flights (AIRLINE, DEPARTURE_DELAY)",
+}
+
+BATCH_SIZE = 50_000
+
+
+class IngestError(Exception):
+    """Raised when a file cannot be ingested at all (e.g. missing columns)."""
+
+
+# --- Column conversion ---
+
+def _to_int(value):
+    if value == "":
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return int(float(value))
+
+
+def _to_float(value):
+    # Delays are stored with INTEGER affinity, so "-5.00" is kept as -5
+    return float(value) if value != "" else None
+
+
+def _to_str(value):
+    return value or None
+
+
+def _to_hhmm(value):
+    """Normalize a clock time ("5", "0005", "540.00", "2400") to "HHMM"."""
+    if value == "":
+        return None
+    hhmm = value.split(".")[0].zfill(4)
+    return "0000" if hhmm == "2400" else hhmm
+
+
+# Target column -> (converter, accepted source header names)
+COLUMNS = {
+    "YEAR": (_to_int, ("YEAR",)),
+    "MONTH": (_to_int, ("MONTH",)),
+    "DAY": (_to_int, ("DAY", "DAY_OF_MONTH", "DAYOFMONTH")),
+    "DAY_OF_WEEK": (_to_int, ("DAY_OF_WEEK", "DAYOFWEEK")),
+    "AIRLINE": (_to_str, ("AIRLINE", "OP_UNIQUE_CARRIER", "OP_CARRIER", "REPORTING_AIRLINE", "UNIQUE_CARRIER")),
+    "FLIGHT_NUMBER": (_to_int, ("FLIGHT_NUMBER", "OP_CARRIER_FL_NUM", "FLIGHT_NUMBER_REPORTING_AIRLINE")),
+    "TAIL_NUMBER": (_to_str, ("TAIL_NUMBER", "TAIL_NUM")),
+    "ORIGIN_AIRPORT": (_to_str, ("ORIGIN_AIRPORT", "ORIGIN")),
+    "DESTINATION_AIRPORT": (_to_str, ("DESTINATION_AIRPORT", "DEST")),
+    "SCHEDULED_DEPARTURE": (_to_hhmm, ("SCHEDULED_DEPARTURE", "CRS_DEP_TIME")),
+    "DEPARTURE_TIME": (_to_hhmm, ("DEPARTURE_TIME", "DEP_TIME")),
+    "DEPARTURE_DELAY": (_to_float, ("DEPARTURE_DELAY", "DEP_DELAY")),
+    "ARRIVAL_DELAY": (_to_float, ("ARRIVAL_DELAY", "ARR_DELAY")),
+    "DISTANCE": (_to_int, ("DISTANCE",)),
+    "CANCELLED": (_to_int, ("CANCELLED",)),
+}
+
+REQUIRED_COLUMNS = ("YEAR", "MONTH", "DAY", "AIRLINE", "ORIGIN_AIRPORT", "DESTINATION_AIRPORT")
+
+
+class IngestStats:
+    def __init__(self):
+        self.rows = 0
+        self.rejected = 0
+        self.errors = []
+        self.airlines = set()
+        self.airports = 0
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def reject(self, path, line, reason):
+        self.rejected += 1
+        # Keep a sample for the report, not every bad row of a huge file
+        if len(self.errors) < 20:
+            self.errors.append(f"{path}:{line}: {reason}")
+
+
+def _open_text(path):
+    if str(path).endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def _column_plan(header):
+    """Map the CSV header onto our columns: [(column, index, converter)]."""
+    positions = {name.strip().upper(): i for i, name in enumerate(header)}
+    plan = []
+    for column, (convert, aliases) in COLUMNS.items():
+        index = next((positions[a] for a in aliases if a in positions), None)
+        if index is not None:
+            plan.append((column, index, convert))
+
+    found = {column for column, _, _ in plan}
+    if "FL_DATE" in positions and not {"YEAR", "MONTH", "DAY"} <= found:
+        plan = [p for p in plan if p[0] not in ("YEAR", "MONTH", "DAY")]
+        plan.append(("FL_DATE", positions["FL_DATE"], None))
+        found |= {"YEAR", "MONTH", "DAY"}
+
+    missing = [c for c in REQUIRED_COLUMNS if c not in found]
+    if missing:
+        raise IngestError(f"missing required columns: {', '.join(missing)}")
+    return plan
+
+
+def _read_rows(path, stats):
+    """Yield validated rows as dicts of converted values."""
+    with _open_text(path) as fh:
+        reader = csv.reader(fh)
+        try:
+            header = next(reader)
+        except StopIteration:
+            return
+        plan = _column_plan(header)
+        width = len(header)
+
+        for line, record in enumerate(reader, start=2):
+            if len(record) != width:
+                stats.reject(path, line, f"expected {width} fields, got {len(record)}")
+                continue
+            try:
+                row = {}
+                for column, index, convert in plan:
+                    if convert is None:
+                        # FL_DATE is "YYYY-MM-DD" (optionally followed by a time)
+                        year, month, day = record[index][:10].split("-")
+                        row["YEAR"], row["MONTH"], row["DAY"] = int(year), int(month), int(day)
+                    else:
+                        row[column] = convert(record[index])
+            except ValueError as e:
+                stats.reject(path, line, str(e))
+                continue
+
+            if not (1 <= (row["MONTH"] or 0) <= 12 and 1 <= (row["DAY"] or 0) <= 31 and row["YEAR"]):
+                stats.reject(path, line, "invalid date")
+                continue
+            if not (row["AIRLINE"] and row["ORIGIN_AIRPORT"] and row["DESTINATION_AIRPORT"]):
+                stats.reject(path, line, "missing airline or airport")
+                continue
+            yield row
+
+
+def read_airline_names(path):
+    """Read an airlines.csv (IATA_CODE, AIRLINE) into a code -> name dict."""
+    with _open_text(path) as fh:
+        reader = csv.DictReader(fh)
+        names = {}
+        for row in reader:
+            row = {k.strip().upper(): v for k, v in row.items()}
+            code = row.get("IATA_CODE") or row.get("CODE") or row.get("ID")
+            name = row.get("AIRLINE") or row.get("DESCRIPTION")
+            if code and name:
+                names[code.strip()] = name.strip()
+        return names
+
+
+def read_airports(path):
+    """Read an airports.csv (IATA_CODE, AIRPORT, CITY, STATE, COUNTRY, LATITUDE,
+    LONGITUDE) into rows for the airports table.
+
+    Airports without valid coordinates are skipped.
+    """
+    rows = []
+    with _open_text(path) as fh:
+        for row in csv.DictReader(fh):
+            row = {k.strip().upper(): (v or "").strip() for k, v in row.items() if k}
+            code = row.get("IATA_CODE") or row.get("CODE")
+            try:
+                latitude = float(row.get("LATITUDE", ""))
+                longitude = float(row.get("LONGITUDE", ""))
+            except ValueError:
+                continue
+            if not code or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                continue
+            rows.append((code, row.get("AIRPORT") or None, row.get("CITY") or None, row.get("STATE") or None,
+                         row.get("COUNTRY") or None, latitude, longitude))
+    return rows
+
+
+INSERT_AIRPORTS = """
+INSERT OR REPLACE INTO airports (IATA_CODE, AIRPORT, CITY, STATE, COUNTRY, LATITUDE, LONGITUDE)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def load_airports(rows, paths):
+    """Write airport rows into each existing or new database file in ``paths``."""
+    for path in paths:
+        conn = sqlite3.connect(path)
+        try:
+            conn.executescript(SCHEMA)
+            with conn:
+                conn.executemany(INSERT_AIRPORTS, rows)
+        finally:
+            conn.close()
+
+
+class _Target:
+    """One SQLite file being loaded: holds the connection and pending batch."""
+
+    def __init__(self, path, defer_indexes):
+        self.path = path
+        # Removed again if the load fails
+        self.created = not os.path.exists(path)
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.executescript(SCHEMA)
+        if self.created:
+            # Nothing to protect in a new file: no syncs and the journal in memory
+            self.conn.execute("PRAGMA synchronous = OFF")
+            self.conn.execute("PRAGMA journal_mode = MEMORY")
+        # An existing file keeps its own journal, so a crash mid-load rolls
+        # back. Appends only journal the few pages they change, so one
+        # transaction for the whole load stays small.
+        self.conn.execute("PRAGMA cache_size = -262144")  # 256 MB
+        self.columns = [r[1].upper() for r in self.conn.execute("PRAGMA table_info(flights)")]
+
+        self.batch = []
+        self.airlines = set()
+        self.conn.execute("BEGIN")
+        # Dropped inside the transaction, so a failed load keeps them
+        self.dropped_indexes = {}
+        if defer_indexes:
+            for name, sql in self.conn.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'flights' "
+                "AND sql IS NOT NULL"
+            ).fetchall():
+                self.dropped_indexes[name] = sql
+                self.conn.execute(f'DROP INDEX "{name}"')
+
+    def insert_sql(self, columns):
+        placeholders = ", ".join("?" for _ in columns)
+        return f"INSERT INTO flights (ID, {', '.join(columns)}) VALUES (?, {placeholders})"
+
+    def flush(self, columns):
+        if not self.batch:
+            return
+        self.conn.executemany(self.insert_sql(columns), self.batch)
+        self.batch = []
+
+    def upsert_airlines(self, names):
+        for code in sorted(self.airlines):
+            name = names.get(code)
+            if name is not None:
+                updated = self.conn.execute("UPDATE airlines SET AIRLINE = ? WHERE ID = ?", (name, code)).rowcount
+            else:
+                # Unknown name: only make sure the code resolves to something
+                updated = self.conn.execute("SELECT 1 FROM airlines WHERE ID = ?", (code,)).fetchone() is not None
+            if not updated:
+                self.conn.execute("INSERT INTO airlines (ID, AIRLINE) VALUES (?, ?)", (code, name or code))
+
+    def upsert_airports(self, rows):
+        self.conn.executemany(INSERT_AIRPORTS, rows)
+
+    def close(self, succeeded):
+        """Rebuild the indexes and commit if the load ``succeeded``, else roll it all back."""
+        if not succeeded:
+            self.conn.execute("ROLLBACK")
+            self.conn.close()
+            if self.created:
+                os.remove(self.path)
+            return
+        for sql in self.dropped_indexes.values():
+            self.conn.execute(sql)
+        for sql in INDEXES.values():
+            self.conn.execute(sql)
+        self.conn.execute("ANALYZE")
+        self.conn.execute("COMMIT")
+        self.conn.close()
+
+
+def _max_id(path):
+    if not os.path.exists(path):
+        return 0
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT MAX(ID) FROM flights").fetchone()[0] or 0
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        conn.close()
+
+
+def ingest_csv(paths, database=None, partition_dir=None, partition_by="month", airlines_csv=None,
+               batch_size=BATCH_SIZE, defer_indexes=True, progress=None, airports_csv=None):
+    """Load CSV files into ``database`` or into partition files under ``partition_dir``.
+
+    Airport locations from ``airports_csv`` go into every file loaded (or,
+    without ``paths``, into the existing database or partitions).
+
+    ``progress`` is called with the running IngestStats after every batch.
+    Returns the final IngestStats.
+    """
+    if (database is None) == (partition_dir is None):
+        raise ValueError("Pass exactly one of database or partition_dir")
+    if partition_by not in ("year", "month"):
+        raise ValueError("partition_by must be 'year' or 'month'")
+
+    stats = IngestStats()
+    names = read_airline_names(airlines_csv) if airlines_csv else {}
+    airports = read_airports(airports_csv) if airports_csv else []
+    stats.airports = len(airports)
+
+    # IDs stay unique across partitions so /api/flights/<id> is unambiguous
+    if partition_dir is not None:
+        os.makedirs(partition_dir, exist_ok=True)
+        existing = [os.path.join(partition_dir, n) for n in os.listdir(partition_dir) if n.endswith(".sqlite3")]
+        next_id = max([_max_id(p) for p in existing] or [0]) + 1
+    else:
+        if os.path.dirname(database):
+            os.makedirs(os.path.dirname(database), exist_ok=True)
+        next_id = _max_id(database) + 1
+
+    targets = {}
+    succeeded = False
+    try:
+        for path in paths:
+            # Columns of this file loaded into each target (partitions may differ)
+            columns = {}
+            for row in _read_rows(path, stats):
+                if partition_dir is None:
+                    key = None
+                elif partition_by == "year":
+                    key = (row["YEAR"], None)
+                else:
+                    key = (row["YEAR"], row["MONTH"])
+
+                target = targets.get(key)
+                if target is None:
+                    target_path = database if key is None else partition_path(partition_dir, *key)
+                    target = targets[key] = _Target(target_path, defer_indexes)
+
+                if key not in columns:
+                    columns[key] = [c for c in COLUMNS if c in row and c in target.columns]
+
+                target.batch.append([next_id] + [row[c] for c in columns[key]])
+                next_id += 1
+                target.airlines.add(row["AIRLINE"])
+                stats.rows += 1
+
+                if len(target.batch) >= batch_size:
+                    target.flush(columns[key])
+                    if progress:
+                        stats.seconds = time.perf_counter() - stats.started
+                        progress(stats)
+
+            # Batches never span files: each file can have its own columns
+            for key, target in targets.items():
+                if key in columns:
+                    target.flush(columns[key])
+
+        for target in targets.values():
+            target.upsert_airlines(names)
+            target.upsert_airports(airports)
+            stats.airlines |= target.airlines
+        succeeded = True
+    finally:
+        for target in targets.values():
+            target.close(succeeded)
+
+    if airports and not targets:
+        load_airports(airports, existing if partition_dir is not None else [database])
+
+    stats.seconds = time.perf_counter() - stats.started
+    return stats
@@ -1,12 +1,6 @@
+import sys
 from data import FlightData
-from visualization import (
-    plot_delayed_flights_by_airline,
-    plot_percentage_delayed_flights_by_airline,
-    plot_percentage_delayed_flights_by_hour,
-    plot_delays_heatmap_routes,
-    plot_delays_on_map,
-    plot_percentage_delayed_routes_on_map,
-)
+from output import prompt_more, write_table
 from pathlib import Path
 
 DB_PATH = Path(__file__).parent / "data" / "flights.sqlite3"
@@ -14,16 +8,9 @@ DB_PATH = Path(__file__).parent / "data" / "flights.sqlite3"
 # --- Helper Functions ---
 
 def _print_table(data, fields):
-    widths = [max(len(str(row.get(field, ""))) for row in data + [dict(zip(fields, fields))]) for field in fields]
-    header = " ".join(field.ljust(width) for field, width in zip(fields, widths))
-    separator = "-" * (sum(widths) + len(widths) - 1)
-
+    # Laid out and shown one page at a time, so large results start printing at once
     print("\n=== Flight Information ===")
-    print(header)
-    print(separator)
-    for row in data:
-        print(" ".join(str(row.get(field, "")).ljust(width) for field, width in zip(fields, widths)))
-    print(separator)
+    write_table(data, sys.stdout, fields, more=prompt_more if sys.stdin.isatty() else None)
 
 
 # --- Menu Actions ---
@@ -127,8 +114,21 @@ def generate_visualizations(data_manager):
     print("8. Return to main menu")
 
     choice = input("\nSelect a visualization (1-8): ").strip()
+    if choice == "8":
+        return
 
     try:
+        # Imported here so the CLI starts without loading matplotlib, seaborn,
+        # folium and pandas unless a visualization is actually requested
+        from visualization import (
+            plot_delayed_flights_by_airline,
+            plot_percentage_delayed_flights_by_airline,
+            plot_percentage_delayed_flights_by_hour,
+            plot_delays_heatmap_routes,
+            plot_delays_on_map,
+            plot_percentage_delayed_routes_on_map,
+        )
+
         delayed_flights_data = data_manager.get_delayed_flights()
         if not delayed_flights_data:
             print("No delayed flight data available to visualize.")
@@ -153,8 +153,6 @@ def generate_visualizations(data_manager):
             plot_percentage_delayed_routes_on_map(data_manager)
             plot_delays_heatmap_routes(data_manager)
             plot_delays_on_map(data_manager)
-        elif choice == "8":
-            return
         else:
             print("Invalid choice. Please select a number between 1 and 8.")
     except Exception as e:
@@ -170,6 +168,8 @@ def quit_program(data_manager):
 def main():
     print(f"Using database at: {DB_PATH}")
     data_manager = FlightData(f"sqlite:///{DB_PATH}")
+    # Aggregates computed by earlier sessions are reused until the database changes
+    data_manager.enable_result_cache()
 
     menu_options = {
         "1": show_flight_by_id,
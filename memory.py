@@ -0,0 +1,88 @@
+"""Per-request memory accounting.
+
+A few large list requests can take a worker's memory far beyond its steady
+state: the rows of the query, then the JSON body built from them. The
+MemoryTracker measures how much each request added, so the costly ones show
+up in /api/metrics and in an ``X-Memory-Peak`` response header:
+
+* ``tracemalloc`` traces every Python allocation and reports the peak above
+  the memory in use when the request started. It is exact for a request
+  running alone; requests overlapping in the same worker share one peak,
+  so each of them reports the highest (an upper bound). Tracing slows
+  allocation-heavy code down noticeably.
+* ``rss`` reads the resident set size of the process when the request
+  starts and ends. It is nearly free but coarse: memory freed before the
+  request ends is not seen, and neither is growth of less than a page.
+
+Tracking is off by default.
+"""
+import os
+import threading
+import tracemalloc
+
+MODES = ("off", "tracemalloc", "rss")
+
+HEADER = "X-Memory-Peak"
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class MemoryTracker:
+    """Measures the memory added by each request in ``mode`` (see above)."""
+
+    def __init__(self, mode="off", metrics=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown memory tracking mode {mode!r}, choose one of: {', '.join(MODES)}")
+        self.mode = mode
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._active = 0
+
+    @property
+    def enabled(self):
+        return self.mode != "off"
+
+    def begin(self):
+        """Start measuring a request; pass the returned token to end()."""
+        if self.mode == "rss":
+            return current_rss()
+        if self.mode == "tracemalloc":
+            with self._lock:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                if self._active == 0:
+                    # Nothing else is being measured: start a fresh peak
+                    tracemalloc.reset_peak()
+                self._active += 1
+                return tracemalloc.get_traced_memory()[0]
+        return None
+
+    def end(self, token):
+        """Bytes the request added at its peak, counted in the metrics (None if not measured)."""
+        if self.mode == "rss":
+            rss = current_rss()
+            if token is None or rss is None:
+                return None
+            added = max(rss - token, 0)
+        elif self.mode == "tracemalloc":
+            with self._lock:
+                self._active -= 1
+                if not tracemalloc.is_tracing():
+                    return None
+                added = max(tracemalloc.get_traced_memory()[1] - token, 0)
+        else:
+            return None
+        if self.metrics is not None:
+            self.metrics.incr("memory_tracked_requests")
+            self.metrics.incr("memory_tracked_bytes", added)
+            self.metrics.maximum("memory_peak_max_bytes", added)
+        return added
@@ -0,0 +1,45 @@
+"""In-process counters for the data layer.
+
+Counts are per process: under gunicorn each worker keeps its own, and
+/api/metrics reports those of the worker that served the request.
+"""
+import threading
+from collections import deque
+
+# Events kept per name by Counters.record()
+RECENT_EVENTS = 20
+
+
+class Counters:
+    """Thread-safe named integer counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._events = {}
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + amount
+
+    def maximum(self, name, value):
+        """Keep ``name`` at the largest ``value`` reported so far."""
+        with self._lock:
+            self._counts[name] = max(self._counts.get(name, value), value)
+
+    def record(self, name, event):
+        """Count ``name`` and keep ``event`` among its most recent ones."""
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + 1
+            self._events.setdefault(name, deque(maxlen=RECENT_EVENTS)).append(event)
+
+    def events(self, name):
+        with self._lock:
+            return list(self._events.get(name, ()))
+
+    def get(self, name):
+        return self._counts.get(name, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
@@ -0,0 +1,190 @@
+"""Airport network built from the route aggregates, and hub metrics over it.
+
+The routes (origin, destination, total and delayed flights) form a directed
+graph of airports. RouteGraph keeps it in compressed sparse row (CSR)
+arrays: airports are numbered in code order, ``indptr[i]:indptr[i + 1]``
+is the slice of ``indices`` (destinations) and ``flights``/``delayed``
+(edge weights) of the routes leaving airport ``i``. Every metric is then a
+handful of vectorized operations over those arrays instead of a loop over
+dicts, so the full network (a few hundred airports, thousands of routes)
+takes milliseconds.
+
+Hub metrics per airport:
+
+- weighted degree: flights departing, arriving and both;
+- delay rank: PageRank over the routes weighted by their delayed flights.
+  An airport ranks high when many delayed flights arrive from airports
+  that rank high themselves, i.e. where delays propagate to;
+- component: the weakly connected component the airport belongs to,
+  numbered by size, largest first.
+
+numpy is only imported when a graph is built.
+"""
+from stats import route_stats
+
+# Probability of following a route rather than jumping to any airport
+DAMPING = 0.85
+
+# The delay rank stops once an iteration changes it by less than this (L1)
+TOLERANCE = 1e-10
+MAX_ITERATIONS = 200
+
+
+def _numpy():
+    import numpy
+    return numpy
+
+
+class RouteGraph:
+    def __init__(self, codes, indptr, indices, flights, delayed):
+        """CSR arrays of the graph; see the module docstring. Use from_routes() to build one."""
+        self.codes = codes
+        self.indptr = indptr
+        self.indices = indices
+        self.flights = flights
+        self.delayed = delayed
+
+    @classmethod
+    def from_routes(cls, routes):
+        """Graph of route_stats() rows: ``origin``, ``destination``, ``total_flights``, ``delayed_flights``."""
+        np = _numpy()
+        routes = [r for r in routes if r.get("origin") and r.get("destination")]
+        count = len(routes)
+        codes = sorted({r["origin"] for r in routes} | {r["destination"] for r in routes})
+        number = {code: i for i, code in enumerate(codes)}
+        sources = np.fromiter((number[r["origin"]] for r in routes), dtype=np.int64, count=count)
+        targets = np.fromiter((number[r["destination"]] for r in routes), dtype=np.int64, count=count)
+        flights = np.fromiter((r.get("total_flights") or 0 for r in routes), dtype=np.float64, count=count)
+        delayed = np.fromiter((r.get("delayed_flights") or 0 for r in routes), dtype=np.float64, count=count)
+
+        order = np.lexsort((targets, sources))
+        indptr = np.zeros(len(codes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(codes)), out=indptr[1:])
+        return cls(codes, indptr, targets[order], flights[order], delayed[order])
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def edge_count(self):
+        return len(self.indices)
+
+    def sources(self):
+        """Origin of every edge, aligned with ``indices``."""
+        np = _numpy()
+        return np.repeat(np.arange(len(self.codes)), np.diff(self.indptr))
+
+    def neighbors(self, code):
+        """Destinations of the routes from airport ``code`` (empty if unknown)."""
+        try:
+            i = self.codes.index(code)
+        except ValueError:
+            return []
+        return [self.codes[j] for j in self.indices[self.indptr[i]:self.indptr[i + 1]]]
+
+    def weighted_degree(self, weights=None):
+        """(out, in) sums of ``weights`` (default: flights) per airport."""
+        np = _numpy()
+        weights = self.flights if weights is None else weights
+        size = len(self.codes)
+        return (np.bincount(self.sources(), weights=weights, minlength=size),
+                np.bincount(self.indices, weights=weights, minlength=size))
+
+    def pagerank(self, weights=None, damping=DAMPING, tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS):
+        """PageRank of every airport over the routes weighted by ``weights`` (default: delayed flights).
+
+        The rank of an airport without weighted departures is spread over
+        all airports. Ranks sum to 1.
+        """
+        np = _numpy()
+        weights = self.delayed if weights is None else weights
+        size = len(self.codes)
+        if size == 0:
+            return np.zeros(0)
+        sources = self.sources()
+        out_weight = np.bincount(sources, weights=weights, minlength=size)
+        dangling = out_weight == 0
+        # Share of its origin's rank each edge passes on
+        edge_share = weights / np.where(dangling, 1, out_weight)[sources]
+
+        rank = np.full(size, 1 / size)
+        for _ in range(max_iterations):
+            passed = np.bincount(self.indices, weights=rank[sources] * edge_share, minlength=size)
+            updated = (1 - damping) / size + damping * (passed + rank[dangling].sum() / size)
+            change = np.abs(updated - rank).sum()
+            rank = updated
+            if change < tolerance:
+                break
+        return rank
+
+    def components(self):
+        """Weakly connected component of every airport, numbered by size (largest first)."""
+        np = _numpy()
+        size = len(self.codes)
+        sources, targets = self.sources(), self.indices
+        labels = np.arange(size)
+        while True:
+            # Both ends of every edge take the smaller label, then labels follow their own label
+            smaller = np.minimum(labels[sources], labels[targets])
+            updated = labels.copy()
+            np.minimum.at(updated, sources, smaller)
+            np.minimum.at(updated, targets, smaller)
+            updated = updated[updated]
+            if np.array_equal(updated, labels):
+                break
+            labels = updated
+        roots, members = np.unique(labels, return_inverse=True)
+        sizes = np.bincount(members)
+        # Largest first, ties by lowest airport code
+        numbering = np.empty(len(roots), dtype=np.int64)
+        numbering[np.lexsort((roots, -sizes))] = np.arange(len(roots))
+        return numbering[members]
+
+
+def hub_metrics(graph):
+    """Network summary of ``graph``: per-airport hub metrics and the components."""
+    np = _numpy()
+    flights_out, flights_in = graph.weighted_degree()
+    delayed_out, delayed_in = graph.weighted_degree(graph.delayed)
+    routes_out = np.diff(graph.indptr)
+    routes_in = np.bincount(graph.indices, minlength=len(graph))
+    rank = graph.pagerank()
+    component = graph.components()
+
+    columns = zip(graph.codes, routes_out.tolist(), routes_in.tolist(), flights_out.tolist(),
+                  flights_in.tolist(), delayed_out.tolist(), delayed_in.tolist(), rank.tolist(), component.tolist())
+    airports = [
+        {
+            "airport": code,
+            "routes_out": r_out,
+            "routes_in": r_in,
+            "flights_out": int(f_out),
+            "flights_in": int(f_in),
+            "weighted_degree": int(f_out + f_in),
+            "delayed_out": int(d_out),
+            "delayed_in": int(d_in),
+            "delay_rank": round(score, 6),
+            "component": number,
+        }
+        for code, r_out, r_in, f_out, f_in, d_out, d_in, score, number in columns
+    ]
+    airports.sort(key=lambda row: (-row["delay_rank"], row["airport"]))
+
+    sizes = np.bincount(component)
+    component_flights = np.bincount(component[graph.sources()], weights=graph.flights, minlength=len(sizes))
+    return {
+        "airports": airports,
+        "components": [
+            {"component": i, "airports": int(sizes[i]), "flights": int(component_flights[i])}
+            for i in range(len(sizes))
+        ],
+        "airport_count": len(graph),
+        "route_count": graph.edge_count,
+    }
+
+
+def network_stats(flight_data, routes=None, **filters):
+    """Hub metrics of the route network; ``routes`` are route_stats() rows if already computed."""
+    if routes is None:
+        routes = route_stats(flight_data, **filters)
+    return hub_metrics(RouteGraph.from_routes(routes))
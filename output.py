@@ -0,0 +1,114 @@
+"""Streaming writers for query results (CSV, JSON, JSON lines and tables).
+
+Every writer consumes an iterable of row dicts one row at a time, so a
+result streamed from the database cursor is never held in memory in full.
+Tables are laid out a page at a time: column widths come from the current
+page only and are capped, so the first rows print without scanning the rest.
+"""
+import csv
+import json
+from itertools import chain, islice
+
+FORMATS = ("table", "csv", "json", "jsonl")
+
+PAGE_SIZE = 50
+MAX_COLUMN_WIDTH = 30
+
+
+def _peek(rows):
+    """Return (first row or None, iterator over all rows)."""
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return None, iter(())
+    return first, chain([first], rows)
+
+
+def write_csv(rows, out, fields=None):
+    first, rows = _peek(rows)
+    if first is None:
+        return 0
+    writer = csv.DictWriter(out, fieldnames=fields or list(first), extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_json(rows, out, fields=None):
+    """Write a JSON array, one element per line, without building it in memory."""
+    out.write("[")
+    count = 0
+    for row in rows:
+        if fields:
+            row = {field: row.get(field) for field in fields}
+        out.write(",\n" if count else "\n")
+        out.write(json.dumps(row, default=str))
+        count += 1
+    out.write("\n]\n" if count else "]\n")
+    return count
+
+
+def write_jsonl(rows, out, fields=None):
+    count = 0
+    for row in rows:
+        if fields:
+            row = {field: row.get(field) for field in fields}
+        out.write(json.dumps(row, default=str))
+        out.write("\n")
+        count += 1
+    return count
+
+
+def _cell(value, width):
+    text = "" if value is None else str(value)
+    if len(text) > width:
+        text = text[:width - 1] + "…"
+    return text.ljust(width)
+
+
+def write_table(rows, out, fields=None, page_size=PAGE_SIZE, max_width=MAX_COLUMN_WIDTH, more=None):
+    """Print rows as aligned text columns, one page at a time.
+
+    ``more`` is called between pages (e.g. to wait for the user); paging
+    stops when it returns False.
+    """
+    first, rows = _peek(rows)
+    if first is None:
+        return 0
+    fields = fields or list(first)
+
+    count = 0
+    while True:
+        page = list(islice(rows, page_size))
+        if not page:
+            break
+        if count and more is not None and not more():
+            break
+        widths = [
+            min(max_width, max(len(field), *(len(str(row.get(field, ""))) for row in page)))
+            for field in fields
+        ]
+        separator = "-" * (sum(widths) + len(widths) - 1)
+        out.write(" ".join(_cell(field, width) for field, width in zip(fields, widths)).rstrip() + "\n")
+        out.write(separator + "\n")
+        for row in page:
+            out.write(" ".join(_cell(row.get(field, ""), width) for field, width in zip(fields, widths)).rstrip())
+            out.write("\n")
+        out.write(separator + "\n")
+        count += len(page)
+    return count
+
+
+def prompt_more():
+    """Pause between table pages; returns False when the user quits."""
+    try:
+        answer = input("-- more (Enter to continue, q to quit) -- ")
+    except EOFError:
+        return False
+    return answer.strip().lower() != "q"
+
+
+WRITERS = {"csv": write_csv, "json": write_json, "jsonl": write_jsonl, "table": write_table}
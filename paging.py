@@ -0,0 +1,73 @@
+"""Row and byte budgets for the list endpoints, with cursors to the next page.
+
+Unbounded lists (every delayed flight, or all flights of a day) are read
+from the data layer's streaming queries and cut once the page reaches its
+budget. Rows past the budget are never loaded. The response then carries
+an opaque cursor; passing it back as ``?cursor=`` returns the next page.
+
+A cursor holds the position of the next row and the database fingerprint
+it was issued for. Positions are only meaningful over unchanged data, so
+a cursor is rejected once the database changes.
+"""
+import base64
+import binascii
+import hashlib
+import json
+from itertools import islice
+
+
+class InvalidCursor(ValueError):
+    """A cursor is malformed or was issued for data that has since changed."""
+
+
+def _digest(fingerprint):
+    return hashlib.sha1(repr(fingerprint).encode()).hexdigest()[:16]
+
+
+def encode_cursor(offset, fingerprint):
+    data = json.dumps({"offset": offset, "data": _digest(fingerprint)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, fingerprint):
+    """Offset of the row the ``cursor`` points to, for data with ``fingerprint``."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        offset = data["offset"]
+        issued_for = data["data"]
+    except (binascii.Error, ValueError, TypeError, KeyError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+    if not isinstance(offset, int) or offset < 0:
+        raise InvalidCursor("Invalid cursor")
+    if issued_for != _digest(fingerprint):
+        raise InvalidCursor("The data changed since this cursor was issued; request the first page again")
+    return offset
+
+
+def read_page(rows, offset=0, max_rows=0, max_bytes=0):
+    """Skip ``offset`` of ``rows`` and collect the next ones within the budget.
+
+    ``max_rows`` caps the rows and ``max_bytes`` their size as JSON (0 for
+    no limit). A page holds at least one row, however large. Returns the
+    page and the offset of the next one, or None if ``rows`` ran out.
+    """
+    rows = iter(rows)
+    try:
+        page = []
+        size = 0
+        for row in islice(rows, offset, None):
+            # The row that no longer fits is read, but not kept
+            if max_bytes:
+                row_size = len(json.dumps(row, default=str)) + 1
+                if page and size + row_size > max_bytes:
+                    return page, offset + len(page)
+                size += row_size
+            if max_rows and len(page) >= max_rows:
+                return page, offset + len(page)
+            page.append(row)
+        return page, None
+    finally:
+        # Release the cursor (and its connection) of a stream not read to the end
+        close = getattr(rows, "close", None)
+        if close is not None:
+            close()
@@ -0,0 +1,94 @@
+"""Partitioned storage layout helpers.
+
+A partitioned database is a directory of SQLite files with the same schema as
+flights.sqlite3, one per year (``flights_2015.sqlite3``) or per month
+(``flights_2015_01.sqlite3``). Queries are pruned to the partitions that can
+match their date filter, run against each of them and the partial results are
+merged back into the shape a single database would have returned.
+"""
+import os
+import re
+from itertools import chain
+
+PARTITION_PATTERN = re.compile(r"^flights_(\d{4})(?:_(\d{2}))?\.sqlite3$")
+
+
+def partition_path(directory, year, month=None):
+    """Return the file path of the partition holding ``year`` (and ``month``)."""
+    if month is None:
+        return os.path.join(directory, f"flights_{year:04d}.sqlite3")
+    return os.path.join(directory, f"flights_{year:04d}_{month:02d}.sqlite3")
+
+
+def discover_partitions(directory):
+    """List ``(year, month, path)`` for every partition file, oldest first.
+
+    ``month`` is None for yearly partitions.
+    """
+    partitions = []
+    for name in os.listdir(directory):
+        match = PARTITION_PATTERN.match(name)
+        if match:
+            year = int(match.group(1))
+            month = int(match.group(2)) if match.group(2) else None
+            partitions.append((year, month, os.path.join(directory, name)))
+    return sorted(partitions, key=lambda p: (p[0], p[1] or 0))
+
+
+def prune_partitions(partitions, year=None, month=None):
+    """Keep only the partitions that can contain rows for ``year``/``month``."""
+    return [
+        p for p in partitions
+        if (year is None or p[0] == year)
+        and (month is None or p[1] is None or p[1] == month)
+    ]
+
+
+def prune_partitions_between(partitions, start, end):
+    """Keep only the partitions overlapping the dates ``start``..``end``."""
+    first, last = (start.year, start.month), (end.year, end.month)
+
+    def overlaps(partition):
+        year, month = partition[0], partition[1]
+        if month is None:
+            return first[0] <= year <= last[0]
+        return first <= (year, month) <= last
+
+    return [p for p in partitions if overlaps(p)]
+
+
+# --- Merging partial results ---
+
+def merge_concat(results):
+    """Concatenate the rows of every partition in partition order."""
+    return list(chain.from_iterable(results))
+
+
+def merge_counts(*count_fields, sort_key=None):
+    """Build a merger that sums ``count_fields`` over rows with the same group key.
+
+    Every other column of the row is treated as part of the group key.
+    """
+    def merge(results):
+        merged = {}
+        for row in chain.from_iterable(results):
+            key = tuple((k, v) for k, v in row.items() if k not in count_fields)
+            if key in merged:
+                for field in count_fields:
+                    merged[key][field] += row[field]
+            else:
+                merged[key] = dict(row)
+        rows = list(merged.values())
+        if sort_key:
+            # Match SQLite's ORDER BY, which puts NULLs first
+            rows.sort(key=lambda r: (r[sort_key] is not None, r[sort_key] or 0))
+        return rows
+    return merge
+
+
+def merge_sorted(key, limit=None):
+    """Build a merger that re-applies the query's ORDER BY (and LIMIT) across partitions."""
+    def merge(results):
+        rows = sorted(chain.from_iterable(results), key=key)
+        return rows[:limit] if limit is not None else rows
+    return merge
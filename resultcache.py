@@ -0,0 +1,161 @@
+"""Persistent cache of query results in a sidecar SQLite file.
+
+The stats aggregates scan the whole flights table, and every CLI session or
+API worker used to start cold and compute them again. Their results are
+stored on disk, keyed by the query and its parameters, together with the
+database fingerprint they were computed for (see FlightData.fingerprint()).
+A cached result is only returned while the fingerprint still matches;
+otherwise it is dropped and the query runs again.
+
+Any number of processes can share the file. Entries are evicted least
+recently used first once their total size passes ``max_bytes``. A hit only
+writes its new last use back once the stored one is ``touch_interval``
+seconds old, so the hot entries are not rewritten on every read; the
+order of eviction is approximate within that interval. The cache
+never makes a query fail: if the file can't be opened or is busy, the
+lookup counts as a miss and the result is simply not stored.
+"""
+import hashlib
+import json
+import sqlite3
+import time
+import zlib
+
+DEFAULT_MAX_BYTES = 256 * 2**20
+
+# Results bigger than this share of max_bytes are not stored, so that one
+# huge result can't evict everything else
+MAX_ENTRY_SHARE = 0.25
+
+# Seconds to wait for another process holding the write lock
+BUSY_TIMEOUT = 1.0
+
+# Seconds before a hit records its last use again
+TOUCH_INTERVAL = 300
+
+# Rows serialized to estimate the size of a large result before it is
+# serialized whole, and the most zlib is assumed to shrink JSON rows by
+ESTIMATE_SAMPLE_ROWS = 100
+MAX_COMPRESSION_RATIO = 10
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    KEY TEXT PRIMARY KEY,
+    FINGERPRINT TEXT NOT NULL,
+    VALUE BLOB NOT NULL,
+    SIZE INTEGER NOT NULL,
+    LAST_USED REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_last_used ON results (LAST_USED);
+"""
+
+# Deletes the least recently used entries beyond the first :max_bytes
+QUERY_EVICT = """
+DELETE FROM results WHERE KEY IN (
+    SELECT KEY FROM (
+        SELECT KEY, SUM(SIZE) OVER (ORDER BY LAST_USED DESC, KEY) AS running FROM results
+    ) WHERE running > :max_bytes
+)
+"""
+
+
+def _digest(value):
+    return hashlib.sha256(repr(value).encode()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, touch_interval=TOUCH_INTERVAL):
+        """Cache results in the SQLite file at ``path`` (created on first store)."""
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self._schema_ready = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        # The cache can always be recomputed: no fsync on every commit in WAL mode
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if not self._schema_ready:
+            # WAL lets other processes read while one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(CACHE_SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def get(self, key, fingerprint):
+        """The rows stored for ``key`` if computed for ``fingerprint``, else None."""
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    "SELECT FINGERPRINT, VALUE, LAST_USED FROM results WHERE KEY = ?", (_digest(key),)
+                ).fetchone()
+                if row is None:
+                    return None
+                if row[0] != _digest(fingerprint):
+                    conn.execute("DELETE FROM results WHERE KEY = ?", (_digest(key),))
+                    return None
+                now = time.time()
+                if now - row[2] >= self.touch_interval:
+                    conn.execute("UPDATE results SET LAST_USED = ? WHERE KEY = ?", (now, _digest(key)))
+                return json.loads(zlib.decompress(row[1]))
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return None
+
+    def put(self, key, fingerprint, rows):
+        """Store ``rows`` for ``key``; returns whether they were stored."""
+        limit = self.max_bytes * MAX_ENTRY_SHARE
+        try:
+            if self._estimated_size(rows) > limit:
+                return False
+            value = zlib.compress(json.dumps(rows, separators=(",", ":")).encode())
+        except (TypeError, ValueError):
+            # Not plain JSON data; a round trip would change it
+            return False
+        if len(value) > limit:
+            return False
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    conn.execute(
+                        "INSERT OR REPLACE INTO results (KEY, FINGERPRINT, VALUE, SIZE, LAST_USED) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (_digest(key), _digest(fingerprint), value, len(value), time.time()),
+                    )
+                    conn.execute(QUERY_EVICT, {"max_bytes": self.max_bytes})
+                return True
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return False
+
+    @staticmethod
+    def _estimated_size(rows):
+        """Smallest size ``rows`` can plausibly compress to, from a sample of them (0 if few rows)."""
+        if not isinstance(rows, list) or len(rows) <= ESTIMATE_SAMPLE_ROWS:
+            return 0
+        sample = len(json.dumps(rows[:ESTIMATE_SAMPLE_ROWS], separators=(",", ":")))
+        return sample * len(rows) / ESTIMATE_SAMPLE_ROWS / MAX_COMPRESSION_RATIO
+
+    def stats(self):
+        """Number of entries and their total size in bytes."""
+        try:
+            conn = self._connect()
+            try:
+                entries, size = conn.execute("SELECT COUNT(*), TOTAL(SIZE) FROM results").fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return {"entries": 0, "bytes": 0}
+        return {"entries": entries, "bytes": int(size)}
+
+    def clear(self):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM results")
+        finally:
+            conn.close()
@@ -0,0 +1,184 @@
+"""Precomputed rollups stored next to the flights data.
+
+``daily_stats`` holds total and delayed flight counts per day and airline,
+keyed on (YEAR, MONTH, DAY, AIRLINE), so a delay trend over any date range is
+one indexed range read instead of a scan of ``flights``. Like the delay
+sketches, it is refreshed incrementally from ``rollup_state``: only flights
+with an ID above the last one folded in are aggregated (flights are
+append-only).
+
+A database can also arrive with its rollups behind its flights, e.g. a
+file dropped in or published without a refresh. rollup_behind() tells;
+FlightData then answers from ``flights`` directly until the next refresh.
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+GRANULARITIES = ("day", "week", "month")
+
+ROLLUP_STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup_state (
+    NAME TEXT PRIMARY KEY,
+    LAST_ID INTEGER NOT NULL
+)
+"""
+
+DAILY_STATS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_stats (
+    YEAR INTEGER NOT NULL,
+    MONTH INTEGER NOT NULL,
+    DAY INTEGER NOT NULL,
+    AIRLINE TEXT NOT NULL,
+    TOTAL_FLIGHTS INTEGER NOT NULL,
+    DELAYED_FLIGHTS INTEGER NOT NULL,
+    PRIMARY KEY (YEAR, MONTH, DAY, AIRLINE)
+) WITHOUT ROWID
+"""
+
+QUERY_FOLD_DAILY_STATS = """
+INSERT INTO daily_stats (YEAR, MONTH, DAY, AIRLINE, TOTAL_FLIGHTS, DELAYED_FLIGHTS)
+SELECT YEAR, MONTH, DAY, AIRLINE, COUNT(*), TOTAL(DEPARTURE_DELAY >= :delay_threshold)
+FROM flights
+WHERE ID > :last_id AND ID <= :max_id
+GROUP BY YEAR, MONTH, DAY, AIRLINE
+ON CONFLICT (YEAR, MONTH, DAY, AIRLINE) DO UPDATE SET
+    TOTAL_FLIGHTS = TOTAL_FLIGHTS + excluded.TOTAL_FLIGHTS,
+    DELAYED_FLIGHTS = DELAYED_FLIGHTS + excluded.DELAYED_FLIGHTS
+"""
+
+QUERY_DAILY_STATS = """
+SELECT YEAR AS year, MONTH AS month, DAY AS day, AIRLINE AS airline,
+       TOTAL_FLIGHTS AS total_flights, DELAYED_FLIGHTS AS delayed_flights
+FROM daily_stats
+WHERE (YEAR, MONTH, DAY) BETWEEN (:from_year, :from_month, :from_day) AND (:to_year, :to_month, :to_day)
+"""
+
+# Per day and airline like daily_stats, straight from flights while it is behind
+QUERY_DAILY_STATS_LIVE = """
+SELECT YEAR AS year, MONTH AS month, DAY AS day, AIRLINE AS airline,
+       COUNT(*) AS total_flights, CAST(TOTAL(DEPARTURE_DELAY >= :delay_threshold) AS INTEGER) AS delayed_flights
+FROM flights
+WHERE (YEAR, MONTH, DAY) BETWEEN (:from_year, :from_month, :from_day) AND (:to_year, :to_month, :to_day)
+  AND AIRLINE IS NOT NULL
+GROUP BY YEAR, MONTH, DAY, AIRLINE
+"""
+
+# Whether any flight would be folded into daily_stats by a refresh
+QUERY_PENDING_FLIGHTS = "SELECT EXISTS (SELECT 1 FROM flights WHERE ID > :last_id)"
+
+
+def get_last_id(conn, name):
+    """ID of the last flight folded into rollup ``name`` (0 if never refreshed)."""
+    conn.execute(text(ROLLUP_STATE_SCHEMA))
+    return conn.execute(
+        text("SELECT LAST_ID FROM rollup_state WHERE NAME = :name"), {"name": name}
+    ).scalar() or 0
+
+
+def read_last_id(conn, name):
+    """Like get_last_id(), without creating ``rollup_state``, for reads only."""
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rollup_state'")
+    ).scalar()
+    if not exists:
+        return 0
+    return conn.execute(
+        text("SELECT LAST_ID FROM rollup_state WHERE NAME = :name"), {"name": name}
+    ).scalar() or 0
+
+
+def rollup_behind(conn, name, pending_query=QUERY_PENDING_FLIGHTS):
+    """Whether rollup ``name`` misses flights: ``pending_query`` finds one above its last ID."""
+    return bool(conn.execute(text(pending_query), {"last_id": read_last_id(conn, name)}).scalar())
+
+
+def set_last_id(conn, name, last_id):
+    conn.execute(
+        text("INSERT OR REPLACE INTO rollup_state (NAME, LAST_ID) VALUES (:name, :last_id)"),
+        {"name": name, "last_id": last_id},
+    )
+
+
+def refresh_daily_stats(conn, delay_threshold):
+    """Fold flights added since the last refresh into ``daily_stats``.
+
+    A flight counts as delayed when it departed ``delay_threshold`` minutes
+    or more late.
+
+    ``conn`` is a SQLAlchemy connection inside a transaction. Returns the
+    number of flights folded in.
+    """
+    conn.execute(text(DAILY_STATS_SCHEMA))
+    last_id = get_last_id(conn, "daily_stats")
+    max_id, rows = conn.execute(
+        text("SELECT MAX(ID), COUNT(*) FROM flights WHERE ID > :last_id"), {"last_id": last_id}
+    ).one()
+    if not rows:
+        return 0
+    conn.execute(
+        text(QUERY_FOLD_DAILY_STATS),
+        {"last_id": last_id, "max_id": max_id, "delay_threshold": delay_threshold},
+    )
+    set_last_id(conn, "daily_stats", max_id)
+    return rows
+
+
+def daily_stats_params(start, end):
+    return {
+        "from_year": start.year, "from_month": start.month, "from_day": start.day,
+        "to_year": end.year, "to_month": end.month, "to_day": end.day,
+    }
+
+
+def period_start(day, granularity):
+    """The first day of the day/week (Monday)/month period containing ``day``."""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def build_timeseries(daily_rows, start, end, granularity="day", group_by=None, airline_names=None):
+    """Roll daily rows up to ``granularity`` buckets, filling gaps with zeros.
+
+    Every period between ``start`` and ``end`` appears in the result (per
+    airline when ``group_by`` is "airline"), so clients can plot it directly.
+    """
+    periods = []
+    day = start
+    while day <= end:
+        period = period_start(day, granularity)
+        if not periods or periods[-1] != period:
+            periods.append(period)
+        day += timedelta(days=1)
+
+    names = airline_names or {}
+    totals = {}
+    for row in daily_rows:
+        period = period_start(date(row["year"], row["month"], row["day"]), granularity)
+        group = row["airline"] if group_by == "airline" else None
+        counts = totals.setdefault((group, period), [0, 0])
+        counts[0] += row["total_flights"]
+        counts[1] += row["delayed_flights"] or 0
+
+    if group_by == "airline":
+        groups = sorted({group for group, _ in totals}, key=lambda code: names.get(code, code))
+    else:
+        groups = [None]
+
+    series = []
+    for group in groups:
+        for period in periods:
+            total, delayed = totals.get((group, period), (0, 0))
+            point = {"period": period.isoformat()}
+            if group_by == "airline":
+                point["airline"] = names.get(group, group)
+            point.update({
+                "total_flights": total,
+                "delayed_flights": delayed,
+                "percentage_delayed": round(delayed / total * 100, 2) if total else 0,
+            })
+            series.append(point)
+    return series
@@ -0,0 +1,68 @@
+"""In-memory prefix index over airline names/codes and airport codes for autocomplete.
+
+The index is a sorted array of lowercased keys searched with bisect, so a
+lookup costs O(log n) plus the matches. Airlines are indexed by code, full
+name and every word of the name ("air" finds "Alaska Airlines Inc."),
+airports by IATA code.
+"""
+from bisect import bisect_left
+
+from warmup import DerivedIndex
+
+MAX_RESULTS = 50
+
+# Ranks: matches on the start of a name or code come before matches on a later word
+_FULL, _WORD = 0, 1
+
+
+class PrefixIndex:
+    def __init__(self, entries):
+        """``entries`` are result dicts with a ``type``, ``code`` and optional ``name``."""
+        keyed = []
+        for number, entry in enumerate(entries):
+            labels = [entry["code"]]
+            if entry.get("name"):
+                labels.append(entry["name"])
+            for label in labels:
+                keyed.append((label.lower(), _FULL, number))
+            if entry.get("name"):
+                for word in entry["name"].split()[1:]:
+                    keyed.append((word.lower(), _WORD, number))
+        keyed.sort()
+        self._keys = [key for key, _, _ in keyed]
+        self._refs = [(rank, number) for _, rank, number in keyed]
+        self._entries = list(entries)
+        # Airlines before airports, then alphabetically
+        self._sort_keys = [(e["type"] != "airline", (e.get("name") or e["code"]).lower()) for e in self._entries]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def search(self, prefix, limit=10):
+        """Entries with a key starting with ``prefix`` (case-insensitive), best first."""
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        best = {}
+        i = bisect_left(self._keys, prefix)
+        while i < len(self._keys) and self._keys[i].startswith(prefix):
+            rank, number = self._refs[i]
+            if rank < best.get(number, _WORD + 1):
+                best[number] = rank
+            i += 1
+        matches = sorted(best, key=lambda n: (best[n], self._sort_keys[n]))
+        return [self._entries[n] for n in matches[:limit]]
+
+
+def build_index(flight_data):
+    entries = [{"type": "airline", "code": code, "name": name}
+               for code, name in flight_data.get_airline_names().items() if code]
+    entries += [{"type": "airport", "code": code} for code in flight_data.get_airport_codes()]
+    return PrefixIndex(entries)
+
+
+class PrefixSearch(DerivedIndex):
+    """The PrefixIndex of ``flight_data``, rebuilt when the database changes."""
+
+    def __init__(self, flight_data):
+        super().__init__(flight_data, build_index)
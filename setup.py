@@ -26,6 +26,7 @@ setup(
     entry_points={
         "console_scripts": [
             "flight-cli=main:main",
+            "skysql=cli:main",
             "flight-api=api:app.run",
         ],
     },
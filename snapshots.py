@@ -0,0 +1,159 @@
+"""Hot-swapping of the database file under a running FlightData.
+
+A new snapshot of the data is published by replacing the database file:
+renaming the new file over the old one, or repointing a symlink at a new
+versioned file. The SnapshotWatcher notices the change and swaps it in
+without a restart:
+
+1. it opens the new file as a Snapshot next to the one being served,
+2. pre-warms it off the request path: reads the file into the OS page
+   cache, brings the duckdb backend's Parquet copy up to date with it and
+   computes the Warmer's aggregates on it,
+3. swaps it in at once, together with those aggregates.
+
+The rollups stored in the file itself (daily_stats, the delay sketches)
+are not refreshed here: writing to it would create a journal under the
+path the old snapshot's connections still use. A snapshot published with
+rollups missing some of its flights is logged (see
+FlightData.stale_rollups()) and served anyway; reads of those rollups fall
+back to the flights table until refresh_rollups() runs.
+
+Requests pin the snapshot that was current when they started (see
+FlightData.pinned_snapshot()), so every query of an in-flight request
+still reads the old file. The old snapshot is released once the last of
+them is done. Each snapshot has its own fingerprint, so results cached
+for the old data are never served for the new.
+
+Publish through a symlink to versioned files to keep that guarantee
+strictly: each snapshot's connections open the version the link pointed
+to. After a rename over the old file, a pinned request that needs an
+extra connection after the swap can only open the new file.
+"""
+import os
+import sys
+import threading
+import time
+
+from coalescing import SingleFlight
+from warmup import warm_file
+
+
+class Snapshot:
+    """One version of a single-file database: its engine and an open handle on the file.
+
+    The handle keeps identifying this version after the path is pointed
+    elsewhere. Concurrent identical queries are only coalesced within the
+    same snapshot.
+    """
+
+    def __init__(self, engine, path=None, metrics=None, real_path=None):
+        """``engine`` on the file at ``path``; ``real_path`` if ``path`` is a symlink."""
+        self.engine = engine
+        self.path = path
+        self.single_flight = SingleFlight(metrics, prefix="queries")
+        self._file = None
+        if path is not None:
+            try:
+                self._file = open(real_path or path, "rb", buffering=0)
+            except OSError:
+                pass
+
+    def identity(self):
+        """(device, inode) of the file this snapshot was opened on, or None."""
+        if self._file is None:
+            return None
+        stat = os.fstat(self._file.fileno())
+        return stat.st_dev, stat.st_ino
+
+    def replaced(self):
+        """Whether the path now names a different file than this snapshot's."""
+        if self.path is None:
+            return False
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            # Missing for a moment (e.g. a non-atomic copy): keep serving this one
+            return False
+        return (stat.st_dev, stat.st_ino) != self.identity()
+
+    def file_state(self):
+        """(path, inode, size, mtime, change counter) of this snapshot's file, or None."""
+        if self._file is None:
+            return None
+        fd = self._file.fileno()
+        stat = os.fstat(fd)
+        # Bytes 24-27 of the database header count committed changes
+        return str(self.path), stat.st_ino, stat.st_size, stat.st_mtime_ns, os.pread(fd, 4, 24)
+
+    def __del__(self):
+        # The last request pinned to a swapped-out snapshot is done
+        try:
+            self.engine.dispose()
+            if self._file is not None:
+                self._file.close()
+        except Exception:
+            pass
+
+
+class SnapshotWatcher:
+    def __init__(self, flight_data, warmer=None, interval=5, warm_files=True):
+        """Swap ``flight_data`` to its database file when it is replaced, checked every ``interval`` seconds.
+
+        With a ``warmer`` its aggregates are computed on the new snapshot
+        before the swap.
+        """
+        self.flight_data = flight_data
+        self.warmer = warmer
+        self.interval = interval
+        self.warm_files = warm_files
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="skysql-snapshots", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Snapshot swap failed: {e}", file=sys.stderr, flush=True)
+
+    def check(self):
+        """Swap in the database file if it was replaced; returns whether it did."""
+        data = self.flight_data
+        if not data.snapshot_replaced():
+            return False
+        started = time.monotonic()
+        snapshot = data.open_snapshot()
+        if self.warm_files and snapshot.path is not None:
+            warm_file(snapshot.path)
+        state = None
+        with data.pinned_snapshot(snapshot):
+            # Logs the rollups the new file misses, if any
+            if "parquet" in data.stale_rollups():
+                try:
+                    data.analytics.refresh(data.database_files()[0])
+                except Exception as e:
+                    print(f"Could not refresh the Parquet copy for {snapshot.path}, "
+                          f"aggregates run on SQLite: {e}", file=sys.stderr, flush=True)
+            if self.warmer is not None:
+                state = (data.fingerprint(), self.warmer.compute())
+            else:
+                data.get_airline_names()
+        if snapshot.replaced():
+            # Replaced again while warming up: the next check takes the newer one
+            return False
+        data.swap_snapshot(snapshot)
+        if state is not None:
+            self.warmer.install(*state)
+        print(f"Swapped in a new database snapshot of {snapshot.path} "
+              f"(warmed up in {time.monotonic() - started:.1f}s)", file=sys.stderr, flush=True)
+        return True
@@ -0,0 +1,189 @@
+"""Render the stats endpoints to static, precompressed JSON files.
+
+The stats only change when new data is loaded, so they can be served by a
+plain web server or a CDN without running Python at all. Every response
+is rendered through the Flask app itself, so the files are byte for byte
+what the API would return. Each one is written to a directory tree that
+mirrors the API paths:
+
+    /api/stats/routes                   -> api/stats/routes/index.json
+    /api/stats/routes?year=2015&month=1 -> api/stats/routes/year=2015&month=1.json
+
+A gzipped copy (``.json.gz``) sits next to every file, for nginx's
+``gzip_static``. With nginx the whole tree is served by:
+
+    # http context: the file of a request's query string
+    map $args $stats_file {
+        ""      index.json;
+        default $args.json;
+    }
+
+    location /api/stats/ {
+        root /srv/skysql;
+        gzip_static on;
+        default_type application/json;
+        try_files $uri/$stats_file =404;
+    }
+
+Only a request without a query string gets ``index.json``; a query string
+that was not exported is a 404 rather than the unfiltered stats.
+
+The export is written to a new directory next to the target, and the
+target is a symlink to the current one. Once every file is written, a new
+link replaces the target in a single rename and the previous directory is
+removed, so readers see either the old tree or the new one, never a
+half-written or missing one. A target that is still a plain directory
+(from an older export) is moved aside first, once.
+"""
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+from sketches import DIMENSIONS
+
+INDEX_FILE = "index.json"
+
+# Compression level of the .gz copies; written once and served many times
+GZIP_LEVEL = 9
+
+# Renders shed by the API's admission limits (429/503) are retried after a
+# growing pause, for at most this many seconds: the export runs more
+# requests at once than a worker queues
+SHED_RETRY_SECONDS = 60
+
+
+def _url(path, **params):
+    """``path`` with ``params`` as its query string, in the order given."""
+    query = urlencode([(name, value) for name, value in params.items() if value is not None])
+    return f"{path}?{query}" if query else path
+
+
+def stats_urls(flight_data):
+    """Every stats URL to export: all stats, each per year and month, per airline and airport.
+
+    Location queries (/api/stats/airports/near) take arbitrary coordinates
+    and are not exported.
+    """
+    months = flight_data.get_months()
+    years = sorted({year for year, _ in months})
+    periods = [{}] + [{"year": year} for year in years] + [{"year": y, "month": m} for y, m in months]
+
+    urls = [_url(f"/api/stats/{kind}", **period) for kind in ("airlines", "hours", "routes", "network")
+            for period in periods]
+    urls += [f"/api/stats/{dimension}/percentiles" for dimension in DIMENSIONS]
+    urls.append(_url("/api/stats/airlines/percentiles", combine="true"))
+    urls += [_url("/api/stats/airlines/percentiles", key=code) for code in flight_data.get_airline_names() if code]
+    urls += [_url("/api/stats/airports/percentiles", key=code) for code in flight_data.get_airport_codes()]
+    for year in years:
+        for granularity in ("day", "week", "month"):
+            for group_by in (None, "airline"):
+                urls.append(_url("/api/stats/timeseries", **{
+                    "from": f"{year}-01-01", "to": f"{year}-12-31",
+                    "granularity": granularity, "group_by": group_by,
+                }))
+    return urls
+
+
+def url_to_path(url):
+    """Relative file path of the rendered ``url``."""
+    parts = urlsplit(url)
+    name = f"{parts.query}.json" if parts.query else INDEX_FILE
+    return os.path.join(*parts.path.strip("/").split("/"), name)
+
+
+class ExportStats:
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.compressed_bytes = 0
+        self.errors = []
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, size, compressed):
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+            self.compressed_bytes += compressed
+
+    def fail(self, url, reason):
+        with self._lock:
+            self.errors.append(f"{url}: {reason}")
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _render(app, url, root, stats):
+    client = app.test_client()
+    response = client.get(url)
+    deadline = time.monotonic() + SHED_RETRY_SECONDS
+    pause = 0.05
+    while response.status_code in (429, 503) and time.monotonic() < deadline:
+        time.sleep(pause)
+        pause = min(pause * 2, 1.0)
+        response = client.get(url)
+    if response.status_code != 200:
+        stats.fail(url, f"HTTP {response.status_code}")
+        return
+    body = response.get_data()
+    # mtime=0 so unchanged data gives identical files (and ETags)
+    compressed = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    path = os.path.join(root, url_to_path(url))
+    _write(path, body)
+    _write(f"{path}.gz", compressed)
+    stats.add(len(body), len(compressed))
+
+
+def _swap(out_dir, version):
+    """Point the ``out_dir`` symlink at the sibling directory ``version``; returns the previous one."""
+    previous = os.path.realpath(out_dir) if os.path.islink(out_dir) else None
+    if previous is None and os.path.exists(out_dir):
+        # A plain directory from an older export: moved aside so the link can take its name
+        previous = f"{version}.old"
+        os.rename(out_dir, previous)
+    link = f"{version}.link"
+    os.symlink(os.path.basename(version), link)
+    os.replace(link, out_dir)
+    return previous
+
+
+def export_static(app, urls, out_dir, workers=None, progress=None):
+    """Render ``urls`` with ``app`` into ``out_dir``, ``workers`` at a time.
+
+    ``out_dir`` becomes a symlink to the rendered tree, replaced only if
+    every URL rendered; otherwise it is left as it was. Returns an
+    ExportStats.
+    """
+    out_dir = os.path.abspath(out_dir)
+    parent = os.path.dirname(out_dir)
+    os.makedirs(parent, exist_ok=True)
+    stats = ExportStats()
+    started = time.perf_counter()
+    staging = tempfile.mkdtemp(prefix=f".{os.path.basename(out_dir)}-", dir=parent)
+    try:
+        # The queries release the GIL in SQLite, so threads render in parallel
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            for _ in executor.map(lambda url: _render(app, url, staging, stats), urls):
+                if progress is not None:
+                    progress(stats)
+        if stats.errors:
+            return stats
+        os.chmod(staging, 0o755)
+        previous = _swap(out_dir, staging)
+        staging = None
+        if previous is not None:
+            shutil.rmtree(previous, ignore_errors=True)
+    finally:
+        if staging is not None and os.path.exists(staging):
+            shutil.rmtree(staging)
+        stats.seconds = time.perf_counter() - started
+    return stats
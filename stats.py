@@ -0,0 +1,102 @@
+"""Delay statistics shared by the API and the ``skysql stats`` command.
+
+Each function combines the delayed and total flight counts of one dimension
+into rows with the delay percentage. Keyword filters (``year``, ``month``)
+are passed through to the FlightData queries.
+"""
+
+STATS_KINDS = ("airlines", "hours", "routes")
+
+
+def _percentage(delayed, total):
+    return round(delayed / total * 100, 2) if total > 0 else 0
+
+
+def airline_stats(flight_data, **filters):
+    delayed_data = flight_data.get_delayed_counts_by_airline(**filters)
+    total_data = flight_data.get_total_flights_by_airline(**filters)
+    if not delayed_data or not total_data:
+        return []
+
+    stats = {}
+    for row in total_data:
+        airline = row.get('airline')
+        if airline:
+            stats[airline] = {
+                'airline': airline,
+                'total_flights': row.get('total_flights', 0),
+                'delayed_flights': 0,
+                'percentage_delayed': 0
+            }
+
+    for row in delayed_data:
+        airline = row.get('airline')
+        if airline and airline in stats:
+            stats[airline]['delayed_flights'] = row.get('delayed_flights', 0)
+            stats[airline]['percentage_delayed'] = _percentage(
+                stats[airline]['delayed_flights'], stats[airline]['total_flights']
+            )
+
+    return list(stats.values())
+
+
+def hourly_stats(flight_data, **filters):
+    delayed_data = flight_data.get_delayed_flights_by_hour(**filters)
+    total_data = flight_data.get_total_flights_by_hour(**filters)
+    if not delayed_data or not total_data:
+        return []
+
+    stats = {}
+    for row in total_data:
+        hour = row.get('hour')
+        if hour is not None:
+            stats[hour] = {
+                'hour': hour,
+                'total_flights': row.get('total_flights', 0),
+                'delayed_flights': 0,
+                'percentage_delayed': 0
+            }
+
+    for row in delayed_data:
+        hour = row.get('hour')
+        if hour is not None and hour in stats:
+            stats[hour]['delayed_flights'] = row.get('delayed_flights', 0)
+            stats[hour]['percentage_delayed'] = _percentage(
+                stats[hour]['delayed_flights'], stats[hour]['total_flights']
+            )
+
+    # Sort by hour for easier consumption
+    return sorted(stats.values(), key=lambda x: x['hour'])
+
+
+def route_stats(flight_data, **filters):
+    delayed_data = flight_data.get_delayed_flights_by_route(**filters)
+    total_data = flight_data.get_total_flights_by_route(**filters)
+    if not delayed_data or not total_data:
+        return []
+
+    stats = {}
+    for row in total_data:
+        origin = row.get('origin_airport')
+        destination = row.get('destination_airport')
+        if origin and destination:
+            stats[(origin, destination)] = {
+                'origin': origin,
+                'destination': destination,
+                'total_flights': row.get('total_flights', 0),
+                'delayed_flights': 0,
+                'percentage_delayed': 0
+            }
+
+    for row in delayed_data:
+        route = (row.get('origin_airport'), row.get('destination_airport'))
+        if route in stats:
+            stats[route]['delayed_flights'] = row.get('delayed_flights', 0)
+            stats[route]['percentage_delayed'] = _percentage(
+                stats[route]['delayed_flights'], stats[route]['total_flights']
+            )
+
+    return list(stats.values())
+
+
+STATS = {"airlines": airline_stats, "hours": hourly_stats, "routes": route_stats}
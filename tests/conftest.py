@@ -0,0 +1,47 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ingest import INDEXES, SCHEMA
+
+AIRLINES = [("DL", "Delta Air Lines Inc."), ("UA", "United Air Lines Inc.")]
+
+# Columns of the flight tuples given to make_database()
+FLIGHT_COLUMNS = ("YEAR", "MONTH", "DAY", "AIRLINE", "ORIGIN_AIRPORT", "DESTINATION_AIRPORT", "DEPARTURE_TIME",
+                  "DEPARTURE_DELAY")
+
+
+@pytest.fixture
+def make_database(tmp_path):
+    """Factory of SQLite files with the ingest schema; returns the path of the file.
+
+    ``make_database(flights, path="flights.sqlite3", columns=FLIGHT_COLUMNS,
+    airlines=AIRLINES, indexes=False, schema=SCHEMA)`` adds ``flights``
+    (tuples of ``columns``) and ``airlines`` (code, name pairs) to the file
+    at ``path``, relative to tmp_path. The file is created if needed, so
+    calling it again on the same path adds more flights.
+    """
+    def make(flights=(), path="flights.sqlite3", columns=FLIGHT_COLUMNS, airlines=AIRLINES, indexes=False,
+             schema=SCHEMA):
+        path = str(tmp_path / path)
+        conn = sqlite3.connect(path)
+        try:
+            conn.executescript(schema)
+            if indexes:
+                for statement in INDEXES.values():
+                    conn.execute(statement)
+            conn.executemany("INSERT OR IGNORE INTO airlines (ID, AIRLINE) VALUES (?, ?)", airlines)
+            conn.executemany(
+                f"INSERT INTO flights ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                flights,
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return path
+    return make
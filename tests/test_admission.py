@@ -0,0 +1,180 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import api
+import data
+from admission import HEAVY, LIGHT, AdmissionController, Overloaded, plan_cost_class, query_cost_classes, thread_budget
+from data import FlightData
+from metrics import Counters
+
+
+def _hold_slot(controller, name, release):
+    """Occupy one slot of ``name`` in a thread until ``release`` is set."""
+    admitted = threading.Event()
+
+    @controller.limit(name)
+    def view():
+        admitted.set()
+        release.wait(5)
+
+    thread = threading.Thread(target=view)
+    thread.start()
+    assert admitted.wait(5)
+    return thread
+
+
+def test_sheds_with_429_when_queue_is_full():
+    metrics = Counters()
+    controller = AdmissionController({HEAVY: (1, 0, 1)}, metrics)
+    release = threading.Event()
+    thread = _hold_slot(controller, HEAVY, release)
+
+    with pytest.raises(Overloaded) as error:
+        controller.acquire(HEAVY)
+    assert error.value.status == 429
+    assert error.value.retry_after >= 1
+
+    # Unlimited classes are always admitted
+    controller.acquire(LIGHT)
+
+    release.set()
+    thread.join()
+    assert metrics.snapshot() == {"rejected_heavy": 1}
+
+
+def test_queued_requests_time_out_with_503():
+    controller = AdmissionController({HEAVY: (1, 4, 0.05)})
+    release = threading.Event()
+    thread = _hold_slot(controller, HEAVY, release)
+
+    with pytest.raises(Overloaded) as error:
+        controller.acquire(HEAVY)
+    assert error.value.status == 503
+
+    release.set()
+    thread.join()
+
+
+def test_queued_request_runs_when_slot_frees():
+    controller = AdmissionController({HEAVY: (1, 4, 5)})
+    release = threading.Event()
+    thread = _hold_slot(controller, HEAVY, release)
+
+    threading.Timer(0.05, release.set).start()
+    start = time.monotonic()
+    controller.acquire(HEAVY)
+
+    assert time.monotonic() - start >= 0.04
+    controller.release(HEAVY, 0.01)
+    thread.join()
+
+
+def test_thread_budget_leaves_threads_for_light_requests():
+    # 4 threads, 2 running heavy requests, 1 thread kept for light ones
+    assert thread_budget(4, 2) == (2, 1)
+    assert thread_budget(4, 2, max_queue=16) == (2, 1)
+    assert thread_budget(4, 2, max_queue=0) == (2, 0)
+    assert thread_budget(4, 8) == (3, 0)
+    assert thread_budget(8, 2, reserved=2) == (2, 4)
+    assert thread_budget(1, 2) == (1, 0)
+
+
+def test_full_queue_of_the_default_budget_is_shed():
+    controller = AdmissionController({HEAVY: (*thread_budget(4, 2), 5)})
+    release = threading.Event()
+    running = [_hold_slot(controller, HEAVY, release) for _ in range(2)]
+    queued = threading.Thread(target=lambda: (controller.acquire(HEAVY), controller.release(HEAVY, 0)))
+    queued.start()
+    while controller.classes[HEAVY].waiting < 1:
+        time.sleep(0.01)
+
+    # Two running and one queued: the fourth thread stays free for light requests
+    with pytest.raises(Overloaded) as error:
+        controller.acquire(HEAVY)
+    assert error.value.status == 429
+
+    release.set()
+    for thread in running + [queued]:
+        thread.join()
+
+
+def test_pooled_requests_wait_beyond_the_queue_cap():
+    controller = AdmissionController({HEAVY: (1, 0, 5)})
+    release = threading.Event()
+    thread = _hold_slot(controller, HEAVY, release)
+
+    with pytest.raises(Overloaded):
+        controller.acquire(HEAVY)
+    threading.Timer(0.05, release.set).start()
+    with controller.pooled():
+        controller.acquire(HEAVY)
+    controller.release(HEAVY, 0.01)
+    thread.join()
+
+
+@pytest.fixture
+def indexed(make_database):
+    return FlightData(f"sqlite:///{make_database(indexes=True)}")
+
+
+@pytest.mark.parametrize("query, params, cost_class", [
+    (data.QUERY_FLIGHT_BY_ID, {"id": 1}, LIGHT),
+    (data.QUERY_FLIGHTS_BY_DATE, {"day": 1, "month": 1, "year": 2015}, LIGHT),
+    (data.QUERY_FLIGHTS_BY_ORIGIN, {"origin": "ATL"}, LIGHT),
+    (data.QUERY_DELAYED_FLIGHTS, {}, HEAVY),
+    (data.QUERY_TOTAL_FLIGHTS_BY_ROUTE, {}, HEAVY),
+    (data.QUERY_DELAYED_FLIGHTS_BY_HOUR, {}, HEAVY),
+])
+def test_endpoint_cost_classes_match_query_plans(indexed, query, params, cost_class):
+    """The classes assigned in api.py follow from the query plans"""
+    assert plan_cost_class(indexed.explain(query, params)) == cost_class
+
+
+def test_airline_query_is_only_light_with_its_index(indexed, make_database):
+    """Without idx_flights_airline the airline query scans"""
+    params = {"airline": "DL"}
+    assert plan_cost_class(indexed.explain(data.QUERY_DELAYED_FLIGHTS_BY_AIRLINE, params)) == LIGHT
+
+    unindexed = FlightData(f"sqlite:///{make_database(path='dropped_in.sqlite3')}")
+    assert plan_cost_class(unindexed.explain(data.QUERY_DELAYED_FLIGHTS_BY_AIRLINE, params)) == HEAVY
+
+
+def test_routes_are_classed_by_the_plans_on_the_database_in_use(indexed, make_database, tmp_path, capsys):
+    classes = query_cost_classes(indexed.explain, api.PLANNED_QUERIES)
+    assert classes == {"flight": LIGHT, "date": LIGHT, "delayed": HEAVY, "delayed_origin": LIGHT,
+                       "delayed_airline": LIGHT}
+
+    unindexed = FlightData(f"sqlite:///{make_database(path='dropped_in.sqlite3')}")
+    assert query_cost_classes(unindexed.explain, api.PLANNED_QUERIES)["delayed_airline"] == HEAVY
+
+    # Nothing to plan on: heavy until the database is there
+    empty = FlightData(f"sqlite:///{tmp_path / 'empty.sqlite3'}")
+    assert set(query_cost_classes(empty.explain, api.PLANNED_QUERIES).values()) == {HEAVY}
+    assert "Could not plan the flight query" in capsys.readouterr().out
+
+
+def test_limit_takes_the_class_of_each_request():
+    controller = AdmissionController({HEAVY: (1, 0, 1)})
+    classes = iter([LIGHT, HEAVY])
+    release = threading.Event()
+
+    @controller.limit(lambda: next(classes))
+    def view():
+        release.wait(5)
+
+    light = threading.Thread(target=view)
+    light.start()
+    # The light request holds no heavy slot
+    thread = _hold_slot(controller, HEAVY, release)
+    with pytest.raises(Overloaded):
+        view()
+    release.set()
+    thread.join()
+    light.join()
@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import data as data_module
+from data import FlightData
+
+# (airline, origin, destination, delay)
+FLIGHTS = [
+    ("UA", "ORD", "SFO", 45),
+    ("DL", "ATL", "LAX", 25),
+    ("DL", "ATL", "LAX", 60),
+    ("AA", "DFW", "LAX", 90),
+    ("DL", "ATL", "JFK", 5),
+    ("XX", "ATL", "JFK", 99),  # not in the airlines table
+]
+
+
+@pytest.fixture
+def database(make_database):
+    return make_database(
+        [(2015, 1, 1, *flight) for flight in FLIGHTS],
+        columns=("YEAR", "MONTH", "DAY", "AIRLINE", "ORIGIN_AIRPORT", "DESTINATION_AIRPORT", "DEPARTURE_DELAY"),
+        airlines=[("AA", "American Airlines Inc."), ("DL", "Delta Air Lines Inc."), ("UA", "Alpha Air")],
+        indexes=True,
+    )
+
+
+def test_names_are_resolved_and_sorted_by_name(database):
+    data = FlightData(f"sqlite:///{database}")
+
+    delayed = data.get_delayed_flights()
+    assert [(r["airline_name"], r["delay"]) for r in delayed] == [
+        ("Alpha Air", 45), ("American Airlines Inc.", 90), ("Delta Air Lines Inc.", 60), ("Delta Air Lines Inc.", 25),
+    ]
+    assert [(r["airline_name"], r["delay"]) for r in data.iter_delayed_flights()] == \
+        [(r["airline_name"], r["delay"]) for r in delayed]
+    assert data.get_flight_by_id(3)[0]["airline_name"] == "Delta Air Lines Inc."
+    # Like the JOIN did, flights of unknown airlines are left out
+    assert data.get_flight_by_id(6) == []
+    totals = {r["airline"]: r["total_flights"] for r in data.get_total_flights_by_airline()}
+    assert totals == {"Alpha Air": 1, "American Airlines Inc.": 1, "Delta Air Lines Inc.": 3}
+
+
+def test_name_filter_uses_the_airline_index(database):
+    data = FlightData(f"sqlite:///{database}")
+
+    rows = data.get_delayed_flights_by_airline("Delta Air Lines Inc.")
+    assert [r["delay"] for r in rows] == [60, 25]
+    assert [r["delay"] for r in data.iter_delayed_flights("Delta Air Lines Inc.")] == [60, 25]
+    assert data.get_delayed_flights_by_airline("Nonexistent Airways") == []
+    assert data.get_delayed_flights_by_airline("Delta Air Lines Inc.", year=2016) == []
+
+
+def test_names_are_reloaded_when_the_database_changes(database):
+    data = FlightData(f"sqlite:///{database}")
+    assert data.get_airline_names() is data.get_airline_names()
+
+    conn = sqlite3.connect(database)
+    conn.execute("UPDATE airlines SET AIRLINE = 'Delta' WHERE ID = 'DL'")
+    conn.execute("INSERT INTO airlines VALUES ('XX', 'Unknown Air')")
+    conn.commit()
+    conn.close()
+
+    assert data.get_airline_names()["DL"] == "Delta"
+    assert [r["delay"] for r in data.get_delayed_flights_by_airline("Delta")] == [60, 25]
+    assert data.get_delayed_flights_by_airline("Unknown Air")[0]["delay"] == 99
+
+
+def test_failed_load_of_the_names_is_not_kept(database, monkeypatch):
+    data = FlightData(f"sqlite:///{database}")
+    # e.g. SQLITE_BUSY while an ingest commits
+    monkeypatch.setattr(data_module, "QUERY_AIRLINE_NAMES", "SELECT ID AS id, AIRLINE AS airline FROM busy")
+
+    with pytest.raises(Exception):
+        data.get_airline_names()
+
+    monkeypatch.undo()
+    assert data.get_airline_names()["DL"] == "Delta Air Lines Inc."
+    assert len(data.get_delayed_flights()) == 4
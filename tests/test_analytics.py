@@ -0,0 +1,152 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+pytest.importorskip("duckdb")
+
+import analytics
+import data
+from analytics import AnalyticsStore, to_duckdb_sql
+from data import FlightData
+from snapshots import SnapshotWatcher
+
+FLIGHTS = [
+    (2015, 1, 1, "DL", "ATL", "LAX", "0815", 5),
+    (2015, 1, 1, "UA", "ORD", "SFO", "0930", 45),
+    (2015, 1, 1, "DL", "ATL", "LAX", "0820", 25),
+    (2015, 2, 1, "DL", "ATL", "LAX", "1705", 60),
+    (2015, 2, 1, "UA", "ORD", "SFO", None, None),
+]
+LATE_FLIGHT = (2015, 3, 1, "DL", "ATL", "LAX", "0900", 90)
+
+
+@pytest.fixture
+def database(make_database):
+    return make_database(FLIGHTS, airlines=[("DL", "Delta Air Lines Inc."), ("UA", 'United, "Air" Lines')])
+
+
+def _sorted(rows):
+    return sorted(rows, key=repr)
+
+
+def test_to_duckdb_sql():
+    assert to_duckdb_sql("SELECT CAST(x AS INTEGER) FROM t WHERE a = :a AND b = :b") == \
+        "SELECT TRY_CAST(x AS INTEGER) FROM t WHERE a = $a AND b = $b"
+    assert to_duckdb_sql("SELECT a + b FROM t ORDER BY +t.a, +b DESC") == "SELECT a + b FROM t ORDER BY t.a, b DESC"
+
+
+def test_aggregates_match_sqlite(database):
+    sqlite = FlightData(f"sqlite:///{database}")
+    duckdb = FlightData(f"sqlite:///{database}", backend="duckdb")
+    assert duckdb.refresh_rollups()["parquet"] == len(FLIGHTS)
+
+    for method in ("get_total_flights_by_airline", "get_delayed_flights_by_hour", "get_total_flights_by_hour",
+                   "get_delayed_flights_by_route", "get_total_flights_by_route"):
+        for filters in ({}, {"year": 2015, "month": 2}):
+            assert _sorted(getattr(duckdb, method)(**filters)) == _sorted(getattr(sqlite, method)(**filters))
+    assert duckdb.metrics.get("analytics_queries") == 10
+    assert os.path.isdir(f"{database}.parquet")
+
+
+def test_delayed_flights_query_runs_on_duckdb(database, capsys):
+    sqlite = FlightData(f"sqlite:///{database}")
+    duckdb = FlightData(f"sqlite:///{database}", backend="duckdb")
+    duckdb.refresh_rollups()
+
+    rows = duckdb.analytics.query(data.QUERY_DELAYED_FLIGHTS)
+    assert [(r["airline_name"], r["delay"]) for r in rows] == [("DL", 60), ("DL", 25), ("UA", 45)]
+    # Nothing fell back to SQLite
+    assert "Analytics query failed" not in capsys.readouterr().out
+
+    # The list itself is no aggregate and stays on SQLite
+    assert duckdb.get_delayed_flights() == sqlite.get_delayed_flights()
+    assert duckdb.metrics.get("analytics_queries") == 0
+
+
+def test_lookups_stay_on_sqlite(database):
+    duckdb = FlightData(f"sqlite:///{database}", backend="duckdb")
+    duckdb.refresh_rollups()
+
+    assert duckdb.get_flight_by_id(2)[0]["airline_name"] == 'United, "Air" Lines'
+    assert duckdb.metrics.get("analytics_queries") == 0
+
+
+def test_stale_copy_falls_back_to_sqlite_until_refreshed(database, make_database):
+    duckdb = FlightData(f"sqlite:///{database}", backend="duckdb")
+    assert duckdb.get_total_flights_by_route()  # nothing exported yet
+    duckdb.refresh_rollups()
+    make_database([LATE_FLIGHT], path=database)
+
+    totals = {(r["origin_airport"], r["destination_airport"]): r["total_flights"]
+              for r in duckdb.get_total_flights_by_route()}
+    assert totals[("ATL", "LAX")] == 4
+    assert duckdb.metrics.get("analytics_queries") == 0
+
+    assert duckdb.refresh_rollups()["parquet"] == 1
+    totals = {(r["origin_airport"], r["destination_airport"]): r["total_flights"]
+              for r in duckdb.get_total_flights_by_route()}
+    assert totals[("ATL", "LAX")] == 4
+    assert duckdb.metrics.get("analytics_queries") == 1
+
+
+def test_copy_of_a_replaced_database_is_not_used(database, make_database, capsys):
+    duckdb = FlightData(f"sqlite:///{database}", backend="duckdb")
+    duckdb.refresh_rollups()
+    assert duckdb.stale_rollups() == frozenset()
+    # Another database with as many flights (same IDs), dropped in over the first
+    replacement = make_database([(2015, 3, 1, "UA", "SFO", "ORD", "0900", 90)] * len(FLIGHTS), path="next.sqlite3",
+                                airlines=[("UA", "United Air Lines Inc.")])
+    os.replace(replacement, database)
+    reopened = FlightData(f"sqlite:///{database}", backend="duckdb")
+
+    assert "parquet" in reopened.stale_rollups()
+    assert [r["origin_airport"] for r in reopened.get_total_flights_by_route()] == ["SFO"]
+    assert reopened.metrics.get("analytics_queries") == 0
+
+    assert reopened.refresh_rollups()["parquet"] == len(FLIGHTS)
+    assert "exported from another database" in capsys.readouterr().out
+    totals = reopened.get_total_flights_by_route()
+    assert [(r["origin_airport"], r["total_flights"]) for r in totals] == [("SFO", len(FLIGHTS))]
+    assert reopened.metrics.get("analytics_queries") == 1
+
+
+def test_swap_brings_the_copy_up_to_date(database, make_database, tmp_path):
+    duckdb = FlightData(f"sqlite:///{database}", backend="duckdb")
+    duckdb.refresh_rollups()
+    next_path = tmp_path / "next.sqlite3"
+    shutil.copy(database, next_path)
+    make_database([LATE_FLIGHT], path=next_path)
+    os.replace(next_path, database)
+
+    assert SnapshotWatcher(duckdb, warm_files=False).check()
+    assert "parquet" not in duckdb.stale_rollups()
+    totals = {(r["origin_airport"], r["destination_airport"]): r["total_flights"]
+              for r in duckdb.get_total_flights_by_route()}
+    assert totals[("ATL", "LAX")] == 4
+    assert duckdb.metrics.get("analytics_queries") == 1
+
+
+def test_refresh_appends_parts(database, make_database, tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics, "PART_ROWS", 2)
+    store = AnalyticsStore(tmp_path / "copy")
+
+    assert store.refresh(database) == 5
+    assert [(first, last) for first, last, _ in store.parts()] == [(1, 2), (3, 4), (5, 5)]
+    assert store.refresh(database) == 0
+
+    make_database([LATE_FLIGHT], path=database)
+    assert store.refresh(database) == 1
+    assert store.last_id() == 6
+    assert store.query("SELECT COUNT(*) AS n FROM flights WHERE DEPARTURE_DELAY >= :d", {"d": 20}) == [{"n": 4}]
+
+
+def test_requires_a_single_database(tmp_path):
+    with pytest.raises(ValueError):
+        FlightData(partition_dir=str(tmp_path), backend="duckdb")
+    with pytest.raises(ValueError):
+        FlightData("sqlite:///:memory:", backend="columnar")
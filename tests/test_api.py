@@ -9,6 +9,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 # Import the Flask app
 import api
+from warmup import DerivedIndex
 
 
 @pytest.fixture
@@ -25,6 +26,7 @@ def mock_flight_data():
     with patch('api.FlightData') as MockFlightData:
         mock_instance = MockFlightData.return_value
         api.flight_data = mock_instance
+        api.cost_classes = DerivedIndex(mock_instance, api.plan_routes)
         yield mock_instance
 
 
@@ -99,7 +101,7 @@ def test_get_flights_by_date(client, mock_flight_data):
     mock_flight_data.get_flights_by_date.assert_called_once_with(15, 6, 2023)
 
 
-def test_get_flights_by_date_invalid(client):
+def test_get_flights_by_date_invalid(client, mock_flight_data):
     """Test input validation for invalid date"""
     # Make the request with invalid month
     response = client.get('/api/flights/date/2023/13/15')
@@ -136,7 +138,7 @@ def test_get_flights_by_origin(client, mock_flight_data):
 def test_get_airline_stats(client, mock_flight_data):
     """Test getting airline statistics"""
     # Set up mocks to return airline data
-    mock_flight_data.get_delayed_flights_by_airline.return_value = [
+    mock_flight_data.get_delayed_counts_by_airline.return_value = [
         {"airline": "Delta", "delayed_flights": 150},
         {"airline": "United", "delayed_flights": 200}
     ]
@@ -159,4 +161,196 @@ def test_get_airline_stats(client, mock_flight_data):
     assert delta_stats['percentage_delayed'] == 15.0  # 150/1000 * 100
 
     united_stats = next(item for item in data['data'] if item['airline'] == 'United')
-    assert united_stats['percentage_delayed'] == 16.67  # 200/1200 * 100, rounded to 2 decimal places
\ No newline at end of file
+    assert united_stats['percentage_delayed'] == 16.67  # 200/1200 * 100, rounded to 2 decimal places
+
+def test_stats_date_filter(client, mock_flight_data):
+    """Test that ?year=&month= is passed through to the data layer"""
+    mock_flight_data.get_delayed_flights_by_route.return_value = []
+    mock_flight_data.get_total_flights_by_route.return_value = []
+
+    response = client.get('/api/stats/routes?year=2015&month=1')
+
+    assert response.status_code == 200
+    mock_flight_data.get_total_flights_by_route.assert_called_once_with(year=2015, month=1)
+
+
+def test_stats_date_filter_invalid(client, mock_flight_data):
+    """Test input validation for the stats date filter"""
+    response = client.get('/api/stats/hours?month=13')
+    data = json.loads(response.data)
+
+    assert response.status_code == 400
+    assert data['success'] is False
+
+
+def test_get_delay_percentiles(client, mock_flight_data):
+    """Test the percentile endpoint parses quantiles and validates the dimension"""
+    mock_flight_data.get_delay_percentiles.return_value = [
+        {"airline": "Delta", "flights": 100, "p50": 3, "p95": 48}
+    ]
+
+    response = client.get('/api/stats/airlines/percentiles?q=0.5,0.95')
+    data = json.loads(response.data)
+
+    assert response.status_code == 200
+    assert data['data'][0]['p95'] == 48
+    mock_flight_data.get_delay_percentiles.assert_called_once_with(
+        'airlines', [0.5, 0.95], key=None, combine=False
+    )
+
+    assert client.get('/api/stats/planets/percentiles').status_code == 400
+    assert client.get('/api/stats/hours/percentiles?q=2').status_code == 400
+
+
+def test_get_delay_timeseries(client, mock_flight_data):
+    """Test the timeseries endpoint rolls days up and fills gaps"""
+    mock_flight_data.get_daily_stats.return_value = [
+        {"year": 2015, "month": 1, "day": 1, "airline": "DL", "total_flights": 10, "delayed_flights": 2},
+        {"year": 2015, "month": 1, "day": 3, "airline": "DL", "total_flights": 10, "delayed_flights": 3},
+    ]
+
+    response = client.get('/api/stats/timeseries?from=2015-01-01&to=2015-01-03')
+    data = json.loads(response.data)
+
+    assert response.status_code == 200
+    assert [p['total_flights'] for p in data['data']] == [10, 0, 10]
+    assert data['data'][2] == {"period": "2015-01-03", "total_flights": 10, "delayed_flights": 3,
+                               "percentage_delayed": 30.0}
+
+    assert client.get('/api/stats/timeseries?from=2015-01-03&to=2015-01-01').status_code == 400
+    assert client.get('/api/stats/timeseries?from=2015-01-01&to=2015-01-03&granularity=hour').status_code == 400
+
+
+def test_get_metrics(client, mock_flight_data):
+    """Test the metrics endpoint reports the data layer counters"""
+    mock_flight_data.get_metrics.return_value = {"queries_executed": 3, "queries_coalesced": 5}
+
+    response = client.get('/api/metrics')
+    data = json.loads(response.data)
+
+    assert response.status_code == 200
+    assert data['data'] == {"queries_executed": 3, "queries_coalesced": 5}
+
+
+def test_health_ready_waits_for_warmup(client, mock_flight_data):
+    """Test readiness is only reported once the warm-up has finished"""
+    with patch.object(api, 'WARMUP_ENABLED', True), patch.object(api, 'warmer') as warmer:
+        warmer.ready.is_set.return_value = False
+        assert client.get('/api/health/ready').status_code == 503
+        assert client.get('/api/health/live').status_code == 200
+
+        warmer.ready.is_set.return_value = True
+        assert client.get('/api/health/ready').status_code == 200
+
+
+def test_stats_served_from_warm_aggregates(client, mock_flight_data):
+    """Test unfiltered stats come from the precomputed aggregates when available"""
+    with patch.object(api, 'warmer') as warmer:
+        warmer.get.return_value = [{"hour": 8, "total_flights": 1, "delayed_flights": 0, "percentage_delayed": 0}]
+        data = json.loads(client.get('/api/stats/hours').data)
+        client.get('/api/stats/hours?year=2015')
+
+    assert data['data'][0]['hour'] == 8
+    warmer.get.assert_called_once_with('hours')
+    mock_flight_data.get_total_flights_by_hour.assert_called_once_with(year=2015)
+
+
+def test_heavy_requests_are_shed_with_retry_after(client, mock_flight_data):
+    """Test heavy endpoints answer 429 with Retry-After once their limit and queue are full"""
+    with patch.object(api.admission, 'acquire', side_effect=api.Overloaded("Too many requests", 429, 3)):
+        response = client.get('/api/stats/routes')
+
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '3'
+    assert json.loads(response.data)['success'] is False
+    mock_flight_data.get_total_flights_by_route.assert_not_called()
+
+
+def test_query_timeout_returns_504(client, mock_flight_data):
+    """Test a cancelled query is reported to the client as a gateway timeout"""
+    mock_flight_data.get_delayed_flights.side_effect = api.QueryTimeoutError("Query exceeded its time limit")
+
+    response = client.get('/api/flights/delayed')
+
+    assert response.status_code == 504
+    assert json.loads(response.data) == {"success": False, "error": "Query exceeded its time limit"}
+
+
+def test_search(client, mock_flight_data):
+    """Test prefix search over airlines and airports"""
+    mock_flight_data.get_airline_names.return_value = {"DL": "Delta Air Lines Inc."}
+    mock_flight_data.get_airport_codes.return_value = ["DEN", "DFW"]
+    mock_flight_data.fingerprint.return_value = ()
+
+    with patch.object(api, 'prefix_search', api.PrefixSearch(mock_flight_data)):
+        response = client.get('/api/search?q=d&limit=2')
+        assert client.get('/api/search?q=').status_code == 400
+        assert client.get('/api/search?q=d&limit=0').status_code == 400
+
+    data = json.loads(response.data)
+    assert response.status_code == 200
+    assert data['data'] == [{"type": "airline", "code": "DL", "name": "Delta Air Lines Inc."},
+                            {"type": "airport", "code": "DEN"}]
+
+
+def test_airports_near_and_stats(client, mock_flight_data):
+    """Test the location endpoints answer from the airport grid index"""
+    mock_flight_data.fingerprint.return_value = ()
+    mock_flight_data.get_airports.return_value = [
+        {"code": "ATL", "name": "Atlanta", "latitude": 33.64044, "longitude": -84.42694},
+        {"code": "PDK", "name": "DeKalb-Peachtree", "latitude": 33.8756, "longitude": -84.302},
+        {"code": "LAX", "name": "Los Angeles", "latitude": 33.94254, "longitude": -118.40807},
+    ]
+    mock_flight_data.get_departure_stats_by_airport.return_value = [
+        {"airport": "ATL", "total_flights": 4, "delayed_flights": 1}]
+
+    with patch.object(api, 'airport_index', DerivedIndex(mock_flight_data, api.build_airport_index)):
+        near = json.loads(client.get('/api/airports/near?lat=33.7&lon=-84.4&radius_km=50').data)
+        stats = json.loads(client.get('/api/stats/airports/near?lat=33.7&lon=-84.4&radius_km=50').data)
+        corridor = json.loads(client.get('/api/airports/corridor?from=lax&to=ATL&width_km=30').data)
+        assert client.get('/api/airports/near?lat=91&lon=0').status_code == 400
+        assert client.get('/api/airports/corridor?from=XXX&to=ATL').status_code == 400
+
+    assert [a['code'] for a in near['data']] == ['ATL', 'PDK']
+    assert near['data'][0]['distance_km'] == 7.1
+    mock_flight_data.get_departure_stats_by_airport.assert_called_once_with(['ATL', 'PDK'])
+    assert [(a['code'], a['total_flights'], a['percentage_delayed']) for a in stats['data']] == [
+        ('ATL', 4, 25.0), ('PDK', 0, 0)]
+    assert [a['code'] for a in corridor['data']] == ['LAX', 'ATL', 'PDK']
+
+
+def test_batch_runs_and_deduplicates_subrequests(client, mock_flight_data):
+    """Test that a batch answers every sub-request in order and runs identical ones once"""
+    mock_flight_data.get_flight_by_id.return_value = [{"id": 7}]
+    mock_flight_data.get_delayed_flights_by_route.return_value = [
+        {"origin_airport": "ATL", "destination_airport": "LAX", "delayed_flights": 2}]
+    mock_flight_data.get_total_flights_by_route.return_value = [
+        {"origin_airport": "ATL", "destination_airport": "LAX", "total_flights": 4}]
+
+    response = client.post('/api/batch', json={"requests": [
+        "/api/stats/routes?year=2015&month=1",
+        {"path": "/api/flights/7"},
+        "/api/stats/routes?month=1&year=2015",
+        "/api/flights/date/2015/13/1",
+    ]})
+    data = json.loads(response.data)
+
+    assert response.status_code == 200
+    assert [item["path"] for item in data['data']] == [
+        "/api/stats/routes?year=2015&month=1", "/api/flights/7",
+        "/api/stats/routes?month=1&year=2015", "/api/flights/date/2015/13/1"]
+    assert [item["status"] for item in data['data']] == [200, 200, 200, 400]
+    assert data['data'][0]["body"] == data['data'][2]["body"]
+    assert data['data'][0]["body"]["data"][0]["percentage_delayed"] == 50.0
+    assert data['data'][1]["body"]["data"] == [{"id": 7}]
+    mock_flight_data.get_total_flights_by_route.assert_called_once_with(year=2015, month=1)
+
+
+def test_batch_rejects_invalid_requests(client, mock_flight_data):
+    """Test that malformed batches are rejected as a whole"""
+    for payload in ({"requests": []}, {"requests": ["/api/flights/1"] * (api.MAX_BATCH_SIZE + 1)},
+                    {"requests": ["/api/batch"]}, {"requests": [{"path": "/api/flights/1", "method": "POST"}]},
+                    {"requests": ["http://example.com/"]}, ["/api/flights/1"]):
+        response = client.post('/api/batch', json=payload)
+        assert response.status_code == 400
+        assert json.loads(response.data)['success'] is False
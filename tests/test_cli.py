@@ -0,0 +1,127 @@
+import io
+import json
+import os
+import sys
+
+import pytest
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cli
+from output import write_json, write_table
+from partitions import partition_path
+
+# (year, month, day, airline, origin, destination, departure time, delay)
+FLIGHTS = [
+    (2015, 1, 1, "DL", "ATL", "LAX", "0815", 5),
+    (2015, 1, 1, "UA", "ORD", "SFO", "0930", 45),
+    (2015, 1, 2, "DL", "ATL", "LAX", "0820", 25),
+    (2015, 2, 1, "DL", "ATL", "LAX", "1705", 60),
+    (2015, 2, 3, "UA", "ORD", "SFO", "0940", 30),
+]
+
+
+@pytest.fixture
+def database(make_database):
+    return ["--database", make_database(FLIGHTS)]
+
+
+@pytest.fixture
+def partitioned(make_database, tmp_path):
+    directory = tmp_path / "partitions"
+    directory.mkdir()
+    for month in (1, 2):
+        make_database([f for f in FLIGHTS if f[1] == month], path=partition_path(directory, 2015, month))
+    return ["--partition-dir", str(directory)]
+
+
+def test_flights_by_date_csv(database, capsys):
+    assert cli.main(database + ["flights", "--date", "2015-01-01", "--format", "csv"]) == 0
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "id,year,month,day,origin_airport,destination_airport,airline_name,delay"
+    assert sorted(line.split(",")[4] for line in lines[1:]) == ["ATL", "ORD"]
+
+
+@pytest.mark.parametrize("source", ["database", "partitioned"])
+def test_delayed_flights_stream_in_order(source, request, capsys):
+    args = request.getfixturevalue(source)
+
+    assert cli.main(args + ["flights", "--delayed", "--format", "json"]) == 0
+
+    rows = json.loads(capsys.readouterr().out)
+    assert [(r["airline_name"], r["delay"]) for r in rows] == [
+        ("Delta Air Lines Inc.", 60), ("Delta Air Lines Inc.", 25),
+        ("United Air Lines Inc.", 45), ("United Air Lines Inc.", 30)]
+
+
+def test_delayed_flights_filters(partitioned, capsys):
+    cli.main(partitioned + ["flights", "--delayed", "--airline", "United Air Lines Inc.", "--month", "2",
+                            "--format", "jsonl"])
+
+    assert [json.loads(line)["delay"] for line in capsys.readouterr().out.splitlines()] == [30]
+
+
+def test_filters_require_delayed(database):
+    with pytest.raises(SystemExit):
+        cli.main(database + ["flights", "--date", "2015-01-01", "--origin", "ATL"])
+
+
+def test_stats_routes_json(database, capsys):
+    assert cli.main(database + ["stats", "routes", "--year", "2015", "--format", "json"]) == 0
+
+    rows = json.loads(capsys.readouterr().out)
+    assert sorted(rows, key=lambda r: r["origin"]) == [
+        {"origin": "ATL", "destination": "LAX", "total_flights": 3, "delayed_flights": 2, "percentage_delayed": 66.67},
+        {"origin": "ORD", "destination": "SFO", "total_flights": 2, "delayed_flights": 2, "percentage_delayed": 100.0},
+    ]
+
+
+@pytest.mark.parametrize("source", ["database", "partitioned"])
+def test_stats_airlines_count_delayed_flights(source, request, capsys):
+    assert cli.main(request.getfixturevalue(source) + ["stats", "airlines", "--format", "json"]) == 0
+
+    rows = json.loads(capsys.readouterr().out)
+    assert sorted(rows, key=lambda r: r["airline"]) == [
+        {"airline": "Delta Air Lines Inc.", "total_flights": 3, "delayed_flights": 2, "percentage_delayed": 66.67},
+        {"airline": "United Air Lines Inc.", "total_flights": 2, "delayed_flights": 2, "percentage_delayed": 100.0},
+    ]
+
+
+def test_stats_hours_table(database, capsys):
+    assert cli.main(database + ["stats", "hours", "--month", "1"]) == 0
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split() == ["hour", "total_flights", "delayed_flights", "percentage_delayed"]
+    assert [line.split()[0] for line in lines[2:-1]] == ["8", "9"]
+
+
+def test_write_json_is_incremental():
+    def rows():
+        yield {"id": 1}
+        # The first row is already written before the second is produced
+        assert out.getvalue() == '[\n{"id": 1}'
+        yield {"id": 2}
+
+    out = io.StringIO()
+    assert write_json(rows(), out) == 2
+    assert json.loads(out.getvalue()) == [{"id": 1}, {"id": 2}]
+
+
+def test_write_table_pages_and_truncates():
+    rows = [{"id": i, "name": "x" * (i * 10)} for i in range(1, 6)]
+    out = io.StringIO()
+    prompts = []
+
+    def more():
+        prompts.append(True)
+        return len(prompts) < 2
+
+    assert write_table(rows, out, page_size=2, max_width=25, more=more) == 4
+
+    lines = out.getvalue().splitlines()
+    assert len(prompts) == 2
+    # Each page is sized on its own rows, capped at max_width
+    assert lines[2] == "1  " + "x" * 10
+    assert lines[7] == "3  " + "x" * 24 + "…"
@@ -0,0 +1,114 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from coalescing import SingleFlight
+from data import QUERY_TOTAL_FLIGHTS_BY_ROUTE, FlightData
+from metrics import Counters
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def _run_concurrently(target, count):
+    results = [None] * count
+
+    def run(i):
+        results[i] = target()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_concurrent_calls_share_one_execution():
+    metrics = Counters()
+    flight = SingleFlight(metrics, prefix="queries")
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return ["result"]
+
+    threads, results = _run_concurrently(lambda: flight.do("key", slow), 8)
+    _wait_for(lambda: flight.waiters("key") == 7)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert all(result == ["result"] for result in results)
+    assert metrics.snapshot() == {"queries_executed": 1, "queries_coalesced": 7}
+
+    # Nothing is cached once the call is done
+    flight.do("key", slow)
+    assert len(calls) == 2
+
+
+def test_errors_propagate_to_waiters():
+    flight = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def failing():
+        release.wait(5)
+        raise RuntimeError("boom")
+
+    def call():
+        try:
+            flight.do("key", failing)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads, _ = _run_concurrently(call, 3)
+    _wait_for(lambda: flight.waiters("key") == 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == ["boom"] * 3
+
+
+@pytest.fixture
+def flight_data(make_database):
+    return FlightData(f"sqlite:///{make_database([(2015, 1, 1, 'DL', 'ATL', 'LAX', '0815', 30)])}")
+
+
+def test_flight_data_coalesces_identical_queries(flight_data):
+    release = threading.Event()
+    executed = []
+    original = flight_data._execute_query
+
+    def slow(query, params=None, engine=None, deadline=None):
+        executed.append(query)
+        release.wait(5)
+        return original(query, params, engine, deadline)
+
+    flight_data._execute_query = slow
+    threads, results = _run_concurrently(flight_data.get_total_flights_by_route, 5)
+    key = (QUERY_TOTAL_FLIGHTS_BY_ROUTE, (), None, None, None)
+    _wait_for(lambda: flight_data._single_flight.waiters(key) == 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(executed) == 1
+    assert results == [[{"origin_airport": "ATL", "destination_airport": "LAX", "total_flights": 1}]] * 5
+    assert flight_data.get_metrics() == {"queries_executed": 1, "queries_coalesced": 4}
+
+    # Different parameters are separate queries
+    flight_data.get_total_flights_by_route(year=2015)
+    assert len(executed) == 2
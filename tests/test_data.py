@@ -116,3 +116,9 @@ class TestFlightData:
         assert result[0]["airline_name"] == "Delta"
         assert result[0]["delay"] == 25
         assert result[1]["delay"] == 30
+
+    def test_dispose_after_fork_keeps_parent_connections_open(self, data_manager):
+        """After fork the child drops the pool without closing the parent's handles"""
+        data_manager.dispose_after_fork()
+
+        data_manager.engine.dispose.assert_called_once_with(close=False)
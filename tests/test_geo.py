@@ -0,0 +1,112 @@
+import os
+import random
+import sys
+
+import pytest
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from data import FlightData
+import geo
+from geo import GridIndex, distance_to_segment_km, haversine_km
+from ingest import ingest_csv
+
+AIRPORTS_CSV = """IATA_CODE,AIRPORT,CITY,STATE,COUNTRY,LATITUDE,LONGITUDE
+ATL,Hartsfield-Jackson Atlanta International Airport,Atlanta,GA,USA,33.64044,-84.42694
+PDK,DeKalb-Peachtree Airport,Atlanta,GA,USA,33.87560,-84.30200
+LAX,Los Angeles International Airport,Los Angeles,CA,USA,33.94254,-118.40807
+DFW,Dallas/Fort Worth International Airport,Dallas-Fort Worth,TX,USA,32.89595,-97.03720
+ECP,Northwest Florida Beaches International Airport,Panama City,FL,USA,,
+"""
+
+
+def test_haversine_and_segment_distance():
+    assert haversine_km(40.6413, -73.7781, 33.9416, -118.4085) == pytest.approx(3974, abs=5)
+
+    atl, lax = (33.64044, -84.42694), (33.94254, -118.40807)
+    # The ATL-LAX great circle bulges north of DFW; PDK is just behind its start
+    assert distance_to_segment_km(32.89595, -97.03720, atl, lax) == pytest.approx(218.8, abs=0.5)
+    assert distance_to_segment_km(33.8756, -84.302, atl, lax) == pytest.approx(
+        haversine_km(*atl, 33.8756, -84.302), abs=1)
+
+
+def test_grid_matches_brute_force_including_antimeridian():
+    rng = random.Random(3)
+    airports = [{"code": str(i), "latitude": rng.uniform(-70, 70), "longitude": rng.uniform(-180, 180)}
+                for i in range(2000)]
+    index = GridIndex(airports)
+
+    for lat, lon, radius in [(10, 179.5, 800), (-20, -179.9, 1500), (45, 0, 300), (69, 90, 1200)]:
+        expected = sorted(a["code"] for a in airports
+                          if haversine_km(lat, lon, a["latitude"], a["longitude"]) <= radius)
+        assert sorted(a["code"] for _, a in index.within(lat, lon, radius)) == expected
+
+
+def test_corridor_matches_brute_force():
+    rng = random.Random(4)
+    airports = [{"code": str(i), "latitude": rng.uniform(25, 50), "longitude": rng.uniform(-125, -65)}
+                for i in range(1500)]
+    index = GridIndex(airports)
+    start, end = (33.64, -84.43), (33.94, -118.41)
+
+    expected = {a["code"] for a in airports
+                if distance_to_segment_km(a["latitude"], a["longitude"], start, end) <= 60}
+    found = index.along(start, end, 60)
+
+    assert {a["code"] for _, _, a in found} == expected
+    assert [from_start for _, from_start, _ in found] == sorted(from_start for _, from_start, _ in found)
+
+
+def test_narrow_corridor_caps_the_search_points(monkeypatch):
+    rng = random.Random(5)
+    airports = [{"code": str(i), "latitude": rng.uniform(25, 50), "longitude": rng.uniform(-125, -65)}
+                for i in range(1500)]
+    index = GridIndex(airports)
+    start, end = (33.64, -84.43), (33.94, -118.41)
+    calls = []
+    within = index.within
+    monkeypatch.setattr(index, "within", lambda *args: calls.append(args) or within(*args))
+    monkeypatch.setattr(geo, "MAX_CORRIDOR_STEPS", 50)
+
+    expected = {a["code"] for a in airports
+                if distance_to_segment_km(a["latitude"], a["longitude"], start, end) <= 20}
+    assert {a["code"] for _, _, a in index.along(start, end, 20)} == expected
+    assert len(calls) == 51
+
+
+@pytest.fixture
+def flight_data(make_database, tmp_path):
+    path = make_database(
+        [(2015, month, 1, "DL", origin, "LAX", delay)
+         for month, origin, delay in [(1, "ATL", 30), (1, "ATL", 0), (2, "PDK", 45), (1, "DFW", 60)]],
+        columns=("YEAR", "MONTH", "DAY", "AIRLINE", "ORIGIN_AIRPORT", "DESTINATION_AIRPORT", "DEPARTURE_DELAY"),
+    )
+
+    airports = tmp_path / "airports.csv"
+    airports.write_text(AIRPORTS_CSV)
+    stats = ingest_csv([], database=path, airports_csv=str(airports))
+    assert stats.airports == 4  # ECP has no coordinates
+    return FlightData(f"sqlite:///{path}")
+
+
+def test_airports_and_departure_stats(flight_data):
+    assert [a["code"] for a in flight_data.get_airports()] == ["ATL", "DFW", "LAX", "PDK"]
+
+    rows = flight_data.get_departure_stats_by_airport(["ATL", "PDK", "LAX"])
+    assert sorted((r["airport"], r["total_flights"], r["delayed_flights"]) for r in rows) == [
+        ("ATL", 2, 1), ("PDK", 1, 1)]
+    assert flight_data.get_departure_stats_by_airport(["PDK"], year=2015, month=1) == []
+
+
+def test_corridor_width_is_bounded(flight_data, monkeypatch):
+    import api
+    from warmup import DerivedIndex
+
+    monkeypatch.setattr(api, "airport_index", DerivedIndex(flight_data, geo.build_airport_index))
+    client = api.app.test_client()
+
+    response = client.get("/api/airports/corridor?from=ATL&to=LAX&width_km=250")
+    assert [a["code"] for a in response.get_json()["data"]] == ["ATL", "PDK", "DFW", "LAX"]
+    for width in ("0.001", "0", "2001", "wide"):
+        assert client.get(f"/api/airports/corridor?from=ATL&to=LAX&width_km={width}").status_code == 400
@@ -0,0 +1,174 @@
+import gzip
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cli
+from data import FlightData
+from ingest import IngestError, ingest_csv
+
+KAGGLE_CSV = """YEAR,MONTH,DAY,DAY_OF_WEEK,AIRLINE,FLIGHT_NUMBER,TAIL_NUMBER,ORIGIN_AIRPORT,DESTINATION_AIRPORT,SCHEDULED_DEPARTURE,DEPARTURE_TIME,DEPARTURE_DELAY,DISTANCE,CANCELLED
+2015,1,1,4,AS,98,N407AS,ANC,SEA,0005,2354,-11,1448,0
+2015,1,1,4,AA,2336,N3KUAA,LAX,PBI,0010,0002,-8,2330,0
+2015,1,2,5,DL,806,N3730B,SFO,MSP,0025,0102,37,1589,0
+2015,2,1,7,AA,258,N3HYAA,LAX,MIA,0020,,,2342,1
+2015,13,1,7,AA,258,N3HYAA,LAX,MIA,0020,0015,-5,2342,0
+2015,2,1,7,AA,258,N3HYAA,LAX
+"""
+
+BTS_CSV = """FL_DATE,OP_UNIQUE_CARRIER,OP_CARRIER_FL_NUM,ORIGIN,DEST,CRS_DEP_TIME,DEP_TIME,DEP_DELAY
+2015-03-05,UA,1,ORD,SFO,0900,0945.00,45.00
+2015-03-05,B6,2,JFK,BOS,540,540.00,0.00
+"""
+
+
+def _write(path, content, compress=False):
+    opener = gzip.open if compress else open
+    with opener(path, "wt", newline="") as fh:
+        fh.write(content)
+    return str(path)
+
+
+def _rows(path, query):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(query).fetchall()
+    finally:
+        conn.close()
+
+
+def test_ingest_validates_and_converts(tmp_path):
+    csv_path = _write(tmp_path / "flights.csv", KAGGLE_CSV)
+    db = str(tmp_path / "flights.sqlite3")
+
+    stats = ingest_csv([csv_path], database=db)
+
+    assert stats.rows == 4
+    assert stats.rejected == 2  # invalid month and short row
+    assert _rows(db, "SELECT ID, AIRLINE, DEPARTURE_TIME, DEPARTURE_DELAY FROM flights ORDER BY ID")[:2] == [
+        (1, "AS", "2354", -11), (2, "AA", "0002", -8)]
+    assert _rows(db, "SELECT DEPARTURE_DELAY, CANCELLED FROM flights WHERE ID = 4") == [(None, 1)]
+
+
+def test_ingest_gzip_bts_layout_and_airline_names(tmp_path):
+    csv_path = _write(tmp_path / "bts.csv.gz", BTS_CSV, compress=True)
+    airlines = _write(tmp_path / "airlines.csv", "IATA_CODE,AIRLINE\nUA,United Air Lines Inc.\n")
+    db = str(tmp_path / "flights.sqlite3")
+
+    ingest_csv([csv_path], database=db, airlines_csv=airlines)
+
+    assert _rows(db, "SELECT YEAR, MONTH, DAY, AIRLINE, ORIGIN_AIRPORT, DEPARTURE_TIME, DEPARTURE_DELAY "
+                     "FROM flights ORDER BY ID") == [
+        (2015, 3, 5, "UA", "ORD", "0945", 45), (2015, 3, 5, "B6", "JFK", "0540", 0)]
+    assert _rows(db, "SELECT ID, AIRLINE FROM airlines ORDER BY ID") == [
+        ("B6", "B6"), ("UA", "United Air Lines Inc.")]
+
+    # A later load with names upgrades the placeholder
+    airlines = _write(tmp_path / "airlines.csv", "IATA_CODE,AIRLINE\nB6,JetBlue Airways\n")
+    ingest_csv([csv_path], database=db, airlines_csv=airlines)
+    assert _rows(db, "SELECT AIRLINE FROM airlines WHERE ID = 'B6'") == [("JetBlue Airways",)]
+    assert _rows(db, "SELECT COUNT(*), COUNT(DISTINCT ID) FROM flights") == [(4, 4)]
+
+
+def test_ingest_rebuilds_indexes(tmp_path):
+    csv_path = _write(tmp_path / "flights.csv", KAGGLE_CSV)
+    db = str(tmp_path / "flights.sqlite3")
+    conn = sqlite3.connect(db)
+    conn.executescript("CREATE TABLE flights (ID INTEGER PRIMARY KEY, YEAR INTEGER, MONTH INTEGER, DAY INTEGER, "
+                       "AIRLINE TEXT, ORIGIN_AIRPORT TEXT, DESTINATION_AIRPORT TEXT, DEPARTURE_DELAY INTEGER);"
+                       "CREATE INDEX idx_custom ON flights (AIRLINE);")
+    conn.close()
+
+    ingest_csv([csv_path], database=db)
+
+    indexes = {r[0] for r in _rows(db, "SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"idx_custom", "idx_flights_date", "idx_flights_origin"} <= indexes
+
+
+def test_ingest_into_partitions(tmp_path):
+    csv_path = _write(tmp_path / "flights.csv", KAGGLE_CSV)
+    partition_dir = tmp_path / "partitions"
+
+    ingest_csv([csv_path], partition_dir=str(partition_dir))
+
+    assert sorted(os.listdir(partition_dir)) == ["flights_2015_01.sqlite3", "flights_2015_02.sqlite3"]
+    data = FlightData(partition_dir=str(partition_dir))
+    assert data.get_flight_by_id(4)[0]["month"] == 2
+    assert sum(r["total_flights"] for r in data.get_total_flights_by_airline()) == 4
+
+
+def test_ingest_missing_columns(tmp_path):
+    csv_path = _write(tmp_path / "flights.csv", "YEAR,MONTH\n2015,1\n")
+
+    with pytest.raises(IngestError):
+        ingest_csv([csv_path], database=str(tmp_path / "flights.sqlite3"))
+
+
+def test_failed_ingest_keeps_no_rows(tmp_path):
+    good = _write(tmp_path / "good.csv", KAGGLE_CSV)
+    bad = _write(tmp_path / "bad.csv", "YEAR,MONTH\n2015,1\n")
+    db = str(tmp_path / "flights.sqlite3")
+    ingest_csv([good], database=db)
+
+    with pytest.raises(IngestError):
+        ingest_csv([good, bad], database=db, batch_size=1)
+
+    assert _rows(db, "SELECT COUNT(*) FROM flights") == [(4,)]
+    indexes = {r[0] for r in _rows(db, "SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert "idx_flights_date" in indexes
+
+    partition_dir = tmp_path / "partitions"
+    with pytest.raises(IngestError):
+        ingest_csv([good, bad], partition_dir=str(partition_dir))
+    assert os.listdir(partition_dir) == []
+
+
+def test_crash_mid_load_leaves_an_existing_database_intact(tmp_path):
+    good = _write(tmp_path / "good.csv", KAGGLE_CSV)
+    db = str(tmp_path / "flights.sqlite3")
+    ingest_csv([good], database=db)
+
+    # Killed after the first batch, with the indexes dropped and rows written
+    script = ("import os, sys; sys.path.insert(0, sys.argv[1]); from ingest import ingest_csv; "
+              "ingest_csv([sys.argv[2]], database=sys.argv[3], batch_size=1, progress=lambda stats: os._exit(1))")
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    assert subprocess.run([sys.executable, "-c", script, root, good, db]).returncode == 1
+
+    assert _rows(db, "PRAGMA integrity_check") == [("ok",)]
+    assert _rows(db, "SELECT COUNT(*) FROM flights") == [(4,)]
+    indexes = {r[0] for r in _rows(db, "SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"idx_flights_date", "idx_flights_origin"} <= indexes
+
+
+def test_partitions_with_different_columns(tmp_path):
+    csv_path = _write(tmp_path / "flights.csv", KAGGLE_CSV)
+    partition_dir = tmp_path / "partitions"
+    partition_dir.mkdir()
+    # An older partition without the tail number and distance columns
+    conn = sqlite3.connect(partition_dir / "flights_2015_02.sqlite3")
+    conn.execute("CREATE TABLE flights (ID INTEGER PRIMARY KEY, YEAR INTEGER, MONTH INTEGER, DAY INTEGER, "
+                 "AIRLINE TEXT, ORIGIN_AIRPORT TEXT, DESTINATION_AIRPORT TEXT, DEPARTURE_DELAY INTEGER)")
+    conn.close()
+
+    ingest_csv([csv_path], partition_dir=str(partition_dir))
+
+    assert _rows(str(partition_dir / "flights_2015_01.sqlite3"),
+                 "SELECT TAIL_NUMBER, DISTANCE FROM flights ORDER BY ID") == [
+        ("N407AS", 1448), ("N3KUAA", 2330), ("N3730B", 1589)]
+    assert _rows(str(partition_dir / "flights_2015_02.sqlite3"),
+                 "SELECT AIRLINE, ORIGIN_AIRPORT, DEPARTURE_DELAY FROM flights") == [("AA", "LAX", None)]
+
+
+def test_cli_ingest_reports_throughput(tmp_path, capsys):
+    csv_path = _write(tmp_path / "flights.csv", KAGGLE_CSV)
+
+    exit_code = cli.main(["--database", str(tmp_path / "flights.sqlite3"), "ingest", csv_path, "--quiet"])
+
+    assert exit_code == 0
+    assert "Loaded 4 rows" in capsys.readouterr().out
@@ -0,0 +1,88 @@
+import json
+import os
+import sys
+
+import pytest
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import api
+from data import FlightData
+from network import RouteGraph, hub_metrics
+
+ROUTES = [
+    {"origin": "ATL", "destination": "ORD", "total_flights": 10, "delayed_flights": 4},
+    {"origin": "ORD", "destination": "ATL", "total_flights": 8, "delayed_flights": 1},
+    {"origin": "ATL", "destination": "LAX", "total_flights": 5, "delayed_flights": 3},
+    {"origin": "LAX", "destination": "ORD", "total_flights": 2, "delayed_flights": 0},
+    {"origin": "HNL", "destination": "OGG", "total_flights": 3, "delayed_flights": 1},
+]
+
+
+def _reference_pagerank(routes, damping=0.85, iterations=200):
+    """Plain-Python PageRank over the delayed flights, to check the vectorized one."""
+    codes = sorted({r["origin"] for r in routes} | {r["destination"] for r in routes})
+    out = {code: 0 for code in codes}
+    for r in routes:
+        out[r["origin"]] += r["delayed_flights"]
+    rank = dict.fromkeys(codes, 1 / len(codes))
+    for _ in range(iterations):
+        dangling = sum(rank[code] for code in codes if not out[code])
+        updated = {code: (1 - damping) / len(codes) + damping * dangling / len(codes) for code in codes}
+        for r in routes:
+            if out[r["origin"]]:
+                updated[r["destination"]] += damping * rank[r["origin"]] * r["delayed_flights"] / out[r["origin"]]
+        rank = updated
+    return rank
+
+
+def test_graph_is_stored_as_csr():
+    graph = RouteGraph.from_routes(ROUTES)
+
+    assert graph.codes == ["ATL", "HNL", "LAX", "OGG", "ORD"]
+    assert graph.indptr.tolist() == [0, 2, 3, 4, 4, 5]
+    assert graph.neighbors("ATL") == ["LAX", "ORD"]
+    assert graph.neighbors("OGG") == [] and graph.neighbors("JFK") == []
+    assert graph.flights.tolist() == [5, 10, 3, 2, 8]
+
+
+def test_hub_metrics():
+    network = hub_metrics(RouteGraph.from_routes(ROUTES))
+    airports = {row["airport"]: row for row in network["airports"]}
+
+    assert airports["ATL"]["flights_out"] == 15
+    assert airports["ATL"]["weighted_degree"] == 23
+    assert airports["ORD"]["routes_in"] == 2
+    assert airports["ORD"]["delayed_in"] == 4
+
+    reference = _reference_pagerank(ROUTES)
+    for code, row in airports.items():
+        assert row["delay_rank"] == pytest.approx(reference[code], abs=1e-6)
+    assert [row["airport"] for row in network["airports"]] == sorted(reference, key=lambda code: -reference[code])
+
+    assert network["components"] == [
+        {"component": 0, "airports": 3, "flights": 25},
+        {"component": 1, "airports": 2, "flights": 3},
+    ]
+    assert airports["HNL"]["component"] == airports["OGG"]["component"] == 1
+    assert hub_metrics(RouteGraph.from_routes([]))["airports"] == []
+
+
+def test_network_endpoint(make_database, monkeypatch):
+    path = make_database([
+        (2015, 1, 1, "DL", "ATL", "ORD", "0815", 30),
+        (2015, 1, 1, "DL", "ORD", "ATL", "0815", 0),
+        (2015, 2, 1, "DL", "ATL", "LAX", "0815", 45),
+    ])
+    data = FlightData(f"sqlite:///{path}")
+    monkeypatch.setattr(api, "flight_data", data)
+    client = api.app.test_client()
+
+    body = json.loads(client.get("/api/stats/network").data)["data"]
+    assert (body["airport_count"], body["route_count"]) == (3, 3)
+    assert [row["airport"] for row in body["airports"]] == ["LAX", "ORD", "ATL"]
+
+    body = json.loads(client.get("/api/stats/network?month=2").data)["data"]
+    assert [row["airport"] for row in body["airports"]] == ["LAX", "ATL"]
+    assert client.get("/api/stats/network?month=13").status_code == 400
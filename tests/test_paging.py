@@ -0,0 +1,106 @@
+import json
+import os
+import sys
+import tracemalloc
+
+import pytest
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import api
+from data import FlightData
+from memory import MemoryTracker
+from metrics import Counters
+from paging import InvalidCursor, decode_cursor, encode_cursor, read_page
+from warmup import DerivedIndex
+
+
+@pytest.fixture
+def flight_data(make_database, monkeypatch):
+    path = make_database(
+        [(2015, 1, 1, "DL" if i % 3 else "UA", "ATL", "LAX", 20 + i) for i in range(25)],
+        columns=("YEAR", "MONTH", "DAY", "AIRLINE", "ORIGIN_AIRPORT", "DESTINATION_AIRPORT", "DEPARTURE_DELAY"),
+    )
+    data = FlightData(f"sqlite:///{path}")
+    monkeypatch.setattr(api, "flight_data", data)
+    monkeypatch.setattr(api, "cost_classes", DerivedIndex(data, api.plan_routes))
+    return data
+
+
+def test_read_page_stops_at_the_budget():
+    rows = [{"n": i} for i in range(10)]
+
+    assert read_page(rows, max_rows=4) == (rows[:4], 4)
+    assert read_page(rows, 8, max_rows=4) == (rows[8:], None)
+    # Each row is 9 bytes of JSON plus a separator
+    assert read_page(rows, 2, max_bytes=25) == (rows[2:4], 4)
+    assert read_page(rows, max_bytes=1) == (rows[:1], 1)
+
+    stream = (row for row in rows)
+    read_page(stream, max_rows=2)
+    assert stream.gi_frame is None  # closed
+
+
+def test_cursor_is_tied_to_the_data():
+    cursor = encode_cursor(40, ("flights.sqlite3", 1024))
+
+    assert decode_cursor(cursor, ("flights.sqlite3", 1024)) == 40
+    with pytest.raises(InvalidCursor, match="changed"):
+        decode_cursor(cursor, ("flights.sqlite3", 2048))
+    with pytest.raises(InvalidCursor):
+        decode_cursor("not a cursor", ())
+
+
+def test_list_endpoint_pages_within_budget(flight_data, monkeypatch):
+    monkeypatch.setattr(api, "MAX_ROWS", 10)
+    client = api.app.test_client()
+
+    pages = []
+    url = "/api/flights/delayed"
+    while url:
+        body = json.loads(client.get(url).data)
+        pages.append(body["data"])
+        url = f"/api/flights/delayed?cursor={body['next_cursor']}" if body.get("truncated") else None
+
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert [row for page in pages for row in page] == flight_data.get_delayed_flights()
+    assert flight_data.metrics.get("responses_truncated") == 2
+
+    response = client.get("/api/flights/delayed/airline/Delta Air Lines Inc.")
+    assert len(json.loads(response.data)["data"]) == 10
+    assert client.get("/api/flights/delayed?cursor=bogus").status_code == 400
+
+
+def test_unlimited_responses_are_not_paged(flight_data):
+    body = json.loads(api.app.test_client().get("/api/flights/delayed").data)
+
+    assert len(body["data"]) == 25
+    assert "truncated" not in body
+
+
+def test_tracemalloc_reports_request_peak(flight_data, monkeypatch):
+    tracker = MemoryTracker("tracemalloc", metrics=flight_data.metrics)
+    monkeypatch.setattr(api, "memory_tracker", tracker)
+
+    try:
+        response = api.app.test_client().get("/api/flights/delayed")
+    finally:
+        tracemalloc.stop()
+
+    assert int(response.headers["X-Memory-Peak"]) > 0
+    metrics = flight_data.get_metrics()
+    assert metrics["memory_tracked_requests"] == 1
+    assert metrics["memory_peak_max_bytes"] == int(response.headers["X-Memory-Peak"])
+
+
+def test_memory_tracker_modes():
+    counters = Counters()
+    tracker = MemoryTracker("rss", metrics=counters)
+    token = tracker.begin()
+    assert tracker.end(token) >= 0
+    assert counters.get("memory_tracked_requests") == 1
+
+    assert MemoryTracker().end(MemoryTracker().begin()) is None
+    with pytest.raises(ValueError):
+        MemoryTracker("psutil")
@@ -0,0 +1,123 @@
+import os
+import sys
+from datetime import date
+
+import pytest
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from data import FlightData
+from partitions import (
+    discover_partitions,
+    merge_counts,
+    partition_path,
+    prune_partitions,
+    prune_partitions_between,
+)
+
+SCHEMA = """
+CREATE TABLE airlines (ID TEXT PRIMARY KEY, AIRLINE TEXT);
+CREATE TABLE flights (
+    ID INTEGER PRIMARY KEY, YEAR INTEGER, MONTH INTEGER, DAY INTEGER, AIRLINE TEXT,
+    FLIGHT_NUMBER INTEGER, ORIGIN_AIRPORT TEXT, DESTINATION_AIRPORT TEXT,
+    DEPARTURE_TIME TEXT, DEPARTURE_DELAY REAL
+);
+"""
+
+# (id, year, month, day, airline, origin, destination, departure time, delay)
+FLIGHTS = [
+    (1, 2015, 1, 1, "DL", "ATL", "LAX", "0815", 5),
+    (2, 2015, 1, 1, "UA", "ORD", "SFO", "0930", 45),
+    (3, 2015, 1, 2, "DL", "ATL", "LAX", "0820", 25),
+    (4, 2015, 2, 1, "DL", "ATL", "LAX", "1705", 60),
+    (5, 2015, 2, 3, "UA", "ORD", "SFO", "0940", 0),
+    (6, 2016, 1, 1, "UA", "ATL", "LAX", "0805", 30),
+]
+
+
+COLUMNS = ("ID", "YEAR", "MONTH", "DAY", "AIRLINE", "ORIGIN_AIRPORT", "DESTINATION_AIRPORT", "DEPARTURE_TIME",
+           "DEPARTURE_DELAY")
+
+
+@pytest.fixture
+def single(make_database):
+    return FlightData(f"sqlite:///{make_database(FLIGHTS, columns=COLUMNS, schema=SCHEMA)}")
+
+
+@pytest.fixture
+def partitioned(make_database, tmp_path):
+    directory = tmp_path / "partitions"
+    directory.mkdir()
+    for year, month in {(f[1], f[2]) for f in FLIGHTS}:
+        make_database([f for f in FLIGHTS if (f[1], f[2]) == (year, month)],
+                      path=partition_path(directory, year, month), columns=COLUMNS, schema=SCHEMA)
+    return FlightData(partition_dir=str(directory))
+
+
+def test_discover_and_prune(tmp_path):
+    for name in ("flights_2015_01.sqlite3", "flights_2015_02.sqlite3", "flights_2016.sqlite3", "notes.txt"):
+        (tmp_path / name).touch()
+
+    partitions = discover_partitions(tmp_path)
+
+    assert [(p[0], p[1]) for p in partitions] == [(2015, 1), (2015, 2), (2016, None)]
+    assert [(p[0], p[1]) for p in prune_partitions(partitions, year=2015, month=2)] == [(2015, 2)]
+    assert [(p[0], p[1]) for p in prune_partitions(partitions, month=1)] == [(2015, 1), (2016, None)]
+    between = prune_partitions_between(partitions, date(2015, 2, 10), date(2016, 1, 5))
+    assert [(p[0], p[1]) for p in between] == [(2015, 2), (2016, None)]
+
+
+def test_merge_counts_sums_groups():
+    merge = merge_counts("total_flights", sort_key="hour")
+
+    rows = merge([[{"hour": 9, "total_flights": 2}, {"hour": None, "total_flights": 1}],
+                  [{"hour": 8, "total_flights": 1}, {"hour": 9, "total_flights": 3}]])
+
+    assert rows == [{"hour": None, "total_flights": 1}, {"hour": 8, "total_flights": 1},
+                    {"hour": 9, "total_flights": 5}]
+
+
+def test_partitioned_matches_single_database(single, partitioned):
+    """Fan-out over partitions returns the same answers as one database"""
+    def normalized(rows):
+        return sorted(rows, key=repr)
+
+    for method in ("get_total_flights_by_airline", "get_delayed_flights_by_hour",
+                   "get_total_flights_by_hour", "get_delayed_flights_by_route",
+                   "get_total_flights_by_route"):
+        assert normalized(getattr(partitioned, method)()) == normalized(getattr(single, method)()), method
+
+    assert partitioned.get_delayed_flights() == single.get_delayed_flights()
+    assert partitioned.get_flight_by_id(4) == single.get_flight_by_id(4)
+    assert partitioned.get_top_delayed_flights_by_date(1, 1, 2015) == single.get_top_delayed_flights_by_date(1, 1, 2015)
+
+
+def test_date_filter_scopes_stats(single, partitioned):
+    for data in (single, partitioned):
+        rows = data.get_total_flights_by_route(year=2015, month=1)
+        assert sorted((r["origin_airport"], r["total_flights"]) for r in rows) == [("ATL", 2), ("ORD", 1)]
+
+        delayed = data.get_delayed_flights(year=2015)
+        assert [r["id"] for r in delayed] == [4, 3, 2]
+
+
+def test_date_filter_prunes_partitions(partitioned):
+    """A single-month query only touches that month's partition"""
+    touched = []
+    original = partitioned._execute_query
+
+    def spy(query, params=None, engine=None, deadline=None):
+        touched.append(engine)
+        return original(query, params, engine, deadline)
+
+    partitioned._execute_query = spy
+    partitioned.get_total_flights_by_hour(year=2015, month=2)
+
+    february = [p[3] for p in partitioned.partitions if (p[0], p[1]) == (2015, 2)]
+    assert touched == february
+
+
+def test_requires_exactly_one_source():
+    with pytest.raises(ValueError):
+        FlightData()
@@ -0,0 +1,134 @@
+import json
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from data import FlightData
+from resultcache import ResultCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(tmp_path / "results.cache")
+
+
+def test_round_trip(cache):
+    rows = [{"airline": "DL", "total_flights": 3}, {"airline": "UA", "total_flights": None}]
+    assert cache.get("key", "v1") is None
+
+    assert cache.put("key", "v1", rows)
+    assert cache.get("key", "v1") == rows
+    assert cache.stats()["entries"] == 1
+
+
+def test_stale_fingerprint_is_a_miss_and_dropped(cache):
+    cache.put("key", "v1", [{"n": 1}])
+
+    assert cache.get("key", "v2") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(tmp_path / "results.cache", max_bytes=4000, touch_interval=0)
+    # Incompressible, so each entry is close to 1000 bytes
+    payload = [{"blob": os.urandom(700).hex()}]
+    for key in ("a", "b", "c"):
+        cache.put(key, "v1", payload)
+    cache.get("a", "v1")
+
+    cache.put("d", "v1", payload)
+    cache.put("e", "v1", payload)
+
+    assert cache.get("a", "v1") == payload
+    assert cache.get("b", "v1") is None
+    assert cache.stats()["bytes"] <= 4000
+
+
+def test_skips_oversized_and_non_json_results(tmp_path):
+    cache = ResultCache(tmp_path / "results.cache", max_bytes=1000)
+
+    assert not cache.put("big", "v1", [{"blob": os.urandom(1000).hex()}])
+    assert not cache.put("tuple-key", "v1", {("a", "b"): 1})
+    assert cache.stats()["entries"] == 0
+
+
+def test_hits_record_their_use_once_per_interval(cache, monkeypatch):
+    cache.put("key", "v1", [{"n": 1}])
+    conn = sqlite3.connect(cache.path)
+    stored = conn.execute("SELECT LAST_USED FROM results").fetchone()[0]
+
+    assert cache.get("key", "v1") == [{"n": 1}]
+    assert conn.execute("SELECT LAST_USED FROM results").fetchone()[0] == stored
+
+    monkeypatch.setattr("resultcache.time.time", lambda: stored + cache.touch_interval)
+    assert cache.get("key", "v1") == [{"n": 1}]
+    assert conn.execute("SELECT LAST_USED FROM results").fetchone()[0] == stored + cache.touch_interval
+    conn.close()
+
+
+def test_large_results_are_rejected_before_serializing(tmp_path, monkeypatch):
+    cache = ResultCache(tmp_path / "results.cache", max_bytes=100_000)
+    rows = [{"airline": "DL", "origin": "ATL", "delay": i} for i in range(20_000)]
+    dumped = []
+    dumps = json.dumps
+    monkeypatch.setattr("resultcache.json.dumps", lambda value, **kwargs: dumped.append(len(value)) or dumps(value))
+
+    assert not cache.put("big", "v1", rows)
+    # Only the sample was serialized
+    assert dumped == [100]
+    assert cache.put("small", "v1", rows[:100])
+
+
+def test_unusable_path_is_a_miss(tmp_path):
+    cache = ResultCache(tmp_path / "missing" / "results.cache")
+
+    assert not cache.put("key", "v1", [{"n": 1}])
+    assert cache.get("key", "v1") is None
+
+
+@pytest.fixture
+def write_delays(make_database):
+    def write(delays):
+        return make_database(
+            [(2015, 1, 1, "DL", "ATL", "LAX", delay) for delay in delays],
+            columns=("YEAR", "MONTH", "DAY", "AIRLINE", "ORIGIN_AIRPORT", "DESTINATION_AIRPORT", "DEPARTURE_DELAY"),
+            airlines=[("DL", "Delta Air Lines Inc.")],
+        )
+    return write
+
+
+def test_flight_data_reuses_results_across_instances(write_delays):
+    path = write_delays([5, 30, 45])
+
+    first = FlightData(f"sqlite:///{path}")
+    assert first.enable_result_cache().path == f"{path}.cache"
+    expected = first.get_delayed_flights_by_route()
+    assert expected == [{"origin_airport": "ATL", "destination_airport": "LAX", "delayed_flights": 2}]
+
+    second = FlightData(f"sqlite:///{path}")
+    second.enable_result_cache()
+    assert second.get_delayed_flights_by_route() == expected
+    assert second.metrics.get("result_cache_hits") == 1
+    assert second.metrics.get("queries_executed") == 1
+
+    # Written to after the results were cached
+    write_delays([90])
+    assert second.get_delayed_flights_by_route()[0]["delayed_flights"] == 3
+    assert second.metrics.get("result_cache_misses") == 1
+
+
+def test_lookups_are_not_cached(write_delays):
+    path = write_delays([5])
+    flight_data = FlightData(f"sqlite:///{path}")
+    flight_data.enable_result_cache()
+
+    flight_data.get_flight_by_id(1)
+    flight_data.get_delayed_flights()
+
+    assert flight_data.result_cache.stats()["entries"] == 0
+    assert flight_data.metrics.get("result_cache_misses") == 0
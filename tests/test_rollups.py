@@ -0,0 +1,61 @@
+import os
+import sys
+from datetime import date
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from data import FlightData
+from rollups import build_timeseries
+
+
+COLUMNS = ("YEAR", "MONTH", "DAY", "AIRLINE", "DEPARTURE_DELAY")
+
+
+def test_daily_stats_refresh_is_incremental(make_database):
+    path = make_database([(2015, 1, 1, "DL", 30), (2015, 1, 1, "DL", 0), (2015, 1, 2, "UA", None)], columns=COLUMNS)
+    data = FlightData(f"sqlite:///{path}")
+
+    assert data.refresh_rollups()["daily_stats"] == 3
+    make_database([(2015, 1, 1, "DL", 25), (2015, 2, 1, "DL", 5)], columns=COLUMNS)
+    assert data.refresh_rollups()["daily_stats"] == 2
+    assert data.refresh_rollups()["daily_stats"] == 0
+
+    rows = data.get_daily_stats(date(2015, 1, 1), date(2015, 1, 31))
+    assert sorted((r["day"], r["airline"], r["total_flights"], r["delayed_flights"]) for r in rows) == [
+        (1, "DL", 3, 2), (2, "UA", 1, 0)]
+
+
+def test_build_timeseries_weekly_by_airline():
+    daily = [
+        {"year": 2015, "month": 1, "day": 5, "airline": "DL", "total_flights": 4, "delayed_flights": 1},
+        {"year": 2015, "month": 1, "day": 11, "airline": "DL", "total_flights": 4, "delayed_flights": 3},
+        {"year": 2015, "month": 1, "day": 13, "airline": "AA", "total_flights": 2, "delayed_flights": 0},
+    ]
+
+    series = build_timeseries(daily, date(2015, 1, 1), date(2015, 1, 14), "week", "airline",
+                              {"AA": "American", "DL": "Delta"})
+
+    assert [(p["airline"], p["period"], p["total_flights"]) for p in series] == [
+        ("American", "2014-12-29", 0), ("American", "2015-01-05", 0), ("American", "2015-01-12", 2),
+        ("Delta", "2014-12-29", 0), ("Delta", "2015-01-05", 8), ("Delta", "2015-01-12", 0)]
+    assert series[4]["percentage_delayed"] == 50.0
+
+
+def test_stale_daily_stats_are_read_from_flights(make_database, capsys):
+    path = make_database([(2015, 1, 1, "DL", 30), (2015, 1, 1, "DL", 0), (2015, 1, 2, "UA", None)], columns=COLUMNS)
+    data = FlightData(f"sqlite:///{path}")
+    data.refresh_rollups()
+    # Flights added without a refresh, e.g. a database dropped in
+    make_database([(2015, 1, 1, "DL", 25), (2015, 1, 3, "UA", 40)], columns=COLUMNS)
+
+    assert data.stale_rollups() == {"daily_stats", "delay_sketches"}
+    assert "Rollups behind the flights table (daily_stats, delay_sketches)" in capsys.readouterr().out
+    live = data.get_daily_stats(date(2015, 1, 1), date(2015, 1, 31))
+    assert sorted((r["day"], r["airline"], r["total_flights"], r["delayed_flights"]) for r in live) == [
+        (1, "DL", 3, 2), (2, "UA", 1, 0), (3, "UA", 1, 1)]
+
+    data.refresh_rollups()
+    assert data.stale_rollups() == frozenset()
+    rolled_up = data.get_daily_stats(date(2015, 1, 1), date(2015, 1, 31))
+    assert sorted(rolled_up, key=repr) == sorted(live, key=repr)
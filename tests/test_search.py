@@ -0,0 +1,58 @@
+import os
+import sys
+import timeit
+
+import pytest
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from data import FlightData
+from search import PrefixIndex, PrefixSearch
+
+ENTRIES = [
+    {"type": "airline", "code": "AS", "name": "Alaska Airlines Inc."},
+    {"type": "airline", "code": "AA", "name": "American Airlines Inc."},
+    {"type": "airline", "code": "DL", "name": "Delta Air Lines Inc."},
+    {"type": "airport", "code": "ATL"},
+    {"type": "airport", "code": "AUS"},
+]
+
+
+def test_prefix_search_is_case_insensitive_and_ranked():
+    index = PrefixIndex(ENTRIES)
+
+    assert [e["code"] for e in index.search("a")] == ["AS", "AA", "ATL", "AUS", "DL"]
+    assert [e["code"] for e in index.search("AT")] == ["ATL"]
+    assert [e["code"] for e in index.search("delta")] == ["DL"]
+    # Later words of a name match too, after names starting with the prefix
+    assert [e["code"] for e in index.search("air", limit=2)] == ["AS", "AA"]
+    assert index.search("zzz") == [] and index.search("  ") == []
+
+
+def test_lookup_is_fast_on_large_index():
+    entries = [{"type": "airport", "code": f"{i:06d}"} for i in range(100_000)]
+    index = PrefixIndex(entries)
+
+    seconds = min(timeit.repeat(lambda: index.search("04217"), number=100, repeat=3)) / 100
+    assert seconds < 0.001
+
+
+COLUMNS = ("YEAR", "MONTH", "DAY", "AIRLINE", "ORIGIN_AIRPORT", "DESTINATION_AIRPORT")
+
+
+@pytest.fixture
+def db_path(make_database):
+    return make_database([(2015, 1, 1, "DL", "ATL", "LAX")], columns=COLUMNS, airlines=[("DL", "Delta Air Lines Inc.")])
+
+
+def test_index_is_rebuilt_when_database_changes(db_path, make_database):
+    search = PrefixSearch(FlightData(f"sqlite:///{db_path}"))
+
+    assert [e["code"] for e in search.get().search("l") if e["type"] == "airport"] == ["LAX"]
+    first = search.get()
+    assert search.get() is first
+
+    make_database([(2015, 1, 1, "DL", "LGA", "ATL")], columns=COLUMNS)
+
+    assert [e["code"] for e in search.get().search("l") if e["type"] == "airport"] == ["LAX", "LGA"]
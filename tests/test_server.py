@@ -0,0 +1,44 @@
+import os
+import runpy
+import sys
+from unittest.mock import patch
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import api
+
+CONFIG_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'gunicorn.conf.py'))
+
+
+def test_config_preloads_app_and_sizes_workers_to_cores():
+    """Workers default to one per core and the app is loaded before forking"""
+    with patch.dict(os.environ, {}, clear=False):
+        os.environ.pop("SKYSQL_WORKERS", None)
+        config = runpy.run_path(CONFIG_PATH)
+
+    assert config["preload_app"] is True
+    assert config["workers"] == os.cpu_count()
+    # Threads let light requests through while heavy ones are throttled
+    assert config["worker_class"] == "gthread"
+    assert config["threads"] > 1
+
+
+def test_config_workers_override():
+    """SKYSQL_WORKERS overrides the worker count"""
+    with patch.dict(os.environ, {"SKYSQL_WORKERS": "3"}):
+        config = runpy.run_path(CONFIG_PATH)
+
+    assert config["workers"] == 3
+
+
+def test_post_fork_disposes_inherited_engine():
+    """Each worker drops the pooled connections inherited from the master and starts its warm-up"""
+    config = runpy.run_path(CONFIG_PATH)
+
+    with patch.object(api.flight_data, "dispose_after_fork") as dispose, \
+            patch.object(api, "start_background_tasks") as start:
+        config["post_fork"](server=None, worker=None)
+
+    dispose.assert_called_once_with()
+    start.assert_called_once_with()
@@ -0,0 +1,101 @@
+import bisect
+import os
+import random
+import sys
+
+import pytest
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from data import FlightData
+from sketches import DIMENSIONS, KLLSketch, quantile_label
+
+
+def _rank_error(data, value, q):
+    return abs(bisect.bisect_left(data, value) / len(data) - q)
+
+
+def test_kll_quantiles_are_accurate():
+    rng = random.Random(7)
+    data = [rng.expovariate(1 / 15) - 5 for _ in range(50_000)]
+    sketch = KLLSketch(seed=1)
+    for value in data:
+        sketch.update(value)
+
+    data.sort()
+    for q, value in zip((0.5, 0.9, 0.99), sketch.quantiles((0.5, 0.9, 0.99))):
+        assert _rank_error(data, value, q) < 0.02
+    # Bounded memory: a few hundred values summarize 50k
+    assert sum(len(level) for level in sketch.levels) < 1000
+
+
+def test_kll_merge_and_serialization():
+    rng = random.Random(8)
+    data = [rng.randint(-10, 300) for _ in range(40_000)]
+    parts = [KLLSketch(seed=i) for i in range(4)]
+    for i, value in enumerate(data):
+        parts[i % 4].update(value)
+
+    merged = KLLSketch.from_bytes(parts[0].to_bytes())
+    for part in parts[1:]:
+        merged.merge(KLLSketch.from_bytes(part.to_bytes()))
+
+    assert merged.n == len(data)
+    assert sum(len(level) << h for h, level in enumerate(merged.levels)) == len(data)
+    data.sort()
+    for q, value in zip((0.5, 0.9), merged.quantiles((0.5, 0.9))):
+        assert _rank_error(data, value, q) < 0.02
+
+
+def test_quantile_label():
+    assert quantile_label(0.5) == "p50"
+    assert quantile_label(0.999) == "p99.9"
+
+
+@pytest.fixture
+def db_path(make_database):
+    return make_database([(2015, 1, 1, "DL", "ATL", "LAX", "0815", d) for d in range(1, 101)] +
+                         [(2015, 1, 1, "UA", "ORD", "LAX", "1730", None)])
+
+
+def test_refresh_is_incremental(db_path, make_database):
+    data = FlightData(f"sqlite:///{db_path}")
+
+    # Never refreshed: sketched from the flights table meanwhile
+    live = data.get_delay_percentiles("airlines")
+    assert [(r["airline"], r["flights"]) for r in live] == [("Delta Air Lines Inc.", 100)]
+    assert data.stale_rollups() == {"daily_stats", "delay_sketches"}
+    assert data.refresh_delay_sketches() == 100
+    assert data.get_delay_percentiles("airlines") == live
+    assert data.refresh_delay_sketches() == 0
+
+    make_database([(2015, 1, 2, "UA", "ORD", "LAX", "1730", 45)])
+    assert data.refresh_delay_sketches() == 1
+
+    rows = data.get_delay_percentiles("airlines", quantiles=(0.5, 1.0))
+    assert sorted((r["airline"], r["flights"], r["p50"], r["p100"]) for r in rows) == [
+        ("Delta Air Lines Inc.", 100, 50, 100), ("United Air Lines Inc.", 1, 45, 45)]
+
+
+def test_percentiles_per_dimension_and_combined(db_path):
+    data = FlightData(f"sqlite:///{db_path}")
+    data.refresh_delay_sketches()
+
+    assert data.get_delay_percentiles("hours", (0.5,)) == [{"hour": 8, "flights": 100, "p50": 50}]
+    assert data.get_delay_percentiles("routes", (0.9,), key="ATL-LAX") == [
+        {"origin": "ATL", "destination": "LAX", "flights": 100, "p90": 90}]
+    assert data.get_delay_percentiles("airports", (0.5,), combine=True) == [{"flights": 100, "p50": 50}]
+
+
+def test_percentiles_before_a_refresh_match_the_stored_sketches(db_path):
+    data = FlightData(f"sqlite:///{db_path}")
+    live = {dimension: data.get_delay_percentiles(dimension) for dimension in DIMENSIONS}
+    live_key = data.get_delay_percentiles("routes", key="ATL-LAX")
+
+    data.refresh_delay_sketches()
+
+    assert data.stale_rollups() == {"daily_stats"}
+    assert {dimension: data.get_delay_percentiles(dimension) for dimension in DIMENSIONS} == live
+    assert data.get_delay_percentiles("routes", key="ATL-LAX") == live_key
+    assert [(r["origin"], r["flights"]) for r in live_key] == [("ATL", 100)]
@@ -0,0 +1,102 @@
+import os
+import sys
+from datetime import date
+
+import pytest
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from data import FlightData
+from snapshots import SnapshotWatcher
+from stats import STATS
+from warmup import Warmer
+
+
+@pytest.fixture
+def write_db(make_database):
+    def write(path, destinations):
+        return make_database([(2015, 1, 1, "DL", "ATL", destination, "0815", 30) for destination in destinations],
+                             path=path, airlines=[("DL", "Delta Air Lines Inc.")])
+    return write
+
+
+def _destinations(data):
+    return sorted(r["destination_airport"] for r in data.get_total_flights_by_route())
+
+
+@pytest.fixture
+def database(write_db):
+    return write_db("flights.sqlite3", ["LAX"])
+
+
+def test_replaced_file_is_served_only_once_swapped(database, write_db, tmp_path):
+    data = FlightData(f"sqlite:///{database}")
+    watcher = SnapshotWatcher(data, warm_files=False)
+    assert _destinations(data) == ["LAX"]
+    assert not watcher.check()
+
+    before = data.fingerprint()
+    write_db(tmp_path / "next.sqlite3", ["JFK", "SFO"])
+    os.replace(tmp_path / "next.sqlite3", database)
+
+    # Still the old file, and results computed for it stay valid
+    assert data.snapshot_replaced()
+    assert _destinations(data) == ["LAX"]
+    assert data.fingerprint() == before
+
+    assert watcher.check()
+    assert _destinations(data) == ["JFK", "SFO"]
+    assert data.fingerprint() != before
+    assert data.metrics.get("snapshot_swaps") == 1
+    assert not watcher.check()
+
+
+def test_pinned_queries_finish_on_the_old_snapshot(database, write_db, tmp_path):
+    current = tmp_path / "current.sqlite3"
+    os.symlink(database, current)
+    data = FlightData(f"sqlite:///{current}")
+    write_db(tmp_path / "v2.sqlite3", ["JFK"])
+
+    with data.pinned_snapshot():
+        os.symlink(tmp_path / "v2.sqlite3", tmp_path / "next")
+        os.replace(tmp_path / "next", current)
+        assert SnapshotWatcher(data, warm_files=False).check()
+        # New connections of the old snapshot still open the old version
+        assert _destinations(data) == ["LAX"]
+        assert data.database_files() == [str(current)]
+    assert _destinations(data) == ["JFK"]
+
+
+def test_swap_installs_aggregates_warmed_on_the_new_snapshot(database, write_db, tmp_path):
+    data = FlightData(f"sqlite:///{database}")
+    warmer = Warmer(data, {"routes": STATS["routes"]}, warm_files=False)
+    warmer.refresh()
+    assert [r["destination"] for r in warmer.get("routes")] == ["LAX"]
+    write_db(tmp_path / "next.sqlite3", ["ORD"])
+    os.replace(tmp_path / "next.sqlite3", database)
+
+    assert SnapshotWatcher(data, warmer, warm_files=False).check()
+    # Served from memory straight away, without another refresh
+    assert [r["destination"] for r in warmer.get("routes")] == ["ORD"]
+    assert not warmer.refresh()
+
+
+def test_swap_is_refused_without_a_single_database(database, tmp_path):
+    with pytest.raises(ValueError):
+        FlightData(partition_dir=str(tmp_path)).open_snapshot()
+    assert not FlightData("sqlite://").snapshot_replaced()
+
+
+def test_snapshot_published_without_rollups_is_served_from_flights(database, write_db, tmp_path, capsys):
+    data = FlightData(f"sqlite:///{database}")
+    data.refresh_rollups()
+    assert data.stale_rollups() == frozenset()
+    write_db(tmp_path / "next.sqlite3", ["ORD", "SFO"])
+    os.replace(tmp_path / "next.sqlite3", database)
+
+    assert SnapshotWatcher(data, warm_files=False).check()
+    assert "Rollups behind the flights table (daily_stats, delay_sketches)" in capsys.readouterr().out
+    assert data.stale_rollups() == {"daily_stats", "delay_sketches"}
+    assert [r["total_flights"] for r in data.get_daily_stats(date(2015, 1, 1), date(2015, 1, 1))] == [2]
+    assert data.get_delay_percentiles("airlines")[0]["flights"] == 2
@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Generous enough for a loaded CI machine; a regression that pulls the
+# plotting stack back in at import time costs well over a second.
+STARTUP_BUDGET_SECONDS = float(os.environ.get("SKYSQL_STARTUP_BUDGET", "1.5"))
+
+HEAVY_MODULES = ("matplotlib", "seaborn", "folium", "pandas")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def _import_in_fresh_interpreter(module):
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", ["main", "api", "cli"])
+def test_entry_point_does_not_import_visualization_stack(module):
+    """Plotting libraries are only loaded when a visualization is requested"""
+    loaded = _import_in_fresh_interpreter(module)["modules"]
+
+    assert "visualization" not in loaded
+    assert not [m for m in loaded if m.split(".")[0] in HEAVY_MODULES]
+
+
+@pytest.mark.parametrize("module", ["main", "api"])
+def test_entry_point_startup_budget(module):
+    """Importing the CLI or the API stays within the startup-time budget"""
+    seconds = _import_in_fresh_interpreter(module)["seconds"]
+
+    assert seconds < STARTUP_BUDGET_SECONDS, f"import {module} took {seconds:.2f}s"
@@ -0,0 +1,94 @@
+import gzip
+import json
+import os
+import sys
+
+import pytest
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import api
+from data import FlightData
+from staticexport import export_static, stats_urls, url_to_path
+
+
+@pytest.fixture
+def flight_data(make_database, monkeypatch):
+    path = make_database([
+        (2015, 1, 1, "DL", "ATL", "LAX", "0815", 5),
+        (2015, 1, 2, "UA", "ORD", "SFO", "0930", 45),
+        (2015, 2, 1, "DL", "ATL", "LAX", "1705", 60),
+    ])
+    data = FlightData(f"sqlite:///{path}")
+    data.refresh_rollups()
+    monkeypatch.setattr(api, "flight_data", data)
+    return data
+
+
+def test_url_to_path():
+    assert url_to_path("/api/stats/routes") == os.path.join("api", "stats", "routes", "index.json")
+    assert url_to_path("/api/stats/routes?year=2015&month=1") == os.path.join(
+        "api", "stats", "routes", "year=2015&month=1.json")
+
+
+def test_stats_urls_cover_periods_airlines_and_airports(flight_data):
+    urls = stats_urls(flight_data)
+
+    assert "/api/stats/routes" in urls
+    assert "/api/stats/hours?year=2015" in urls
+    assert "/api/stats/airlines?year=2015&month=2" in urls
+    assert "/api/stats/airlines/percentiles?key=UA" in urls
+    assert "/api/stats/airports/percentiles?key=SFO" in urls
+    assert "/api/stats/timeseries?from=2015-01-01&to=2015-12-31&granularity=week&group_by=airline" in urls
+    assert len(urls) == len(set(urls))
+
+
+def test_export_matches_api_responses(flight_data, tmp_path):
+    out_dir = tmp_path / "static"
+    urls = stats_urls(flight_data)
+
+    stats = export_static(api.app, urls, out_dir, workers=4)
+
+    assert stats.errors == []
+    assert stats.files == len(urls)
+    client = api.app.test_client()
+    for url in ("/api/stats/routes?year=2015&month=1", "/api/stats/airlines/percentiles?key=DL"):
+        path = out_dir / url_to_path(url)
+        assert path.read_bytes() == client.get(url).get_data()
+        assert gzip.decompress((out_dir / f"{url_to_path(url)}.gz").read_bytes()) == path.read_bytes()
+    routes = json.loads((out_dir / url_to_path("/api/stats/routes?year=2015&month=1")).read_text())
+    assert {row["origin"] for row in routes["data"]} == {"ATL", "ORD"}
+
+
+def test_failed_export_keeps_previous_tree(flight_data, tmp_path):
+    out_dir = tmp_path / "static"
+    export_static(api.app, ["/api/stats/routes"], out_dir)
+
+    stats = export_static(api.app, ["/api/stats/hours", "/api/stats/nonsense/percentiles"], out_dir)
+
+    assert len(stats.errors) == 1
+    assert (out_dir / url_to_path("/api/stats/routes")).exists()
+    assert not (out_dir / url_to_path("/api/stats/hours")).exists()
+    # No staging directory left behind, only the tree the link points to
+    assert [name for name in os.listdir(tmp_path) if name.startswith(".static")] == [os.readlink(out_dir)]
+
+
+def test_export_swaps_a_symlink(flight_data, tmp_path):
+    out_dir = tmp_path / "static"
+    # A plain directory from an older export is replaced by the link
+    (out_dir / "api").mkdir(parents=True)
+    (out_dir / "api" / "stale.json").write_text("{}")
+
+    export_static(api.app, ["/api/stats/routes"], out_dir)
+    first = os.readlink(out_dir)
+    assert not (out_dir / "api" / "stale.json").exists()
+    assert (out_dir / url_to_path("/api/stats/routes")).exists()
+
+    export_static(api.app, ["/api/stats/hours"], out_dir)
+
+    assert out_dir.is_symlink() and os.readlink(out_dir) != first
+    assert (out_dir / url_to_path("/api/stats/hours")).exists()
+    assert not (out_dir / url_to_path("/api/stats/routes")).exists()
+    # The previous tree is removed
+    assert sorted(os.listdir(tmp_path)) == sorted(["flights.sqlite3", "static", os.readlink(out_dir)])
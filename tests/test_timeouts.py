@@ -0,0 +1,79 @@
+import os
+import sqlite3
+import sys
+import time
+
+import pytest
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from data import FlightData, QueryTimeoutError, query_deadline
+
+# Never finishes on its own
+RUNAWAY_QUERY = """
+WITH RECURSIVE counter(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM counter)
+SELECT COUNT(*) AS n FROM counter
+"""
+
+
+@pytest.fixture
+def db_uri(make_database):
+    return f"sqlite:///{make_database()}"
+
+
+def test_query_timeout_cancels_runaway_query(db_uri):
+    data = FlightData(db_uri, query_timeout=0.2)
+
+    start = time.monotonic()
+    with pytest.raises(QueryTimeoutError):
+        data._query(RUNAWAY_QUERY)
+
+    assert time.monotonic() - start < 2
+    metrics = data.get_metrics()
+    assert metrics["queries_timed_out"] == 1
+    assert metrics["recent_queries_timed_out"][0]["query"].startswith("WITH RECURSIVE counter")
+
+    # The pooled connection is usable again, without the deadline
+    assert data.get_total_flights_by_airline() == []
+
+
+def test_request_deadline_shortens_query_timeout(db_uri):
+    data = FlightData(db_uri, query_timeout=60)
+
+    start = time.monotonic()
+    with query_deadline(5), query_deadline(0.2):
+        with pytest.raises(QueryTimeoutError):
+            data._query(RUNAWAY_QUERY)
+
+    assert time.monotonic() - start < 2
+
+
+def test_no_deadline_by_default(db_uri):
+    data = FlightData(db_uri)
+
+    assert data._query("SELECT 1 AS one") == [{"one": 1}]
+    assert "queries_timed_out" not in data.get_metrics()
+
+
+def test_percentiles_past_the_deadline_are_a_504(db_uri, monkeypatch):
+    import api
+
+    conn = sqlite3.connect(db_uri[len("sqlite:///"):])
+    # Never refreshed, so the percentiles sketch every flight
+    conn.execute(
+        "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 200000) "
+        "INSERT INTO flights (AIRLINE, ORIGIN_AIRPORT, DESTINATION_AIRPORT, DEPARTURE_TIME, DEPARTURE_DELAY) "
+        "SELECT 'DL', 'ATL', 'LAX', '0815', x % 120 FROM n"
+    )
+    conn.commit()
+    conn.close()
+    data = FlightData(db_uri, query_timeout=0.05)
+    monkeypatch.setattr(api, "flight_data", data)
+
+    start = time.monotonic()
+    response = api.app.test_client().get("/api/stats/airlines/percentiles")
+
+    assert response.status_code == 504
+    assert time.monotonic() - start < 1
+    assert data.get_metrics()["queries_timed_out"] == 1
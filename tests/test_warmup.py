@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pytest
+
+# Add the parent directory to the path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from data import FlightData
+from stats import STATS
+from warmup import Warmer, warm_file
+
+
+@pytest.fixture
+def add_flight(make_database):
+    def add(delay):
+        return make_database([(2015, 1, 1, "DL", "ATL", "LAX", "0815", delay)])
+    return add
+
+
+@pytest.fixture
+def db_path(add_flight):
+    return add_flight(30)
+
+
+def test_warm_file_reads_whole_file(db_path):
+    assert warm_file(db_path) == os.path.getsize(db_path)
+    assert warm_file(db_path + ".missing") == 0
+
+
+def test_fingerprint_changes_on_write(db_path, add_flight):
+    data = FlightData(f"sqlite:///{db_path}")
+    before = data.fingerprint()
+
+    add_flight(5)
+
+    assert data.database_files() == [db_path]
+    assert data.fingerprint() != before
+    assert FlightData("sqlite://").fingerprint() == ()
+
+
+def test_warmer_precomputes_and_refreshes_on_change(db_path, add_flight):
+    data = FlightData(f"sqlite:///{db_path}")
+    warmer = Warmer(data, STATS, interval=3600)
+
+    assert warmer.get("routes") is None
+    warmer.start()
+    assert warmer.ready.wait(5)
+    warmer.stop()
+
+    assert warmer.get("routes")[0]["delayed_flights"] == 1
+    assert warmer.refresh() is False
+
+    add_flight(60)
+    # Stale results are never served
+    assert warmer.get("routes") is None
+    assert warmer.refresh() is True
+    assert warmer.get("routes")[0]["total_flights"] == 2
+    assert data.get_metrics()["aggregates_refreshed"] == 2
@@ -7,7 +7,7 @@ import warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
 
 def plot_delayed_flights_by_airline(data_manager):
-    data = data_manager.get_delayed_flights_by_airline()
+    data = data_manager.get_delayed_counts_by_airline()
     if not data:
         print("No delayed flight data for airlines.")
         return
@@ -30,7 +30,7 @@ def plot_delayed_flights_by_airline(data_manager):
     plt.show()
 
 def plot_percentage_delayed_flights_by_airline(data_manager):
-    delayed = data_manager.get_delayed_flights_by_airline()
+    delayed = data_manager.get_delayed_counts_by_airline()
     total = data_manager.get_total_flights_by_airline()
 
     if not delayed or not total:
@@ -135,6 +135,20 @@ def plot_delays_heatmap_routes(data_manager):
     plt.tight_layout()
     plt.show()
 
+# Used for airports missing from the airports table (e.g. not loaded with ingest --airports)
+DEFAULT_AIRPORT_COORDS = {
+    "JFK": (40.6413, -73.7781), "LAX": (33.9416, -118.4085), "ORD": (41.9742, -87.9073),
+    "SFO": (37.6213, -122.3790), "ATL": (33.6407, -84.4277), "SJU": (18.4394, -66.0018),
+    "DFW": (32.8998, -97.0403), "DEN": (39.8561, -104.6737), "MIA": (25.7959, -80.2870)
+}
+
+
+def _airport_coords(data_manager):
+    coords = dict(DEFAULT_AIRPORT_COORDS)
+    coords.update({a["code"]: (a["latitude"], a["longitude"]) for a in data_manager.get_airports()})
+    return coords
+
+
 def plot_delays_on_map(data_manager):
     delayed_routes = data_manager.get_delayed_flights_by_route()
 
@@ -146,11 +160,7 @@ def plot_delays_on_map(data_manager):
 
     m = folium.Map(location=[20, 0], zoom_start=2)
 
-    airport_coords = {
-        "JFK": (40.6413, -73.7781), "LAX": (33.9416, -118.4085), "ORD": (41.9742, -87.9073),
-        "SFO": (37.6213, -122.3790), "ATL": (33.6407, -84.4277), "SJU": (18.4394, -66.0018),
-        "DFW": (32.8998, -97.0403), "DEN": (39.8561, -104.6737), "MIA": (25.7959, -80.2870)
-    }
+    airport_coords = _airport_coords(data_manager)
 
     for _, row in df.iterrows():
         origin = row.get("origin_airport")
@@ -235,11 +245,7 @@ def plot_percentage_delayed_routes_on_map(data_manager):
     # Create a map
     m = folium.Map(location=[20, 0], zoom_start=2)
 
-    airport_coords = {
-        "JFK": (40.6413, -73.7781), "LAX": (33.9416, -118.4085), "ORD": (41.9742, -87.9073),
-        "SFO": (37.6213, -122.3790), "ATL": (33.6407, -84.4277), "SJU": (18.4394, -66.0018),
-        "DFW": (32.8998, -97.0403), "DEN": (39.8561, -104.6737), "MIA": (25.7959, -80.2870)
-    }
+    airport_coords = _airport_coords(data_manager)
 
     # Add routes to the map
     for route, percentage in route_percentages.items():
@@ -0,0 +1,138 @@
+"""Startup warm-up and background refresh of the hot stats aggregates.
+
+The airline, hour and route statistics each scan the whole flights table.
+A Warmer computes them on a background thread when a worker starts (after
+reading the database files once so their pages are in the OS cache) and
+recomputes them whenever the database fingerprint changes, so requests are
+answered from memory instead of paying for the scan.
+
+Cached results are only served while the fingerprint they were computed
+for still matches the files on disk; in between, requests fall back to
+live queries.
+"""
+import sys
+import threading
+
+# Bytes read at a time when pulling database files into the page cache
+READ_CHUNK = 1 << 20
+
+
+def warm_file(path):
+    """Read ``path`` once so its pages are in the OS page cache; returns bytes read."""
+    total = 0
+    buffer = bytearray(READ_CHUNK)
+    try:
+        with open(path, "rb", buffering=0) as f:
+            while True:
+                read = f.readinto(buffer)
+                if not read:
+                    break
+                total += read
+    except OSError:
+        pass
+    return total
+
+
+class Warmer:
+    def __init__(self, flight_data, aggregates, interval=60, warm_files=True):
+        """Keep ``aggregates`` (name -> function of flight_data) precomputed.
+
+        Every ``interval`` seconds the database fingerprint is checked and
+        the aggregates are recomputed if it changed.
+        """
+        self.flight_data = flight_data
+        self.aggregates = aggregates
+        self.interval = interval
+        self.warm_files = warm_files
+        self.ready = threading.Event()
+        # (fingerprint, results) replaced as a whole so readers never see a mix
+        self._state = (None, {})
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="skysql-warmup", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            self.warm()
+        except Exception as e:
+            print(f"Warm-up failed: {e}", file=sys.stderr, flush=True)
+        finally:
+            # Ready once the attempt is over; a failed warm-up only costs latency
+            self.ready.set()
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Aggregate refresh failed: {e}", file=sys.stderr, flush=True)
+
+    def warm(self):
+        if self.warm_files:
+            for path in self.flight_data.database_files():
+                warm_file(path)
+        self.refresh(force=True)
+
+    def refresh(self, force=False):
+        """Recompute the aggregates if the database changed; returns whether it did."""
+        # Taken before computing: a change during the refresh is picked up next time
+        fingerprint = self.flight_data.fingerprint()
+        if not force and fingerprint == self._state[0]:
+            return False
+        self.install(fingerprint, self.compute())
+        return True
+
+    def compute(self):
+        """Compute every aggregate now, without serving the results."""
+        return {name: aggregate(self.flight_data) for name, aggregate in self.aggregates.items()}
+
+    def install(self, fingerprint, results):
+        """Serve ``results`` of compute() while the database has ``fingerprint``."""
+        self._state = (fingerprint, results)
+        self.flight_data.metrics.incr("aggregates_refreshed")
+
+    def get(self, name):
+        """The precomputed result for ``name``, or None if missing or stale."""
+        fingerprint, results = self._state
+        if fingerprint is None or name not in results or fingerprint != self.flight_data.fingerprint():
+            return None
+        self.flight_data.metrics.incr("aggregate_cache_hits")
+        return results[name]
+
+
+class DerivedIndex:
+    """An in-memory structure built from ``flight_data``, rebuilt when the database changes.
+
+    ``build(flight_data)`` runs on first use and again whenever the
+    fingerprint differs from the one it was built for. While one thread
+    rebuilds, others keep using the previous version.
+    """
+
+    def __init__(self, flight_data, build):
+        self.flight_data = flight_data
+        self.build = build
+        self._state = (None, None)
+        self._lock = threading.Lock()
+
+    def get(self):
+        fingerprint = self.flight_data.fingerprint()
+        built_for, index = self._state
+        if index is not None and built_for == fingerprint:
+            return index
+        if not self._lock.acquire(blocking=index is None):
+            return index
+        try:
+            built_for, index = self._state
+            if index is None or built_for != fingerprint:
+                index = self.build(self.flight_data)
+                self._state = (fingerprint, index)
+            return index
+        finally:
+            self._lock.release()